@@ -0,0 +1,35 @@
+#!/bin/bash
+#SBATCH --job-name=mastodon_2n8c_bundle
+#SBATCH --nodes=2
+#SBATCH --ntasks=8
+#SBATCH --ntasks-per-node=4
+#SBATCH --cpus-per-task=1
+#SBATCH --time=01:00:00
+#SBATCH --mem=32G
+#SBATCH --output=./output/logs/mastodon_2n8c_bundle_%j.out
+#SBATCH --error=./output/logs/mastodon_2n8c_bundle_%j.err
+
+# Load required modules
+module load Python/3.10.4
+module load mpi4py/3.1.3
+
+# Create output directory
+mkdir -p ./output/results/2nodes_8cores_bundle
+mkdir -p ./output/logs
+
+# Package the code as one precompiled zipapp with the job's Python, then
+# copy it to node-local storage on every node, so ranks start without
+# searching or compiling modules on the shared filesystem
+BUNDLE=./output/mastodon_${SLURM_JOB_ID}.pyz
+LOCAL_BUNDLE=/tmp/mastodon_${SLURM_JOB_ID}.pyz
+python3 ./src/bundle.py -output $BUNDLE
+sbcast -f $BUNDLE $LOCAL_BUNDLE
+
+# Run the MPI program with 8 processes across 2 nodes (4 per node)
+srun -n 8 --nodes=2 --ntasks-per-node=4 python3 $LOCAL_BUNDLE main -data $1 -output ./output/results/2nodes_8cores_bundle
+
+# Copy the output to a standardized file for analysis
+cp ./output/results/2nodes_8cores_bundle/runtime.txt ./output/2node8core_bundle.txt
+rm -f $BUNDLE
+
+echo "Job completed"
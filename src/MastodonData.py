@@ -1,44 +1,82 @@
 import json
+import math
 
 class MastodonData:
     """
     Data model for processing Mastodon posts.
     Extracts and validates relevant fields from JSON data.
     """
-    def __init__(self, data: str):
+    def __init__(self, data, accounts=None):
         """
-        Initialize with JSON data string.
+        Initialize with a raw JSON record.
         
         Args:
-            data: String containing a JSON object
+            data: JSON object as str, bytes or a memoryview of bytes
+            accounts: AccountCache used to skip repeated account objects
+                in raw bytes (optional)
             
         Raises:
             ValueError: If the JSON data is invalid
         """
         try:
-            # Try to parse the JSON data
+            # Try to parse the JSON data, cutting out accounts seen before
+            cached_accounts = {}
+            if accounts is not None and not isinstance(data, str):
+                data, cached_accounts = accounts.strip(data)
+            if isinstance(data, memoryview):
+                data = data.tobytes()
             json_data = json.loads(data)
         except Exception as e:
             raise ValueError(f"Invalid JSON: {e}")
         
+        # Elasticsearch exports wrap the post in a "doc" object with camelCase keys
+        doc = json_data.get("doc", json_data)
+        
+        # Keep the parsed post so callers can read further fields without reparsing
+        self.doc = doc
+        
         # Extract created_at time (as ISO format string)
-        self.created_at = json_data.get("created_at", "")
+        self.created_at = doc.get("createdAt") or doc.get("created_at", "")
         
         # Extract sentiment; if missing or None, default to 0
-        self.sentiment = json_data.get("sentiment")
+        self.sentiment = doc.get("sentiment")
+        self.sentiment_missing = False
+        self.sentiment_invalid = False
         if self.sentiment is None:
             self.sentiment = 0
+            self.sentiment_missing = True
         else:
-            # Ensure sentiment is a number (float)
+            # Ensure sentiment is a finite number (float)
             try:
                 self.sentiment = float(self.sentiment)
+                if not math.isfinite(self.sentiment):
+                    raise ValueError("sentiment is not finite")
             except (ValueError, TypeError):
                 self.sentiment = 0
+                self.sentiment_missing = True
+                self.sentiment_invalid = True
+        
+        # Keep the HTML content so missing sentiment can be scored later
+        self.content = doc.get("content", "")
+        self.language = doc.get("language")
+        self.visibility = doc.get("visibility")
+        self.sensitive = bool(doc.get("sensitive"))
         
         # Extract account info for user analysis
-        account = json_data.get("account", {})
+        account = doc.get("account") or {}
+        account = cached_accounts.get(account.get("id"), account)
         self.user_id = account.get("id", "")
         self.username = account.get("username", "")
+        self.bot = bool(account.get("bot"))
+        self.followers_count = account.get("followersCount") or 0
+        self.account_created_at = account.get("createdAt") or ""
+        
+        # Extract interaction targets for the reply and mention graph
+        self.in_reply_to_account_id = doc.get("inReplyToAccountId") or doc.get("in_reply_to_account_id")
+        self.mention_ids = [
+            mention.get("id") for mention in doc.get("mentions") or []
+            if isinstance(mention, dict) and mention.get("id")
+        ]
         
         # Add validation to ensure critical fields exist
         if not self.created_at or not self.user_id:
@@ -0,0 +1,183 @@
+import json
+import re
+
+# Key of an embedded account object, at any nesting level
+_ACCOUNT_KEY = b'"account":'
+
+_OBJECT_START = re.compile(rb'\s*\{')
+
+# First id inside an account object, used as the cache key
+_ACCOUNT_ID = re.compile(rb'"id":\s*"(\d+)"')
+
+# Bytes decoded at first when parsing an account object; doubled until the
+# whole object fits
+_DECODE_WINDOW = 4096
+
+_DECODER = json.JSONDecoder()
+
+# Fields kept per account; everything else in the object is never parsed twice
+ACCOUNT_FIELDS = ("id", "username", "bot", "followersCount", "createdAt")
+
+
+class AccountCache:
+    """
+    Per-rank dimension table of accounts keyed by account id.
+
+    Every post embeds its author's full account object (avatar URLs, note
+    HTML, profile fields, emojis), repeated verbatim for every post of a
+    prolific account. The first time an account object is seen it is
+    parsed on its own, and its few useful attributes are cached together
+    with the object's raw bytes. Later occurrences are recognised by
+    comparing the same span of the line against those bytes, and the whole
+    object is cut out of the line before JSON parsing; an account whose
+    object changed (say, a new follower count) simply misses and is
+    re-cached.
+
+    Records then carry a placeholder {"id": ...} where the account was,
+    and the cached attributes are returned alongside.
+    """
+
+    def __init__(self, max_bytes=64 << 20):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_bytes: Raw account bytes cached at most; accounts first seen
+                after the cache is full are parsed normally
+        """
+        self.max_bytes = max_bytes
+        self.entries = {}
+        self.cached_bytes = 0
+        self.lookups = 0
+        self.hits = 0
+        self.bytes_skipped = 0
+
+    def _learn(self, id_match, record, start, previous=None):
+        """
+        Parse the account object at record[start:] and cache it.
+
+        Only a window of the record is decoded, grown until the object is
+        complete, so a miss costs about the object's size rather than the
+        rest of the record. The object is cached only if its key, the
+        first id found after start, lies inside it: an id further along the
+        record belongs to something else and would be shared by unrelated
+        objects.
+
+        Args:
+            id_match: Match of _ACCOUNT_ID searched from start, or None
+            record: Raw JSON line
+            start: Offset of the object's opening brace
+            previous: Entry cached under key before, if any
+
+        Returns:
+            tuple: (raw object bytes, its attributes, placeholder bytes), or
+            None if it is not a valid account object with an id
+        """
+        window = max(_DECODE_WINDOW, 2 * len(previous[0]) if previous is not None else 0)
+        while True:
+            chunk = record[start:start + window]
+            try:
+                text = str(chunk, "utf-8")
+            except UnicodeDecodeError as e:
+                if e.reason != "unexpected end of data":
+                    return None
+                # The window cut a character in two
+                text = str(chunk[:e.start], "utf-8")
+            try:
+                account, end = _DECODER.raw_decode(text)
+                break
+            except ValueError:
+                if start + window >= len(record):
+                    return None
+                window *= 2
+        if not isinstance(account, dict) or account.get("id") is None:
+            return None
+        raw = text[:end].encode("utf-8")
+        attributes = {field: account[field] for field in ACCOUNT_FIELDS if field in account}
+        entry = (raw, attributes, b'{"id":' + json.dumps(account["id"]).encode("ascii") + b"}")
+
+        if id_match is None or id_match.end() > start + len(raw):
+            return entry
+        key = id_match.group(1)
+        size = len(raw) - (len(previous[0]) if previous is not None else 0)
+        if previous is not None or self.cached_bytes + size <= self.max_bytes:
+            self.entries[key] = entry
+            self.cached_bytes += size
+        return entry
+
+    def strip(self, record):
+        """
+        Cut every account object out of a raw record.
+
+        Args:
+            record: Raw JSON line as bytes or memoryview
+
+        Returns:
+            tuple: (record bytes with placeholder accounts, dict of
+            account id -> cached attributes for the accounts cut out)
+        """
+        if isinstance(record, memoryview):
+            record = record.tobytes()
+        pieces = []
+        resolved = {}
+        position = 0
+        key_start = record.find(_ACCOUNT_KEY)
+        while key_start >= 0:
+            object_match = _OBJECT_START.match(record, key_start + len(_ACCOUNT_KEY))
+            if object_match is None:
+                # A null account
+                key_start = record.find(_ACCOUNT_KEY, key_start + len(_ACCOUNT_KEY))
+                continue
+            start = object_match.end() - 1
+            id_match = _ACCOUNT_ID.search(record, start)
+            key = id_match.group(1) if id_match is not None else None
+            self.lookups += 1
+
+            # Entries are cached only under an id inside their own bytes, so
+            # identical bytes here mean this object has that same first id
+            entry = self.entries.get(key)
+            if entry is not None and record.startswith(entry[0], start):
+                self.hits += 1
+                self.bytes_skipped += len(entry[0])
+            else:
+                entry = self._learn(id_match, record, start, entry)
+                if entry is None:
+                    key_start = record.find(_ACCOUNT_KEY, start)
+                    continue
+
+            raw, attributes, placeholder = entry
+            pieces.append(record[position:start])
+            pieces.append(placeholder)
+            position = start + len(raw)
+            resolved[attributes["id"]] = attributes
+            key_start = record.find(_ACCOUNT_KEY, position)
+
+        if not pieces:
+            return record, resolved
+        pieces.append(record[position:])
+        return b"".join(pieces), resolved
+
+    def stats(self):
+        """Counters for reporting, summable across ranks."""
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "bytes_skipped": self.bytes_skipped,
+            "accounts": len(self.entries),
+            "cached_bytes": self.cached_bytes,
+        }
+
+
+def format_account_stats(stats):
+    """
+    Describe summed cache counters for logs.
+
+    Args:
+        stats: Dict in the form returned by AccountCache.stats
+
+    Returns:
+        str: One-line summary
+    """
+    hit_rate = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+    return (f"Account cache: {stats['hits']} of {stats['lookups']} account objects reused ({hit_rate:.2%}), "
+            f"{stats['bytes_skipped'] / (1024 * 1024):.1f} MB skipped, {stats['accounts']} accounts cached")
@@ -1,11 +1,16 @@
 import datetime
 import heapq
-import numpy as np
-import json
 from collections import defaultdict, Counter
 from itertools import islice
-from mpi4py import MPI
 from MastodonData import MastodonData
+from queries import Query, QueryBatch
+from accounts import AccountCache
+from validation import RecordValidator, ValidationAbort, merge_summaries, format_validation
+from shards import expand_inputs, plan_units
+from util import read_records, partition_units, process_uptime, time_to_first_record, format_startup
+
+# numpy and the modules of optional features (graph, lexicon, zone map,
+# sampling, multi-rank reduction) are imported where they are used
 
 class MastodonAnalyzer:
     """
@@ -14,12 +19,21 @@ class MastodonAnalyzer:
     Optimized for parallel processing with MPI.
     """
     
-    def __init__(self, comm=None):
+    def __init__(self, comm=None, interaction_graph=False, lexicon=None, record_filter=None, queries=None,
+                 validation=None):
         """
         Initialize the analyzer with optional MPI communicator.
         
         Args:
             comm: MPI communicator (default: None for sequential processing)
+            interaction_graph: Collect reply and mention edges and build a
+                CSR interaction graph when merging results
+            lexicon: Lexicon for batch-scoring posts that have no
+                sentiment value (default: None, such posts count as 0)
+            record_filter: RecordFilter parsed records must match (optional)
+            queries: List of named Query slices evaluated in the same scan,
+                each with its own results (optional)
+            validation: RecordValidator counting malformed records (optional)
         """
         self.comm = comm
         self.comm_rank = 0
@@ -37,98 +51,180 @@ class MastodonAnalyzer:
         self.hourly_post_counts = defaultdict(int)
         self.interaction_counts = defaultdict(int)
         self.sentiment_values = []
-        
-    def process_line(self, line):
+        self.edges = None
+        if interaction_graph:
+            from graph import EdgeBuffer
+            self.edges = EdgeBuffer()
+        self.graph = None
+        self.record_filter = record_filter
+        self.accounts = AccountCache()
+        self.account_stats = None
+        self.queries = QueryBatch(queries) if queries else None
+        self.validation = validation
+        self.validation_summary = None
+        self.scorer = None
+        self.lexicon_scored = 0
+        if lexicon is not None:
+            from lexicon import BatchSentimentScorer
+            self.scorer = BatchSentimentScorer(
+                lexicon, lambda deferred, score: self._score_deferred(*deferred, score)
+            )
+        
+    def process_line(self, line, offset=None):
         """
         Process a single line of Mastodon data.
         Updates all internal data structures for analysis.
         
         Args:
-            line: String containing JSON data
+            line: JSON record as str or bytes
+            offset: Byte offset of the line, for the validation quarantine (optional)
             
         Returns:
             bool: True if processing was successful, False otherwise
+            
+        Raises:
+            ValidationAbort: If the validator's early failure rate is too high
         """
         try:
             # Parse and validate data
             if not line or not line.strip():
                 return False
                 
-            # Create MastodonData object
-            mastodon_data = MastodonData(line)
+            # Create MastodonData object, skipping account objects seen before
+            try:
+                mastodon_data = MastodonData(line, self.accounts)
+            except Exception:
+                if self.validation is not None:
+                    self.validation.bad_json(offset)
+                return False
+            if self.validation is not None:
+                self.validation.check(mastodon_data, offset)
             
             # Skip entries without required fields
             if not mastodon_data.created_at or mastodon_data.sentiment is None:
                 return False
+            
+            # Skip records outside the requested time range or language
+            if self.record_filter is not None and not self.record_filter.matches(mastodon_data):
+                return False
                 
-            # Process datetime
-            try:
-                created_datetime = datetime.datetime.fromisoformat(
-                    mastodon_data.created_at.replace('Z', '+00:00')
-                )
-                
-                # Add to hour sentiment
-                hour_key = created_datetime.strftime("%Y-%m-%d %H")
-                self.hour_sentiment[hour_key] += mastodon_data.sentiment
-                
-                # Add to day sentiment
-                day_key = created_datetime.strftime("%Y-%m-%d")
-                self.day_sentiment[day_key] += mastodon_data.sentiment
-                
-                # Count posts per hour
-                self.hourly_post_counts[hour_key] += 1
-                
-            except Exception:
-                # Skip entries with invalid dates
-                pass
+            # Evaluate all named queries against the record at once
+            matched = self.queries.match(mastodon_data) if self.queries is not None else ()
                 
-            # Process user sentiment
-            if mastodon_data.user_id:
-                if mastodon_data.user_id in self.user_sentiment:
-                    username, score, count = self.user_sentiment[mastodon_data.user_id]
-                    self.user_sentiment[mastodon_data.user_id] = (
-                        mastodon_data.username, 
-                        score + mastodon_data.sentiment,
-                        count + 1
-                    )
-                else:
-                    self.user_sentiment[mastodon_data.user_id] = (
-                        mastodon_data.username, 
-                        mastodon_data.sentiment,
-                        1
-                    )
+            # Defer posts lacking sentiment to the batch lexicon scorer
+            if self.scorer is not None and mastodon_data.sentiment_missing:
+                self.scorer.defer((mastodon_data, matched), mastodon_data.content)
+            else:
+                self._accumulate_sentiment(mastodon_data, matched)
             
-            # Additional data extraction from raw JSON
+            # Additional data extraction from the already parsed post
             try:
-                # Parse original JSON for additional fields
-                json_data = json.loads(line)
+                doc = mastodon_data.doc
                 
                 # Extract language information
-                language = json_data.get("language")
+                language = doc.get("language")
                 if language:
                     self.language_counts[language] += 1
                     
                 # Extract interaction data
-                if json_data.get("in_reply_to_id"):
-                    self.interaction_counts["replies"] += 1
-                if json_data.get("reblog"):
-                    self.interaction_counts["reblogs"] += 1
-                if json_data.get("favourites_count"):
-                    self.interaction_counts["favorites"] += json_data.get("favourites_count", 0)
+                interactions = {}
+                if doc.get("inReplyToId"):
+                    interactions["replies"] = 1
+                if doc.get("reblog"):
+                    interactions["reblogs"] = 1
+                if doc.get("mentions"):
+                    interactions["mentions"] = len(doc["mentions"])
+                if doc.get("favouritesCount"):
+                    interactions["favorites"] = doc["favouritesCount"]
+                for interaction_type, count in interactions.items():
+                    self.interaction_counts[interaction_type] += count
+                    
+                # The extracted fields are shared by every matching query
+                for query in matched:
+                    query.add_counts(language, interactions)
                     
             except Exception:
                 # Continue even if additional data extraction fails
                 pass
                 
-            # Track sentiment values for distribution analysis
-            self.sentiment_values.append(mastodon_data.sentiment)
-            
             return True
             
-        except Exception as e:
+        except ValidationAbort:
+            raise
+        except Exception:
             # Skip problematic entries
             return False
             
+    def _accumulate_sentiment(self, mastodon_data, matched=()):
+        """
+        Add one post's sentiment to all sentiment-dependent aggregates.
+        
+        Args:
+            mastodon_data: Parsed post with a sentiment value
+            matched: Named queries the post matches
+        """
+        hour_key = day_key = None
+        
+        # Process datetime
+        try:
+            created_datetime = datetime.datetime.fromisoformat(
+                mastodon_data.created_at.replace('Z', '+00:00')
+            )
+            
+            # Add to hour sentiment
+            hour_key = created_datetime.strftime("%Y-%m-%d %H")
+            self.hour_sentiment[hour_key] += mastodon_data.sentiment
+            
+            # Add to day sentiment
+            day_key = created_datetime.strftime("%Y-%m-%d")
+            self.day_sentiment[day_key] += mastodon_data.sentiment
+            
+            # Count posts per hour
+            self.hourly_post_counts[hour_key] += 1
+            
+        except Exception:
+            # Skip entries with invalid dates
+            hour_key = day_key = None
+            
+        # Date keys are computed once for all matching queries
+        for query in matched:
+            query.add_sentiment(mastodon_data, hour_key, day_key)
+            
+        # Process user sentiment
+        if mastodon_data.user_id:
+            if mastodon_data.user_id in self.user_sentiment:
+                username, score, count = self.user_sentiment[mastodon_data.user_id]
+                self.user_sentiment[mastodon_data.user_id] = (
+                    mastodon_data.username, 
+                    score + mastodon_data.sentiment,
+                    count + 1
+                )
+            else:
+                self.user_sentiment[mastodon_data.user_id] = (
+                    mastodon_data.username, 
+                    mastodon_data.sentiment,
+                    1
+                )
+        
+        # Emit reply and mention edges for the interaction graph
+        if self.edges is not None:
+            self.edges.add_post(mastodon_data)
+        
+        # Track sentiment values for distribution analysis
+        self.sentiment_values.append(mastodon_data.sentiment)
+        
+    def _score_deferred(self, mastodon_data, matched, score):
+        """
+        Accumulate a post once the lexicon scorer has scored it.
+        
+        Args:
+            mastodon_data: Parsed post that had no sentiment value
+            matched: Named queries the post matches
+            score: Lexicon sentiment score
+        """
+        mastodon_data.sentiment = score
+        self._accumulate_sentiment(mastodon_data, matched)
+        
     def merge_results(self):
         """
         Merge analysis results from all MPI processes.
@@ -137,58 +233,60 @@ class MastodonAnalyzer:
         Returns:
             dict: Merged analysis results
         """
+        # Score the last partial batch of posts lacking sentiment
+        if self.scorer is not None:
+            self.scorer.flush()
+            self.lexicon_scored = self.scorer.scored
+        
+        # Building the graph is collective, so every rank takes part
+        if self.edges is not None:
+            from graph import build_graph
+            self.graph = build_graph(self.edges, self.comm if self.comm_size > 1 else None)
+        
         if not self.comm or self.comm_size == 1:
             # Sequential processing - no merging needed
             return self._get_analysis_results()
             
-        # Gather data from all processes
-        all_hour_sentiment = self.comm.gather(self.hour_sentiment, root=0)
-        all_day_sentiment = self.comm.gather(self.day_sentiment, root=0)
-        all_user_sentiment = self.comm.gather(self.user_sentiment, root=0)
+        from reduction import (
+            NodeTopology, hierarchical_sum_dicts, hierarchical_merge,
+            hour_to_index, index_to_hour, day_to_index, index_to_day, merge_user_sentiment
+        )
+        
+        # Sum the time-keyed arrays and merge user state in two levels: through
+        # shared memory within each node, then between node leaders only
+        topology = NodeTopology(self.comm)
+        merged_hours = hierarchical_sum_dicts(
+            topology, [self.hour_sentiment, self.hourly_post_counts], hour_to_index, index_to_hour
+        )
+        merged_days = hierarchical_sum_dicts(
+            topology, [self.day_sentiment], day_to_index, index_to_day
+        )
+        merged_user_sentiment = hierarchical_merge(topology, self.user_sentiment, merge_user_sentiment)
+        if self.queries is not None:
+            self.queries.merge(topology)
+        topology.free()
+        
+        # Gather the remaining small aggregates from all processes
         all_language_counts = self.comm.gather(self.language_counts, root=0)
-        all_hourly_post_counts = self.comm.gather(self.hourly_post_counts, root=0)
         all_interaction_counts = self.comm.gather(self.interaction_counts, root=0)
         all_sentiment_values = self.comm.gather(self.sentiment_values, root=0)
+        all_lexicon_scored = self.comm.gather(self.lexicon_scored, root=0)
+        all_account_stats = self.comm.gather(self.accounts.stats(), root=0)
+        all_validation = self.comm.gather(self.validation.summary() if self.validation else None, root=0)
         
         # Process on root only
         if self.comm_rank == 0:
-            # Merge hour sentiment
-            merged_hour_sentiment = defaultdict(float)
-            for proc_data in all_hour_sentiment:
-                for hour, score in proc_data.items():
-                    merged_hour_sentiment[hour] += score
-            
-            # Merge day sentiment
-            merged_day_sentiment = defaultdict(float)
-            for proc_data in all_day_sentiment:
-                for day, score in proc_data.items():
-                    merged_day_sentiment[day] += score
-            
-            # Merge user sentiment
-            merged_user_sentiment = {}
-            for proc_data in all_user_sentiment:
-                for user_id, (username, score, count) in proc_data.items():
-                    if user_id in merged_user_sentiment:
-                        _, existing_score, existing_count = merged_user_sentiment[user_id]
-                        merged_user_sentiment[user_id] = (
-                            username, 
-                            existing_score + score,
-                            existing_count + count
-                        )
-                    else:
-                        merged_user_sentiment[user_id] = (username, score, count)
+            merged_hour_sentiment, merged_hourly_post_counts = merged_hours
+            merged_day_sentiment, = merged_days
+            merged_hourly_post_counts = defaultdict(int, {
+                hour: int(count) for hour, count in merged_hourly_post_counts.items()
+            })
             
             # Merge language counts
             merged_language_counts = Counter()
             for proc_data in all_language_counts:
                 merged_language_counts.update(proc_data)
             
-            # Merge hourly post counts
-            merged_hourly_post_counts = defaultdict(int)
-            for proc_data in all_hourly_post_counts:
-                for hour, count in proc_data.items():
-                    merged_hourly_post_counts[hour] += count
-            
             # Merge interaction counts
             merged_interaction_counts = defaultdict(int)
             for proc_data in all_interaction_counts:
@@ -208,6 +306,12 @@ class MastodonAnalyzer:
             self.hourly_post_counts = merged_hourly_post_counts
             self.interaction_counts = merged_interaction_counts
             self.sentiment_values = merged_sentiment_values
+            self.lexicon_scored = sum(all_lexicon_scored)
+            self.account_stats = {
+                key: sum(stats[key] for stats in all_account_stats) for key in all_account_stats[0]
+            }
+            if self.validation is not None:
+                self.validation_summary = merge_summaries(all_validation)
             
         # Return analysis results from root
         if self.comm_rank == 0:
@@ -222,6 +326,8 @@ class MastodonAnalyzer:
         Returns:
             dict: Analysis results
         """
+        import numpy as np
+        
         top_n = 5
         
         # Calculate top hours by sentiment
@@ -277,6 +383,50 @@ class MastodonAnalyzer:
             key=lambda x: x[1][1]
         )
         
+        # Calculate interaction graph metrics over the CSR arrays
+        graph_stats = None
+        if self.graph is not None:
+            sentiment_in = self.graph.sentiment_in()
+            graph_stats = {
+                "nodes": self.graph.num_nodes,
+                "edges": self.graph.num_edges,
+                "interactions": int(self.graph.weights.sum()),
+                "replies": int(self.graph.replies.sum()),
+                "top_in_degree": self.graph.top_k(self.graph.in_degree(weighted=True), top_n),
+                "top_out_degree": self.graph.top_k(self.graph.out_degree(weighted=True), top_n),
+                "most_positive_received": self.graph.top_k(sentiment_in, top_n),
+                "most_negative_received": self.graph.top_k(sentiment_in, top_n, largest=False)
+            }
+        
+        # Report how many posts were scored by the lexicon
+        lexicon_stats = None
+        if self.scorer is not None:
+            total_posts = len(self.sentiment_values)
+            lexicon_stats = {
+                "scored_posts": self.lexicon_scored,
+                "scored_fraction": self.lexicon_scored / total_posts if total_posts else 0.0
+            }
+        
+        # Report how often account objects were reused instead of parsed
+        account_stats = self.account_stats or self.accounts.stats()
+        account_stats["hit_rate"] = (
+            account_stats["hits"] / account_stats["lookups"] if account_stats["lookups"] else 0.0
+        )
+        
+        # Report malformed records by failure class, with sampled offsets
+        validation_stats = None
+        if self.validation is not None:
+            summary = self.validation_summary or merge_summaries([self.validation.summary()])
+            validation_stats = {
+                "records": summary["records"],
+                "failed_records": summary["failed_records"],
+                "counts": summary["counts"],
+                "quarantine": [
+                    {"processor": rank, "file": source, "offset": offset, "failures": kinds.split(",")}
+                    for rank, source, offset, kinds in summary["samples"]
+                ]
+            }
+        
         # Compile all results
         results = {
             "happiest_hours": happiest_hours,
@@ -291,24 +441,34 @@ class MastodonAnalyzer:
             "sentiment_stats": sentiment_stats,
             "interaction_stats": interaction_stats,
             "most_positive_users": most_positive_users,
-            "most_negative_users": most_negative_users
+            "most_negative_users": most_negative_users,
+            "graph_stats": graph_stats,
+            "lexicon_stats": lexicon_stats,
+            "account_cache": account_stats,
+            "validation": validation_stats,
+            "queries": self.queries.format(self._format_hour_range, top_n) if self.queries is not None else None,
+            "user_sentiment": self.user_sentiment
         }
         
         return results
         
-    def analyze_chunk(self, lines):
+    def analyze_chunk(self, lines, offsets=None, sources=None):
         """
         Process a chunk of data lines.
         
         Args:
-            lines: Iterable of JSON data lines
+            lines: Sequence of JSON data lines
+            offsets: Byte offsets of the lines, in the same order (optional)
+            sources: Files the lines came from, in the same order (optional)
             
         Returns:
             int: Number of successfully processed lines
         """
         processed = 0
-        for line in lines:
-            if self.process_line(line):
+        for i, line in enumerate(lines):
+            if sources is not None and self.validation is not None:
+                self.validation.source = sources[i]
+            if self.process_line(line, offsets[i] if offsets is not None else None):
                 processed += 1
         return processed
         
@@ -453,6 +613,48 @@ class MastodonAnalyzer:
             for user_id, info in results.get("most_negative_users", [])
         ]
         
+        # Include lexicon scoring stats
+        if results.get("lexicon_stats"):
+            formatted["lexicon_stats"] = results["lexicon_stats"]
+        
+        # Include account cache reuse
+        if results.get("account_cache"):
+            formatted["account_cache"] = results["account_cache"]
+
+        # Include malformed record counts and the quarantine sample
+        if results.get("validation"):
+            formatted["validation"] = results["validation"]
+
+        # Include the named query slices
+        if results.get("queries"):
+            formatted["queries"] = results["queries"]
+        
+        # Format interaction graph metrics
+        graph_stats = results.get("graph_stats")
+        if graph_stats:
+            user_sentiment = results["user_sentiment"]
+            
+            def format_ranked(entries, value_name):
+                return [
+                    {
+                        "id": user_id,
+                        "username": user_sentiment.get(user_id, ("",))[0],
+                        value_name: value
+                    }
+                    for user_id, value in entries
+                ]
+            
+            formatted["interaction_graph"] = {
+                "nodes": graph_stats["nodes"],
+                "edges": graph_stats["edges"],
+                "interactions": graph_stats["interactions"],
+                "replies": graph_stats["replies"],
+                "top_in_degree": format_ranked(graph_stats["top_in_degree"], "interactions"),
+                "top_out_degree": format_ranked(graph_stats["top_out_degree"], "interactions"),
+                "most_positive_received": format_ranked(graph_stats["most_positive_received"], "sentiment"),
+                "most_negative_received": format_ranked(graph_stats["most_negative_received"], "sentiment")
+            }
+        
         return formatted
         
     def _format_hour_range(self, hour_str):
@@ -473,20 +675,27 @@ class MastodonAnalyzer:
             return hour_str
 
 
-def analyze_mastodon_data(data_path, chunk_size=10000, comm=None):
+def analyze_mastodon_data(data_path, chunk_size=10000, comm=None, interaction_graph=False, lexicon=None,
+                          record_filter=None, queries=None, validation=None):
     """
     Analyze Mastodon data from a file using parallel processing.
     
     Args:
-        data_path: Path to the Mastodon data file
+        data_path: Mastodon data file, directory of shards or glob pattern
         chunk_size: Number of lines to process in each chunk
         comm: MPI communicator (optional)
+        interaction_graph: Build the reply and mention graph (optional)
+        lexicon: Lexicon for scoring posts without sentiment (optional)
+        record_filter: RecordFilter restricting time range and language (optional)
+        queries: List of named Query slices computed in the same scan (optional)
+        validation: RecordValidator counting malformed records (optional)
         
     Returns:
         dict: Analysis results
     """
     # Initialize analyzer
-    analyzer = MastodonAnalyzer(comm)
+    analyzer = MastodonAnalyzer(comm, interaction_graph=interaction_graph, lexicon=lexicon,
+                                record_filter=record_filter, queries=queries, validation=validation)
     
     # Get MPI rank and size
     comm_rank = 0
@@ -495,44 +704,33 @@ def analyze_mastodon_data(data_path, chunk_size=10000, comm=None):
         comm_rank = comm.Get_rank()
         comm_size = comm.Get_size()
     
-    # Count lines in file (only on root process)
-    n_lines = None
-    if comm_rank == 0:
-        with open(data_path, 'r') as f:
-            n_lines = sum(1 for _ in f)
-    
-    # Broadcast line count to all processes
-    if comm:
-        n_lines = comm.bcast(n_lines, root=0)
+    # Plan all shards as one list of work units, skipping the blocks the
+    # zone maps rule out, and give every process an equal share of bytes
+    units, _, _ = plan_units(expand_inputs(data_path), record_filter, comm)
     
-    # Calculate chunk assignments for each process
-    lines_per_process = n_lines // comm_size
-    start_line = comm_rank * lines_per_process
-    end_line = start_line + lines_per_process if comm_rank < comm_size - 1 else n_lines
+    # Read raw bytes and reject lines on their text before any JSON parsing;
+    # records are copied out of the read buffer since chunks outlive it
+    records = (
+        (path, offset, record.tobytes())
+        for path, start_byte, end_byte in partition_units(units, comm_size, comm_rank)
+        for offset, record in read_records(path, start_byte, end_byte)
+        if record_filter is None or record_filter.raw_match(record)
+    )
     
-    # Process assigned chunks
-    with open(data_path, 'r', encoding='utf-8') as f:
-        # Skip to start line
-        for _ in range(start_line):
-            next(f, None)
-        
-        # Process chunks
-        lines_processed = 0
-        current_chunk = []
-        
-        for i, line in enumerate(f):
-            if i >= end_line - start_line:
+    lines_processed = 0
+    try:
+        while True:
+            current_chunk = list(islice(records, chunk_size))
+            if not current_chunk:
                 break
-                
-            current_chunk.append(line)
-            
-            if len(current_chunk) >= chunk_size:
-                lines_processed += analyzer.analyze_chunk(current_chunk)
-                current_chunk = []
-        
-        # Process any remaining lines
-        if current_chunk:
-            lines_processed += analyzer.analyze_chunk(current_chunk)
+            sources, offsets, lines = zip(*current_chunk)
+            lines_processed += analyzer.analyze_chunk(lines, offsets, sources)
+    except ValidationAbort as e:
+        if comm is None:
+            raise
+        # The other ranks are blocked in or heading for collectives; stop the whole job
+        print(f"Processor #{comm_rank}: aborting: {e}", flush=True)
+        comm.Abort(1)
     
     # Merge results from all processes
     results = analyzer.merge_results()
@@ -544,18 +742,91 @@ def analyze_mastodon_data(data_path, chunk_size=10000, comm=None):
         return None
 
 
-def parallel_analyze_mastodon_data(data_path, output_path=None, chunk_size=10000):
+def format_sample_estimates(estimates):
+    """
+    Format sample-based estimates for JSON output.
+    
+    Args:
+        estimates: Dict returned by sampling.sample_estimates
+        
+    Returns:
+        dict: Formatted estimates with confidence intervals
+    """
+    records, records_low, records_high = estimates["estimated_records"]
+    formatted = {
+        "fraction": estimates["fraction"],
+        "blocks": estimates["blocks"],
+        "sampled_bytes": estimates["sampled_bytes"],
+        "file_size": estimates["file_size"],
+        "estimated_records": {"estimate": records, "ci_low": records_low, "ci_high": records_high},
+    }
+    
+    for key in ("happiest_hours", "saddest_hours"):
+        formatted[key] = [
+            {
+                "hour": hour,
+                "sentiment": est,
+                "ci_low": low,
+                "ci_high": high,
+                "rank_range": [best, worst]
+            }
+            for hour, est, low, high, best, worst in estimates[key]
+        ]
+    
+    for key in ("happiest_users", "saddest_users"):
+        formatted[key] = [
+            {
+                "id": user_id,
+                "username": username,
+                "sentiment": est,
+                "ci_low": low,
+                "ci_high": high,
+                "rank_range": [best, worst]
+            }
+            for user_id, username, est, low, high, best, worst in estimates[key]
+        ]
+    
+    return formatted
+
+
+def parallel_analyze_mastodon_data(data_path, output_path=None, chunk_size=10000, sample=None,
+                                   interaction_graph=False, lexicon_path=None, lexicon_format=None,
+                                   time_from=None, time_to=None, language=None, queries=None,
+                                   abort_after=5000, abort_rate=0.5, quarantine_samples=1000, sample_seed=0):
     """
     Analyze Mastodon data using MPI parallelization.
     
     Args:
-        data_path: Path to Mastodon data file
+        data_path: Mastodon data file, directory of shards or glob pattern
         output_path: Path to save results (optional)
         chunk_size: Size of chunks to process at once
+        sample: Fraction of the file to sample for an approximate preview
+            instead of a full analysis (optional)
+        interaction_graph: Build the reply and mention graph (optional)
+        lexicon_path: Lexicon file for scoring posts without sentiment (optional)
+        lexicon_format: Lexicon file format (default: from the extension)
+        time_from: Only analyze posts created at or after this time (optional)
+        time_to: Only analyze posts created before this time (optional)
+        language: Only analyze posts in this language (optional)
+        queries: List of "NAME:TERMS[:METRICS]" query specifications, each
+            reported separately from one shared scan (optional)
+        abort_after: Records each rank parses before judging its failure
+            rate (0 disables the early abort)
+        abort_rate: Failure rate above which the job is aborted
+        quarantine_samples: Byte offsets of failing records each rank
+            reports in the results
+        sample_seed: Seed for the placement of the sample blocks
         
     Returns:
         dict: Analysis results (on root process only)
     """
+    # Imported here so the analyzer can be used without mpi4py; MPI start-up
+    # still counts towards the rank's startup time
+    from mpi4py import MPI
+
+    # Interpreter start and imports, up to this point
+    startup_time = process_uptime()
+    
     # Initialize MPI
     comm = MPI.COMM_WORLD
     comm_rank = comm.Get_rank()
@@ -564,8 +835,24 @@ def parallel_analyze_mastodon_data(data_path, output_path=None, chunk_size=10000
     # Start timing
     start_time = MPI.Wtime()
     
-    # Run analysis
-    results = analyze_mastodon_data(data_path, chunk_size, comm)
+    # Run analysis, or estimate from a stratified sample
+    if sample:
+        from sampling import sample_estimates
+        estimates = sample_estimates(expand_inputs(data_path)[0], sample, comm, seed=sample_seed)
+        results = {"sample": format_sample_estimates(estimates)} if estimates else None
+    else:
+        lexicon = None
+        if lexicon_path:
+            from lexicon import load_lexicon
+            lexicon = load_lexicon(lexicon_path, lexicon_format)
+        record_filter = None
+        if time_from or time_to or language:
+            from zonemap import RecordFilter
+            record_filter = RecordFilter(time_from, time_to, language)
+        parsed_queries = [Query.parse(spec) for spec in queries] if queries else None
+        validation = RecordValidator(quarantine_samples, abort_after, abort_rate, seed=comm_rank)
+        results = analyze_mastodon_data(data_path, chunk_size, comm, interaction_graph, lexicon,
+                                        record_filter, parsed_queries, validation)
     
     # End timing
     end_time = MPI.Wtime()
@@ -573,6 +860,7 @@ def parallel_analyze_mastodon_data(data_path, output_path=None, chunk_size=10000
     
     # Gather timing information
     all_times = comm.gather(elapsed, root=0)
+    all_startup = comm.gather((startup_time, time_to_first_record()), root=0)
     
     # Only root process handles output
     if comm_rank == 0:
@@ -603,6 +891,16 @@ def parallel_analyze_mastodon_data(data_path, output_path=None, chunk_size=10000
                     "processor_count": 1
                 }
         
+        # Per-rank startup and time to first record
+        print(format_startup(all_startup))
+        if results and results.get("validation"):
+            print(format_validation(results["validation"]))
+        if results:
+            results["performance"]["startup"] = [
+                {"processor": rank, "startup": startup, "time_to_first_record": first}
+                for rank, (startup, first) in enumerate(all_startup)
+            ]
+        
         # Save results if output path specified
         if output_path and results:
             import json
@@ -619,11 +917,56 @@ if __name__ == "__main__":
     import argparse
     
     parser = argparse.ArgumentParser(description="Analyze Mastodon data")
-    parser.add_argument("-data", type=str, required=True, help="Path to Mastodon data file")
+    parser.add_argument("-data", type=str, required=True,
+                        help="Mastodon data file, directory of shards or quoted glob pattern, e.g. 'shards/*.ndjson'")
     parser.add_argument("-output", type=str, help="Path to save results")
     parser.add_argument("-chunk", type=int, default=10000, help="Chunk size for processing")
+    parser.add_argument("-sample", "--sample", type=float, metavar="FRACTION",
+                        help="Estimate results from a random sample of this fraction of the file")
+    parser.add_argument("-seed", type=int, default=0,
+                        help="Seed for the placement of the -sample blocks; vary it to repeat an estimate")
+    parser.add_argument("-graph", action="store_true",
+                        help="Build the reply and mention interaction graph")
+    parser.add_argument("-lexicon", type=str,
+                        help="Lexicon file for scoring posts that have no sentiment value")
+    parser.add_argument("-lexicon-format", type=str,
+                        help="Lexicon file format (tsv, vader, json; default: from extension)")
+    parser.add_argument("-from", "--from", dest="time_from", type=str,
+                        help="Only analyze posts created at or after this ISO 8601 time")
+    parser.add_argument("-to", "--to", dest="time_to", type=str,
+                        help="Only analyze posts created before this ISO 8601 time")
+    parser.add_argument("-language", "--language", type=str,
+                        help="Only analyze posts in this language")
+    parser.add_argument("-query", "--query", dest="queries", action="append", metavar="NAME:TERMS[:METRICS]",
+                        help="Also report a named slice, e.g. 'en-humans:language=en,bot=false:hours,users'; "
+                             "repeat for more slices, all computed in the same scan")
+    parser.add_argument("-abort-after", type=int, default=5000, metavar="RECORDS",
+                        help="Records each rank parses before aborting on a high failure rate (0: never abort)")
+    parser.add_argument("-abort-rate", type=float, default=0.5, metavar="FRACTION",
+                        help="Failure rate above which the job aborts after -abort-after records")
+    parser.add_argument("-quarantine-samples", type=int, default=1000, metavar="N",
+                        help="Byte offsets of failing records sampled per rank into the results")
     
     args = parser.parse_args()
     
+    # The sample estimates cover every record, so options that select or rescore records do not apply
+    if args.sample:
+        unsupported = [
+            flag for flag, value in (("-from", args.time_from), ("-to", args.time_to), ("-language", args.language),
+                                     ("-lexicon", args.lexicon), ("-query", args.queries), ("-graph", args.graph))
+            if value
+        ]
+        if unsupported:
+            parser.error(f"-sample cannot be combined with {', '.join(unsupported)}")
+        try:
+            shards = expand_inputs(args.data)
+        except FileNotFoundError as e:
+            parser.error(str(e))
+        if len(shards) > 1:
+            parser.error(f"-sample takes a single input file, '{args.data}' has {len(shards)}")
+    
     # Run analysis
-    parallel_analyze_mastodon_data(args.data, args.output, args.chunk)
\ No newline at end of file
+    parallel_analyze_mastodon_data(args.data, args.output, args.chunk, args.sample, args.graph,
+                                   args.lexicon, args.lexicon_format,
+                                   args.time_from, args.time_to, args.language, args.queries,
+                                   args.abort_after, args.abort_rate, args.quarantine_samples, args.seed)
\ No newline at end of file
@@ -0,0 +1,248 @@
+from array import array
+import numpy as np
+
+# Edge kinds stored alongside each (src, dst) pair
+EDGE_REPLY = 0
+EDGE_MENTION = 1
+
+
+class EdgeBuffer:
+    """
+    Per-rank buffer of user-to-user interaction edges.
+
+    Edges are appended to typed arrays of machine integers rather than
+    nested dicts, so each edge costs a few bytes instead of a few hundred
+    and the buffer can be handed to NumPy without copying.
+    """
+
+    def __init__(self):
+        self.src = array('q')
+        self.dst = array('q')
+        self.kind = array('b')
+        self.sentiment = array('d')
+
+    def __len__(self):
+        return len(self.src)
+
+    def add_post(self, mastodon_data):
+        """
+        Emit the reply and mention edges of one post.
+
+        Args:
+            mastodon_data: Parsed MastodonData object
+
+        Returns:
+            int: Number of edges added
+        """
+        try:
+            author = int(mastodon_data.user_id)
+        except (TypeError, ValueError):
+            return 0
+
+        added = 0
+        targets = []
+        if mastodon_data.in_reply_to_account_id:
+            targets.append((mastodon_data.in_reply_to_account_id, EDGE_REPLY))
+        for mention_id in mastodon_data.mention_ids:
+            targets.append((mention_id, EDGE_MENTION))
+
+        for target, kind in targets:
+            try:
+                target = int(target)
+            except (TypeError, ValueError):
+                continue
+            self.src.append(author)
+            self.dst.append(target)
+            self.kind.append(kind)
+            self.sentiment.append(mastodon_data.sentiment)
+            added += 1
+        return added
+
+    def to_weighted_edges(self):
+        """
+        Express the buffered edges as unit-weight edges for merging.
+
+        Returns:
+            tuple: (src, dst, weights, replies, sentiment) arrays; src, dst
+            and sentiment are zero-copy views of the buffer
+        """
+        src = np.frombuffer(self.src, dtype=np.int64)
+        kind = np.frombuffer(self.kind, dtype=np.int8)
+        return (
+            src,
+            np.frombuffer(self.dst, dtype=np.int64),
+            np.ones(len(src), dtype=np.int64),
+            (kind == EDGE_REPLY).astype(np.int64),
+            np.frombuffer(self.sentiment, dtype=np.float64),
+        )
+
+
+def merge_edges(src, dst, weights, replies, sentiment):
+    """
+    Sort weighted edges by (src, dst) and sum the duplicates together.
+
+    Args:
+        src: Source account ids
+        dst: Target account ids
+        weights: Number of interactions behind each edge
+        replies: Number of those interactions that are replies
+        sentiment: Total sentiment of the posts behind each edge
+
+    Returns:
+        tuple: (src, dst, weights, replies, sentiment) with one entry per
+        distinct (src, dst) pair
+    """
+    if len(src) == 0:
+        empty_int = np.empty(0, dtype=np.int64)
+        return empty_int, empty_int, empty_int, empty_int, np.empty(0, dtype=np.float64)
+
+    order = np.lexsort((dst, src))
+    src = src[order]
+    dst = dst[order]
+
+    # Start of each run of identical (src, dst) pairs
+    starts = np.flatnonzero(np.r_[True, (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])])
+    return (
+        src[starts],
+        dst[starts],
+        np.add.reduceat(weights[order], starts),
+        np.add.reduceat(replies[order], starts),
+        np.add.reduceat(sentiment[order], starts),
+    )
+
+
+class CSRGraph:
+    """
+    Weighted user interaction graph in compressed sparse row form.
+
+    Account ids are mapped to dense node indices through the sorted
+    node_ids array. The out-edges of node i are indices[indptr[i]:indptr[i + 1]]
+    with parallel weights, replies and sentiment arrays.
+    """
+
+    def __init__(self, node_ids, indptr, indices, weights, replies, sentiment):
+        self.node_ids = node_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.replies = replies
+        self.sentiment = sentiment
+
+    @classmethod
+    def from_edges(cls, src, dst, weights, replies, sentiment):
+        """
+        Build a CSR graph from weighted (possibly duplicated) edges.
+
+        Args:
+            src: Source account ids
+            dst: Target account ids
+            weights: Number of interactions behind each edge
+            replies: Number of those interactions that are replies
+            sentiment: Total sentiment of the posts behind each edge
+
+        Returns:
+            CSRGraph: Graph with duplicate edges merged
+        """
+        src, dst, weights, replies, sentiment = merge_edges(src, dst, weights, replies, sentiment)
+        node_ids, inverse = np.unique(np.concatenate([src, dst]), return_inverse=True)
+        rows = inverse[:len(src)]
+        cols = inverse[len(src):]
+
+        # Edges are already sorted by src, and src order matches node order
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(node_ids)), out=indptr[1:])
+        return cls(node_ids, indptr, cols.astype(np.int64), weights, replies, sentiment)
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    def _rows(self):
+        """Node index of the source of every edge."""
+        return np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+
+    def out_degree(self, weighted=False):
+        """
+        Number of distinct users (or interactions, if weighted) each user targets.
+
+        Args:
+            weighted: Count interactions instead of distinct neighbours
+
+        Returns:
+            np.ndarray: Out-degree per node
+        """
+        if weighted:
+            return np.bincount(self._rows(), weights=self.weights, minlength=self.num_nodes).astype(np.int64)
+        return np.diff(self.indptr)
+
+    def in_degree(self, weighted=False):
+        """
+        Number of distinct users (or interactions, if weighted) targeting each user.
+
+        Args:
+            weighted: Count interactions instead of distinct neighbours
+
+        Returns:
+            np.ndarray: In-degree per node
+        """
+        if weighted:
+            return np.bincount(self.indices, weights=self.weights, minlength=self.num_nodes).astype(np.int64)
+        return np.bincount(self.indices, minlength=self.num_nodes)
+
+    def sentiment_in(self):
+        """
+        Total sentiment of the replies and mentions each user received.
+
+        Returns:
+            np.ndarray: Sentiment-weighted in-degree per node
+        """
+        return np.bincount(self.indices, weights=self.sentiment, minlength=self.num_nodes)
+
+    def top_k(self, values, k=5, largest=True):
+        """
+        Select the k nodes with the largest (or smallest) values.
+
+        Args:
+            values: Per-node values
+            k: Number of nodes to return
+            largest: True for the highest values, False for the lowest
+
+        Returns:
+            list: (account_id, value) tuples in rank order
+        """
+        k = min(k, len(values))
+        if k == 0:
+            return []
+        keyed = -values if largest else values
+        candidates = np.argpartition(keyed, k - 1)[:k]
+        candidates = candidates[np.argsort(keyed[candidates], kind="stable")]
+        return [(str(self.node_ids[i]), values[i].item()) for i in candidates]
+
+
+def build_graph(edge_buffer, comm=None):
+    """
+    Merge every rank's edges into one CSR graph on root.
+
+    Each rank collapses its own duplicate edges first, so only distinct
+    weighted pairs travel to root.
+
+    Args:
+        edge_buffer: This rank's EdgeBuffer
+        comm: MPI communicator (optional)
+
+    Returns:
+        CSRGraph: Graph on root, None on other ranks
+    """
+    edges = merge_edges(*edge_buffer.to_weighted_edges())
+
+    if comm and comm.Get_size() > 1:
+        all_edges = comm.gather(edges, root=0)
+        if comm.Get_rank() != 0:
+            return None
+        edges = [np.concatenate(column) for column in zip(*all_edges)]
+
+    return CSRGraph.from_edges(*edges)
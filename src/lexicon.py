@@ -0,0 +1,291 @@
+import json
+import os
+import re
+import numpy as np
+
+# Odd multiplier for the polynomial token hash; odd so it is invertible mod 2**64
+_HASH_BASE = 1099511628211
+_HASH_BASE_INV = pow(_HASH_BASE, -1, 1 << 64)
+
+# HTML entities blanked out of post content before tokenizing
+_HTML_ENTITY = re.compile(rb"&#?[0-9A-Za-z]{1,8};")
+
+# Registry of lexicon file loaders, keyed by format name
+LEXICON_FORMATS = {}
+
+
+def register_lexicon_format(name, *extensions):
+    """
+    Register a loader for a lexicon file format.
+
+    A loader takes a path and returns an iterable of (word, score) pairs.
+
+    Args:
+        name: Format name used with load_lexicon(fmt=...)
+        extensions: File extensions that select this format automatically
+
+    Returns:
+        function: Decorator registering the loader
+    """
+    def decorator(loader):
+        LEXICON_FORMATS[name] = (loader, extensions)
+        return loader
+    return decorator
+
+
+@register_lexicon_format("tsv", ".tsv", ".txt")
+def _load_tsv(path):
+    """Word and score separated by a tab, one per line (AFINN style)."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) >= 2 and parts[0] and not parts[0].startswith("#"):
+                yield parts[0], float(parts[1])
+
+
+@register_lexicon_format("vader", ".vader")
+def _load_vader(path):
+    """VADER lexicon: word, mean score, standard deviation, raw ratings."""
+    return _load_tsv(path)
+
+
+@register_lexicon_format("json", ".json")
+def _load_json(path):
+    """JSON object mapping words to scores."""
+    with open(path, encoding="utf-8") as f:
+        return list(json.load(f).items())
+
+
+def _prefix_hashes(buf):
+    """
+    Prefix sums of a position-weighted polynomial hash over a byte buffer.
+
+    With S[k] = sum((b[j] + 1) * B**j for j < k) mod 2**64, the hash of the
+    slice b[i:j] is (S[j] - S[i]) * B**-i, independent of where the slice
+    sits in the buffer. All arithmetic wraps modulo 2**64 in uint64.
+
+    Args:
+        buf: uint8 array
+
+    Returns:
+        tuple: (prefix sums S, inverse powers B**-i), both of length len(buf) + 1
+    """
+    n = len(buf)
+    powers = np.ones(n + 1, dtype=np.uint64)
+    inverse_powers = np.ones(n + 1, dtype=np.uint64)
+    if n:
+        np.cumprod(np.full(n, _HASH_BASE, dtype=np.uint64), out=powers[1:])
+        np.cumprod(np.full(n, _HASH_BASE_INV, dtype=np.uint64), out=inverse_powers[1:])
+    prefix = np.zeros(n + 1, dtype=np.uint64)
+    np.cumsum((buf.astype(np.uint64) + np.uint64(1)) * powers[:n], out=prefix[1:])
+    return prefix, inverse_powers
+
+
+def tokenize(buf):
+    """
+    Lowercase a byte buffer and find its tokens without a Python-level loop.
+
+    Tokens are runs of ASCII letters, digits and apostrophes, plus any
+    non-ASCII bytes so UTF-8 encoded words in other scripts stay whole.
+
+    Args:
+        buf: uint8 array of text
+
+    Returns:
+        tuple: (starts, ends, token_hashes) arrays, one entry per token
+    """
+    upper = (buf >= 65) & (buf <= 90)
+    buf = np.where(upper, buf + 32, buf).astype(np.uint8)
+
+    is_token = (
+        ((buf >= 97) & (buf <= 122))
+        | ((buf >= 48) & (buf <= 57))
+        | (buf == 39)
+        | (buf >= 128)
+    )
+    edges = np.diff(np.concatenate(([False], is_token, [False])).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    prefix, inverse_powers = _prefix_hashes(buf)
+    hashes = (prefix[ends] - prefix[starts]) * inverse_powers[starts]
+    return starts, ends, hashes
+
+
+def strip_tags(buf, separators):
+    """
+    Blank out HTML tags in a byte buffer with array operations.
+
+    A byte is inside a tag when the last "<" at or before it comes after
+    the last ">" (or post separator) before it.
+
+    Args:
+        buf: uint8 array of joined post texts
+        separators: Indices of the bytes separating posts
+
+    Returns:
+        np.ndarray: Copy of buf with tag bytes replaced by spaces
+    """
+    index = np.arange(len(buf))
+    last_open = np.maximum.accumulate(np.where(buf == 60, index, -1))
+    closes = np.where(buf == 62, index, -1)
+    closes[separators] = separators
+    last_close = np.maximum.accumulate(closes)
+    return np.where(last_open > last_close, np.uint8(32), buf)
+
+
+def _blank(match):
+    return b" " * len(match.group())
+
+
+class Lexicon:
+    """
+    Word scores stored as a sorted table of 64-bit token hashes.
+
+    Lookups for a whole batch of tokens are one np.searchsorted call.
+    """
+
+    def __init__(self, words_and_scores):
+        """
+        Build the hashed table.
+
+        Args:
+            words_and_scores: Iterable of (word, score) pairs
+        """
+        words = []
+        scores = []
+        for word, score in words_and_scores:
+            words.append(word.lower().encode("utf-8"))
+            scores.append(score)
+
+        # Hash every word with the same routine used for post text, keeping
+        # only entries that form exactly one token (phrases cannot match)
+        offsets = np.cumsum([0] + [len(w) + 1 for w in words])
+        starts, _, hashes = tokenize(np.frombuffer(b"\n".join(words) + b"\n", dtype=np.uint8))
+        word_index = np.searchsorted(offsets, starts, side="right") - 1
+        single = np.bincount(word_index, minlength=len(words))[word_index] == 1
+        hashes = hashes[single]
+        scores = np.asarray(scores, dtype=np.float64)[word_index[single]]
+
+        order = np.argsort(hashes, kind="stable")
+        self.hashes = hashes[order]
+        self.scores = scores[order]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def lookup(self, token_hashes):
+        """
+        Score an array of token hashes; unknown tokens score 0.
+
+        Args:
+            token_hashes: uint64 array of token hashes
+
+        Returns:
+            tuple: (scores, matched) arrays
+        """
+        if len(self.hashes) == 0:
+            return np.zeros(len(token_hashes)), np.zeros(len(token_hashes), dtype=bool)
+        index = np.minimum(np.searchsorted(self.hashes, token_hashes), len(self.hashes) - 1)
+        matched = self.hashes[index] == token_hashes
+        return np.where(matched, self.scores[index], 0.0), matched
+
+
+def load_lexicon(path, fmt=None):
+    """
+    Load a lexicon file using a registered format.
+
+    Args:
+        path: Path to the lexicon file
+        fmt: Format name; inferred from the file extension if omitted
+
+    Returns:
+        Lexicon: Hashed lexicon table
+
+    Raises:
+        ValueError: If the format is unknown
+    """
+    if fmt is None:
+        extension = os.path.splitext(path)[1].lower()
+        fmt = next((name for name, (_, exts) in LEXICON_FORMATS.items() if extension in exts), None)
+    if fmt not in LEXICON_FORMATS:
+        raise ValueError(f"Unknown lexicon format for {path}: {fmt}")
+    loader, _ = LEXICON_FORMATS[fmt]
+    return Lexicon(loader(path))
+
+
+class BatchSentimentScorer:
+    """
+    Scores posts that lack a sentiment value, a batch at a time.
+
+    Posts are deferred into a buffer; when it fills up, their content is
+    joined into one byte buffer, stripped of HTML, tokenized, hashed and
+    looked up with array operations, and each post's score is handed back
+    through the apply callback. A post scores the sum of its token scores
+    divided by its token count.
+    """
+
+    def __init__(self, lexicon, apply, batch_size=2048):
+        """
+        Initialize the scorer.
+
+        Args:
+            lexicon: Lexicon to score tokens with
+            apply: Callback apply(record, score) run for every scored post
+            batch_size: Number of posts to buffer before scoring
+        """
+        self.lexicon = lexicon
+        self.apply = apply
+        self.batch_size = batch_size
+        self.records = []
+        self.texts = []
+        self.scored = 0
+
+    def defer(self, record, text):
+        """
+        Queue a post for scoring, scoring the batch once it is full.
+
+        Args:
+            record: Object passed back to the apply callback
+            text: HTML content of the post
+        """
+        self.records.append(record)
+        self.texts.append(text or "")
+        if len(self.records) >= self.batch_size:
+            self.flush()
+
+    def score_texts(self, texts):
+        """
+        Score a batch of HTML texts.
+
+        Args:
+            texts: List of strings
+
+        Returns:
+            np.ndarray: One score per text
+        """
+        encoded = [text.encode("utf-8") for text in texts]
+        offsets = np.cumsum([0] + [len(e) + 1 for e in encoded])
+
+        # Blanking keeps every byte in place, so post offsets stay valid
+        joined = _HTML_ENTITY.sub(_blank, b"\n".join(encoded) + b"\n")
+        buf = strip_tags(np.frombuffer(joined, dtype=np.uint8), offsets[1:] - 1)
+
+        starts, _, hashes = tokenize(buf)
+        token_scores, _ = self.lexicon.lookup(hashes)
+        post_index = np.searchsorted(offsets, starts, side="right") - 1
+
+        totals = np.bincount(post_index, weights=token_scores, minlength=len(texts))
+        counts = np.bincount(post_index, minlength=len(texts))
+        return totals / np.maximum(counts, 1)
+
+    def flush(self):
+        """Score all buffered posts and apply their scores."""
+        if not self.records:
+            return
+        scores = self.score_texts(self.texts)
+        for record, score in zip(self.records, scores.tolist()):
+            self.apply(record, score)
+        self.scored += len(self.records)
+        self.records = []
+        self.texts = []
@@ -1,32 +1,85 @@
 import argparse
 import heapq
-import operator
 import time
 import os
 from collections import defaultdict
-import numpy as np
 from mpi4py import MPI
 from util import (
-    read_data_chunk, preprocess_data, dump_time, count_lines,
-    processing_data, merge_list, dump_happiest_hours, dump_saddest_hours,
-    dump_happiest_users, dump_saddest_users, dump_num_processor
+    read_records, partition_units, dump_time, processing_data, accumulate_sentiment,
+    dump_happiest_hours, dump_saddest_hours, dump_happiest_users, dump_saddest_users, dump_num_processor,
+    dump_sample_estimates, peak_rss_mb, process_uptime, time_to_first_record, format_startup, write_startup
 )
+from metrics import ProgressMonitor
+from accounts import AccountCache, format_account_stats
+from validation import RecordValidator, ValidationAbort, merge_summaries, format_validation, write_quarantine
+from workers import resolve_threads
+from shards import expand_inputs, plan_units, shard_fingerprint, ShardCache, add_aggregates
 
-def main(mastodon_data_path, output_dir=None):
+# Modules needed only by optional features (sampling, spilling, lexicon
+# scoring, filtering, timelines, multi-rank reduction) are imported where
+# they are used, so a rank does not search the shared filesystem for them,
+# or load numpy, unless the run needs them
+
+def main(mastodon_data_path, output_dir=None, sample=None, mem_budget=None, spill_dir=None,
+         lexicon_path=None, lexicon_format=None, time_from=None, time_to=None, language=None,
+         metrics_interval=10.0, metrics_file=None, timelines_dir=None, threads=None,
+         abort_after=5000, abort_rate=0.5, quarantine_samples=1000, cache_dir=None, sample_seed=0):
     """
     Main function to analyze Mastodon data in parallel.
     
     Args:
-        mastodon_data_path (str): Path to the Mastodon NDJSON file
+        mastodon_data_path (str): Mastodon NDJSON file, directory of shard
+            files, or glob pattern matching them
         output_dir (str, optional): Directory to save output files
+        sample (float, optional): Fraction of the file to sample for a fast
+            approximate preview instead of a full pass
+        mem_budget (float, optional): Per-rank memory budget in MB for the
+            user map; above it users are spilled to sorted run files
+        spill_dir (str, optional): Directory shared by all ranks for the
+            run files (default: "spill" under output_dir)
+        lexicon_path (str, optional): Lexicon used to score posts that have
+            no sentiment value instead of counting them as 0
+        lexicon_format (str, optional): Lexicon file format (default:
+            inferred from the file extension)
+        time_from (str, optional): Only analyze posts created at or after
+            this ISO 8601 time
+        time_to (str, optional): Only analyze posts created before this
+            ISO 8601 time
+        language (str, optional): Only analyze posts in this language
+        metrics_interval (float, optional): Seconds between live progress
+            snapshots from every rank
+        metrics_file (str, optional): Prometheus textfile rewritten with
+            each snapshot (default: "metrics.prom" under output_dir)
+        timelines_dir (str, optional): Write per-user hourly sentiment
+            timelines to this directory, shared by all ranks
+        threads (int, optional): Worker threads parsing within each rank
+            (default: one per core of the rank); only used on free-threaded
+            Python builds, elsewhere each rank parses in a single thread
+        abort_after (int, optional): Records each rank parses before
+            judging its failure rate (0 disables the early abort)
+        abort_rate (float, optional): Failure rate above which the job is
+            aborted once abort_after records have been seen
+        quarantine_samples (int, optional): Byte offsets of failing records
+            each rank keeps for the quarantine file
+        cache_dir (str, optional): Directory shared by all ranks keeping
+            per-shard aggregates, so shards unchanged since an earlier run
+            with the same filters and lexicon are not scanned again
+        sample_seed (int, optional): Seed for the placement of the sample
+            blocks; a different seed gives an independent estimate
     """
     program_start = time.time()
     
+    # Interpreter start and imports, up to this point
+    startup_time = process_uptime()
+    
     # MPI initialization
     comm = MPI.COMM_WORLD
     comm_rank = comm.Get_rank()
     comm_size = comm.Get_size()
     
+    # Shard files named by a file path, directory or glob pattern
+    shards = expand_inputs(mastodon_data_path)
+    
     # Create output directory if specified
     if output_dir and comm_rank == 0:
         os.makedirs(output_dir, exist_ok=True)
@@ -35,42 +88,190 @@ def main(mastodon_data_path, output_dir=None):
     if comm_rank == 0:
         dump_num_processor(comm_size)
     
+    # --- Approximate Preview from a Stratified Sample ---
+    if sample:
+        from sampling import sample_estimates
+        
+        sample_start = time.time()
+        estimates = sample_estimates(shards[0], sample, comm, seed=sample_seed)
+        sample_time = time.time() - sample_start
+        dump_time(comm_rank, "sampling", sample_time)
+        all_startup = comm.gather((startup_time, time_to_first_record()), root=0)
+        
+        if comm_rank == 0 and estimates:
+            dump_sample_estimates(estimates, output_dir=output_dir)
+            total_time = time.time() - program_start
+            print(f"Program runs in {total_time:.2f} seconds")
+            print(format_startup(all_startup))
+            
+            if output_dir:
+                with open(os.path.join(output_dir, "runtime.txt"), "w") as f:
+                    f.write(f"Program runs in {total_time:.2f} seconds\n")
+                    f.write(f"Sampling time: {sample_time:.2f} seconds\n")
+                    write_startup(f, all_startup)
+        return
+    
     # Dictionaries for accumulating sentiment data
     hour_sentiment_dict = defaultdict(int)
     user_sentiment_dict = {}
     
-    # --- Parallel File Reading and Processing ---
-    # Count total lines only on root process to avoid duplicate I/O
-    n_lines = None
-    if comm_rank == 0:
-        n_lines = count_lines(mastodon_data_path)
-    # Broadcast the line count to all processes
-    n_lines = comm.bcast(n_lines, root=0)
+    # Spill the user map to disk when it outgrows the memory budget
+    spiller = None
+    if mem_budget:
+        from spill import UserSpiller
+        
+        spiller = UserSpiller(mem_budget, spill_dir or os.path.join(output_dir or ".", "spill"), comm)
     
-    # Calculate chunk size for each process
-    chunk_size = n_lines // comm_size
-    start_line = comm_rank * chunk_size
-    # Last processor takes any remainder lines
-    end_line = start_line + chunk_size if comm_rank < comm_size - 1 else n_lines
+    # Per-user hourly history, kept compact for lookups after the run
+    timelines = None
+    if timelines_dir:
+        from timeline import TimelineBuffer, write_timelines
+        
+        timelines = TimelineBuffer()
     
-    # Process data in chunks for better memory efficiency
-    process_start = time.time()
-    lines_processed = 0
-    max_chunk = 10000  # Process in smaller chunks to manage memory
+    # Account attributes by id, so repeated account objects are not reparsed
+    accounts = AccountCache()
     
-    for chunk_start in range(start_line, end_line, max_chunk):
-        chunk_end = min(chunk_start + max_chunk, end_line)
+    # Failure counters by class, with a sample of bad records' byte offsets
+    validation = RecordValidator(quarantine_samples, abort_after, abort_rate, seed=comm_rank)
+    
+    # Score posts without a sentiment value from their content, in batches;
+    # scores go to the dictionaries currently being filled
+    accumulators = [hour_sentiment_dict, user_sentiment_dict]
+    lexicon = None
+    scorer = None
+    if lexicon_path:
+        from lexicon import BatchSentimentScorer, load_lexicon
+        
+        def apply_score(mastodon_data, score):
+            mastodon_data.sentiment = score
+            accumulate_sentiment(mastodon_data, *accumulators, timelines)
         
-        for line in read_data_chunk(mastodon_data_path, chunk_start, chunk_end):
-            preprocessed_line = preprocess_data(line)
-            if preprocessed_line:
-                processing_data(preprocessed_line, hour_sentiment_dict, user_sentiment_dict)
-                lines_processed += 1
+        lexicon = load_lexicon(lexicon_path, lexicon_format)
+        scorer = BatchSentimentScorer(lexicon, apply_score)
+    
+    # Reuse the aggregates of shards unchanged since an earlier run; timelines
+    # and spilled users are not cached, so those runs scan every shard
+    cache = None
+    if cache_dir and (timelines is not None or spiller):
+        if comm_rank == 0:
+            print(f"Shard cache disabled: {'-timelines' if timelines is not None else '-mem-budget'} "
+                  f"needs every shard scanned")
+    elif cache_dir:
+        cache = ShardCache(cache_dir, {
+            "from": time_from, "to": time_to, "language": language,
+            "lexicon": shard_fingerprint(lexicon_path) if lexicon_path else None,
+        }, comm)
+    
+    # Parse with several threads per rank where the interpreter has no GIL;
+    # spilling watches a single user map and the shard cache stores each
+    # range's aggregates, so both keep one thread
+    n_threads = 1 if spiller or cache else resolve_threads(threads)
+    if comm_rank == 0 and n_threads > 1:
+        print(f"Parsing with {n_threads} threads per processor")
+    elif comm_rank == 0 and threads and threads > 1:
+        reason = "this Python build has a GIL"
+        if spiller:
+            reason = "spilling needs a single user map"
+        elif cache:
+            reason = "the shard cache stores each range's aggregates"
+        print(f"Parsing with 1 thread per processor ({reason})")
+    
+    # --- Parallel File Reading and Processing ---
+    lines_processed = 0
+    max_chunk = 10000  # Check the memory budget every max_chunk records
+    
+    # Live progress of every rank, reported by root
+    if metrics_file is None and output_dir:
+        metrics_file = os.path.join(output_dir, "metrics.prom")
+    
+    # Parse only records in the requested time range and language
+    record_filter = None
+    if time_from or time_to or language:
+        from zonemap import RecordFilter
         
-        # Optional: Progress reporting for long-running jobs
-        if comm_rank == 0 and end_line - start_line > 100000:
-            progress = (chunk_end - start_line) / (end_line - start_line) * 100
-            print(f"Progress: {progress:.1f}% ({chunk_end}/{end_line} lines)")
+        record_filter = RecordFilter(time_from, time_to, language)
+    
+    process_start = time.time()
+    
+    # Load the cached aggregates of unchanged shards, dealt to the ranks
+    scan_shards = shards
+    if cache:
+        scan_shards, pieces = cache.split(shards)
+        for hours, users in cache.load(pieces, comm_size, comm_rank):
+            add_aggregates(hour_sentiment_dict, user_sentiment_dict, hours, users)
+        if comm_rank == 0:
+            print(f"Shard cache: {len(shards) - len(scan_shards)} of {len(shards)} shards unchanged, "
+                  f"{len(scan_shards)} to scan")
+    
+    # Plan every shard as one list of work units, skipping the blocks the
+    # zone maps rule out
+    units, blocks_kept, blocks_total = plan_units(scan_shards, record_filter, comm)
+    if comm_rank == 0 and record_filter:
+        print(f"Zone map: scanning {blocks_kept} of {blocks_total} blocks "
+              f"({sum(end - start for _, start, end in units)} of "
+              f"{sum(os.path.getsize(path) for path in scan_shards)} bytes)")
+    
+    # Each processor takes an equal share of the bytes of all shards, possibly
+    # spanning several of them; lines straddling a cut belong to the processor
+    # where they start
+    my_units = partition_units(units, comm_size, comm_rank)
+    monitor = ProgressMonitor(comm, sum(end - start for _, start, end in my_units), metrics_file,
+                              metrics_interval, check_every=1 if n_threads > 1 else 1000)
+    
+    try:
+        if n_threads > 1:
+            from workers import process_threaded
+            
+            # Each thread fills its own partial aggregates; merge them before any MPI step
+            merged, account_stats = process_threaded(my_units, n_threads, record_filter, lexicon,
+                                                     timelines is not None, monitor, validation)
+            hour_sentiment_dict = merged.hour_sentiment
+            user_sentiment_dict = merged.user_sentiment
+            timelines = merged.timelines
+            scorer = merged.scorer
+            lines_processed = merged.processed
+        else:
+            for path, start_byte, end_byte in my_units:
+                # With a shard cache every unit is aggregated on its own, so it can be stored
+                if cache:
+                    accumulators[:] = [defaultdict(int), {}]
+                hours, users = accumulators
+                validation.source = path
+                for offset, record in read_records(path, start_byte, end_byte):
+                    # Reject on the raw bytes before any JSON parsing
+                    if record_filter and not record_filter.raw_match(record):
+                        monitor.update(lines=1, nbytes=len(record) + 1, work=len(record) + 1)
+                        continue
+                    parsed = processing_data(record, hours, users, scorer, record_filter, timelines, accounts,
+                                             validation, offset)
+                    lines_processed += 1
+                    monitor.update(lines=1, nbytes=len(record) + 1, parse_errors=int(not parsed),
+                                   work=len(record) + 1)
+                    
+                    if spiller and lines_processed % max_chunk == 0:
+                        spiller.maybe_spill(user_sentiment_dict)
+                
+                if cache:
+                    if scorer:
+                        scorer.flush()
+                    cache.store(path, start_byte, end_byte, hours, users)
+                    add_aggregates(hour_sentiment_dict, user_sentiment_dict, hours, users)
+            
+            # Score the last partial batch of posts lacking sentiment
+            if scorer:
+                scorer.flush()
+            account_stats = accounts.stats()
+    except ValidationAbort as e:
+        # The other ranks are blocked in or heading for collectives; stop the whole job
+        print(f"Processor #{comm_rank}: aborting: {e}", flush=True)
+        comm.Abort(1)
+    
+    # Record the scanned shards once every rank has stored its units
+    if cache:
+        cache.commit()
+    
+    monitor.finish()
     
     process_time = time.time() - process_start
     dump_time(comm_rank, "data processing", process_time)
@@ -79,30 +280,28 @@ def main(mastodon_data_path, output_dir=None):
     top_n = 5
     calculate_top_n_start = time.time()
     
+    # Once any rank has spilled, users are ranked by merging the run files
+    spilled = spiller is not None and spiller.spilled
+    if comm_size > 1:
+        spilled = comm.allreduce(spilled, op=MPI.LOR)
+    if spilled:
+        spilled_happiest_users, spilled_saddest_users = spiller.top_n_users(user_sentiment_dict, top_n)
+    
     if comm_size > 1:
-        # Reduce hour sentiment dictionaries across processors using MPI.Op.Create
-        all_hour_data = comm.gather(hour_sentiment_dict, root=0)
-        all_user_data = comm.gather(user_sentiment_dict, root=0)
+        from reduction import (
+            NodeTopology, hierarchical_sum_dicts, hierarchical_merge,
+            hour_to_index, index_to_hour, merge_user_sentiment
+        )
         
-        if comm_rank == 0:
-            # Merge hour sentiment data
-            reduced_hour_sentiment = defaultdict(int)
-            for proc_data in all_hour_data:
-                for hour, score in proc_data.items():
-                    reduced_hour_sentiment[hour] += score
-            
-            # Merge user sentiment data
-            reduced_user_sentiment = {}
-            for proc_data in all_user_data:
-                for user_id, (username, score) in proc_data.items():
-                    if user_id in reduced_user_sentiment:
-                        _, existing_score = reduced_user_sentiment[user_id]
-                        reduced_user_sentiment[user_id] = (username, existing_score + score)
-                    else:
-                        reduced_user_sentiment[user_id] = (username, score)
-        else:
-            reduced_hour_sentiment = None
-            reduced_user_sentiment = None
+        # Two-level reduction: ranks combine through shared memory on each
+        # node, and only node leaders exchange data across the network
+        topology = NodeTopology(comm)
+        reduced_hours = hierarchical_sum_dicts(
+            topology, [hour_sentiment_dict], hour_to_index, index_to_hour
+        )
+        reduced_hour_sentiment = reduced_hours[0] if reduced_hours else None
+        reduced_user_sentiment = hierarchical_merge(topology, user_sentiment_dict, merge_user_sentiment)
+        topology.free()
         
         # Since finding top-n is quick for this dataset size, just do it on root
         if comm_rank == 0:
@@ -124,9 +323,38 @@ def main(mastodon_data_path, output_dir=None):
         reduced_happiest_users = heapq.nlargest(top_n, reduced_user_sentiment.items(), key=lambda x: x[1][1])
         reduced_saddest_users = heapq.nsmallest(top_n, reduced_user_sentiment.items(), key=lambda x: x[1][1])
     
+    if spilled and comm_rank == 0:
+        reduced_happiest_users = spilled_happiest_users
+        reduced_saddest_users = spilled_saddest_users
+    
     calculate_top_n_time = time.time() - calculate_top_n_start
     dump_time(comm_rank, "calculating top-n", calculate_top_n_time)
     
+    # --- Sorted, Memory-Mappable Per-User Timelines ---
+    if timelines is not None:
+        timelines_start = time.time()
+        timelines_meta = write_timelines(timelines, timelines_dir, comm)
+        timelines_time = time.time() - timelines_start
+        dump_time(comm_rank, "writing timelines", timelines_time)
+    
+    # Peak memory per rank, so jobs approaching --mem are visible
+    runs_written = spiller.runs_written if spiller else 0
+    all_memory = comm.gather((peak_rss_mb(), runs_written), root=0)
+    
+    # Fraction of posts whose sentiment came from the lexicon scorer
+    if scorer:
+        total_scored = comm.reduce(scorer.scored, op=MPI.SUM, root=0)
+        total_records = comm.reduce(lines_processed, op=MPI.SUM, root=0)
+    
+    # Reuse of cached account objects, summed over ranks
+    all_account_stats = comm.gather(account_stats, root=0)
+    
+    # Startup cost per rank, which dominates short runs at high rank counts
+    all_startup = comm.gather((startup_time, time_to_first_record()), root=0)
+    
+    # Malformed records by failure class, summed over ranks
+    all_validation = comm.gather(validation.summary(), root=0)
+    
     # --- Output Results on Root ---
     if comm_rank == 0:
         dump_happiest_hours(reduced_happiest_hours, output_dir=output_dir)
@@ -135,6 +363,15 @@ def main(mastodon_data_path, output_dir=None):
         dump_saddest_users(reduced_saddest_users, output_dir=output_dir)
         total_time = time.time() - program_start
         print(f"Program runs in {total_time:.2f} seconds")
+        print(f"Peak memory (RSS): max {max(rss for rss, _ in all_memory):.1f} MB across {comm_size} processors")
+        if scorer:
+            scored_fraction = total_scored / total_records if total_records else 0.0
+            print(f"Lexicon-scored posts: {total_scored} of {total_records} ({scored_fraction:.2%})")
+        account_stats = {key: sum(stats[key] for stats in all_account_stats) for key in all_account_stats[0]}
+        print(format_account_stats(account_stats))
+        print(format_startup(all_startup))
+        validation_summary = merge_summaries(all_validation)
+        print(format_validation(validation_summary))
         
         # Save runtime to output file if directory specified
         if output_dir:
@@ -142,10 +379,79 @@ def main(mastodon_data_path, output_dir=None):
                 f.write(f"Program runs in {total_time:.2f} seconds\n")
                 f.write(f"Data processing time: {process_time:.2f} seconds\n")
                 f.write(f"Top-N calculation time: {calculate_top_n_time:.2f} seconds\n")
+                for rank, (rss, runs) in enumerate(all_memory):
+                    f.write(f"Peak memory (RSS) of processor #{rank}: {rss:.1f} MB ({runs} spill runs)\n")
+                if scorer:
+                    f.write(f"Lexicon-scored posts: {total_scored} of {total_records} ({scored_fraction:.2%})\n")
+                f.write(format_account_stats(account_stats) + "\n")
+                write_startup(f, all_startup)
+                f.write(format_validation(validation_summary) + "\n")
+                if timelines is not None:
+                    f.write(f"Timelines: {timelines_meta['n_entries']} user-hours of "
+                            f"{timelines_meta['n_users']} users in {timelines_time:.2f} seconds\n")
+            
+            # Sampled byte offsets of failing records, to inspect them in the input
+            if validation_summary["samples"]:
+                write_quarantine(os.path.join(output_dir, "quarantine.tsv"), validation_summary, mastodon_data_path)
     
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Mastodon Data Analytics using MPI")
-    parser.add_argument("-data", type=str, required=True, help="Path to Mastodon data file (ndjson)")
+    parser.add_argument("-data", type=str, required=True,
+                        help="Mastodon data file (ndjson), directory of shards or quoted glob pattern")
     parser.add_argument("-output", type=str, help="Directory to save output files")
+    parser.add_argument("-sample", "--sample", type=float, metavar="FRACTION",
+                        help="Estimate results from a random sample of this fraction of the file")
+    parser.add_argument("-seed", type=int, default=0,
+                        help="Seed for the placement of the -sample blocks; vary it to repeat an estimate")
+    parser.add_argument("-mem-budget", type=float, metavar="MB",
+                        help="Per-rank memory budget for user aggregates before spilling to disk")
+    parser.add_argument("-spill-dir", type=str,
+                        help="Directory shared by all ranks for spilled run files")
+    parser.add_argument("-lexicon", type=str,
+                        help="Lexicon file for scoring posts that have no sentiment value")
+    parser.add_argument("-lexicon-format", type=str,
+                        help="Lexicon file format (tsv, vader, json; default: from extension)")
+    parser.add_argument("-from", "--from", dest="time_from", type=str,
+                        help="Only analyze posts created at or after this ISO 8601 time")
+    parser.add_argument("-to", "--to", dest="time_to", type=str,
+                        help="Only analyze posts created before this ISO 8601 time")
+    parser.add_argument("-language", "--language", type=str,
+                        help="Only analyze posts in this language")
+    parser.add_argument("-metrics-interval", type=float, default=10.0, metavar="SECONDS",
+                        help="Seconds between live progress snapshots from every rank")
+    parser.add_argument("-metrics-file", type=str,
+                        help="Prometheus textfile for live metrics (default: metrics.prom in the output directory)")
+    parser.add_argument("-timelines", type=str, metavar="DIR",
+                        help="Write per-user hourly sentiment timelines to this directory (shared by all ranks)")
+    parser.add_argument("-threads", type=int, metavar="N",
+                        help="Parsing threads per rank on free-threaded Python (default: one per core of the rank)")
+    parser.add_argument("-abort-after", type=int, default=5000, metavar="RECORDS",
+                        help="Records each rank parses before aborting on a high failure rate (0: never abort)")
+    parser.add_argument("-abort-rate", type=float, default=0.5, metavar="FRACTION",
+                        help="Failure rate above which the job aborts after -abort-after records")
+    parser.add_argument("-quarantine-samples", type=int, default=1000, metavar="N",
+                        help="Byte offsets of failing records sampled per rank into quarantine.tsv")
+    parser.add_argument("-cache", type=str, metavar="DIR",
+                        help="Keep per-shard aggregates in this directory (shared by all ranks) and skip "
+                             "shards unchanged since the last run")
     args = parser.parse_args()
-    main(args.data, args.output)
\ No newline at end of file
+    
+    # The sample estimates cover every record, so options that select or rescore records do not apply
+    if args.sample:
+        unsupported = [
+            flag for flag, value in (("-from", args.time_from), ("-to", args.time_to), ("-language", args.language),
+                                     ("-lexicon", args.lexicon))
+            if value
+        ]
+        if unsupported:
+            parser.error(f"-sample cannot be combined with {', '.join(unsupported)}")
+        try:
+            shards = expand_inputs(args.data)
+        except FileNotFoundError as e:
+            parser.error(str(e))
+        if len(shards) > 1:
+            parser.error(f"-sample takes a single input file, '{args.data}' has {len(shards)}")
+    main(args.data, args.output, args.sample, args.mem_budget, args.spill_dir,
+         args.lexicon, args.lexicon_format, args.time_from, args.time_to, args.language,
+         args.metrics_interval, args.metrics_file, args.timelines, args.threads,
+         args.abort_after, args.abort_rate, args.quarantine_samples, args.cache, args.seed)
\ No newline at end of file
@@ -0,0 +1,285 @@
+import os
+import statistics
+import time
+from util import peak_rss_mb
+
+# Message tag reserved for progress snapshots sent to the monitor rank
+METRICS_TAG = 7033
+
+# Seconds rank 0 sleeps between polls while waiting for the other ranks to finish
+FINISH_POLL_INTERVAL = 0.1
+
+# A rank projected to finish this many times later than the median is a straggler
+STRAGGLER_FACTOR = 1.5
+
+_PROMETHEUS_METRICS = [
+    ("lines_processed_total", "counter", "Lines read by the rank", "lines"),
+    ("bytes_processed_total", "counter", "Bytes read by the rank", "bytes"),
+    ("parse_errors_total", "counter", "Lines that could not be parsed", "parse_errors"),
+    ("records_per_second", "gauge", "Average lines per second since the rank started", "records_per_second"),
+    ("megabytes_per_second", "gauge", "Average MB read per second since the rank started", "mb_per_second"),
+    ("rss_megabytes", "gauge", "Current resident set size", "rss_mb"),
+    ("progress_ratio", "gauge", "Fraction of the rank's assigned work done", "progress"),
+    ("straggler", "gauge", "1 if the rank is projected to finish well after the others", "straggler"),
+    ("stalled", "gauge", "1 if the rank has made no progress for the stall timeout", "stalled"),
+]
+
+
+def current_rss_mb():
+    """
+    Current resident set size of this process.
+
+    Returns:
+        float: RSS in megabytes (peak RSS where /proc is unavailable)
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def format_duration(seconds):
+    """Format seconds as H:MM:SS."""
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class ProgressMonitor:
+    """
+    Live throughput and progress metrics gathered from every rank.
+
+    Each rank counts its lines, bytes and parse errors and, every interval
+    seconds, publishes a snapshot to rank 0 with a nonblocking send, so
+    reporting never waits on the monitor. Rank 0 drains the snapshots
+    between its own records and prints an aggregated progress bar with an
+    ETA, flags stragglers and stalled ranks, and rewrites a Prometheus
+    textfile-format snapshot (for node_exporter's textfile collector).
+
+    Progress is measured in the rank's own work unit (lines or bytes);
+    only the ratio of work done to work_total is aggregated.
+    """
+
+    def __init__(self, comm, work_total, metrics_path=None, interval=10.0, stall_after=60.0,
+                 check_every=1000):
+        """
+        Initialize the monitor. Not collective.
+
+        Args:
+            comm: MPI communicator (optional)
+            work_total: Amount of work assigned to this rank
+            metrics_path: Prometheus textfile written by rank 0 (optional)
+            interval: Seconds between snapshots
+            stall_after: Seconds without progress before a rank counts as stalled
+            check_every: Updates between clock checks, to keep update() cheap
+        """
+        self.comm = comm
+        self.comm_rank = comm.Get_rank() if comm else 0
+        self.comm_size = comm.Get_size() if comm else 1
+        self.work_total = work_total
+        self.metrics_path = metrics_path
+        self.interval = interval
+        self.stall_after = stall_after
+        self.check_every = check_every
+
+        self.lines = 0
+        self.bytes = 0
+        self.parse_errors = 0
+        self.work_done = 0
+        self.start = time.time()
+        self._next_publish = self.start + interval
+        self._updates = 0
+        self._request = None
+
+        # Latest snapshot and time of last progress per rank, on rank 0
+        self.snapshots = {}
+        self._last_progress = {}
+
+    def update(self, lines=0, nbytes=0, parse_errors=0, work=0):
+        """
+        Count processed input and publish a snapshot when one is due.
+
+        Args:
+            lines: Lines read since the last update
+            nbytes: Bytes read since the last update
+            parse_errors: Lines that failed to parse since the last update
+            work: Work units completed since the last update
+        """
+        self.lines += lines
+        self.bytes += nbytes
+        self.parse_errors += parse_errors
+        self.work_done += work
+        self._updates += 1
+        if self._updates % self.check_every == 0 and time.time() >= self._next_publish:
+            self.publish()
+
+    def snapshot(self, done=False):
+        """
+        Current counters of this rank.
+
+        Args:
+            done: Whether the rank has finished its work
+
+        Returns:
+            dict: Snapshot sent to the monitor
+        """
+        now = time.time()
+        elapsed = max(now - self.start, 1e-9)
+        return {
+            "rank": self.comm_rank,
+            "time": now,
+            "elapsed": elapsed,
+            "lines": self.lines,
+            "bytes": self.bytes,
+            "parse_errors": self.parse_errors,
+            "records_per_second": self.lines / elapsed,
+            "mb_per_second": self.bytes / elapsed / (1024 * 1024),
+            "rss_mb": current_rss_mb(),
+            "progress": 1.0 if done else min(self.work_done / self.work_total, 1.0) if self.work_total else 0.0,
+            "done": done,
+        }
+
+    def publish(self):
+        """Send a snapshot to the monitor, or collect and report on rank 0."""
+        self._next_publish = time.time() + self.interval
+        if self.comm_rank == 0:
+            self._record(self.snapshot())
+            self._drain()
+            self.report()
+            return
+
+        # Skip this snapshot if the previous one is still in flight
+        if self._request is not None and not self._request.Test():
+            return
+        self._request = self.comm.isend(self.snapshot(), dest=0, tag=METRICS_TAG)
+
+    def _record(self, snapshot):
+        previous = self.snapshots.get(snapshot["rank"])
+        if previous is None or snapshot["progress"] > previous["progress"]:
+            self._last_progress[snapshot["rank"]] = time.time()
+        self.snapshots[snapshot["rank"]] = snapshot
+
+    def _drain(self):
+        """Receive every snapshot already waiting at rank 0."""
+        if not self.comm:
+            return
+        while self.comm.iprobe(tag=METRICS_TAG):
+            self._record(self.comm.recv(tag=METRICS_TAG))
+
+    def finish(self):
+        """
+        Send the final snapshot and, on rank 0, wait for every rank's final snapshot.
+
+        While rank 0 waits it keeps draining snapshots and reporting every
+        interval, so progress and straggler flags stay live exactly when
+        the remaining ranks are the stragglers.
+
+        Collective: every rank must call this once after its last update.
+        """
+        if self.comm_rank != 0:
+            if self._request is not None:
+                self._request.wait()
+            self.comm.send(self.snapshot(done=True), dest=0, tag=METRICS_TAG)
+            return
+
+        self._record(self.snapshot(done=True))
+        while self.comm and sum(s["done"] for s in self.snapshots.values()) < self.comm_size:
+            if not self.comm.iprobe(tag=METRICS_TAG):
+                time.sleep(FINISH_POLL_INTERVAL)
+            self._drain()
+            if time.time() >= self._next_publish:
+                self._next_publish = time.time() + self.interval
+                self.report()
+        self.report()
+
+    def _rank_status(self, now):
+        """
+        Projected finish time and straggler/stall flags per reporting rank.
+
+        Returns:
+            dict: rank -> (eta seconds or None, straggler, stalled)
+        """
+        etas = {}
+        for rank, s in self.snapshots.items():
+            if s["done"]:
+                etas[rank] = 0.0
+            elif s["progress"] > 0:
+                etas[rank] = s["elapsed"] * (1 - s["progress"]) / s["progress"] - (now - s["time"])
+            else:
+                etas[rank] = None
+
+        known = [eta for eta in etas.values() if eta is not None]
+        median_eta = statistics.median(known) if known else 0.0
+        status = {}
+        for rank, s in self.snapshots.items():
+            eta = etas[rank]
+            straggler = (not s["done"] and eta is not None and median_eta > 0
+                         and eta > STRAGGLER_FACTOR * median_eta)
+            stalled = not s["done"] and now - self._last_progress.get(rank, self.start) > self.stall_after
+            status[rank] = (eta, straggler, stalled)
+        return status
+
+    def report(self):
+        """Print the aggregated progress line and write the Prometheus textfile (rank 0)."""
+        now = time.time()
+        status = self._rank_status(now)
+        snapshots = self.snapshots.values()
+
+        # Ranks that have not reported yet count as not started
+        progress = sum(s["progress"] for s in snapshots) / self.comm_size
+        pending = len(self.snapshots) < self.comm_size
+        etas = [eta for eta, _, _ in status.values()]
+        eta = None if pending or None in etas else max(etas, default=0.0)
+
+        width = 30
+        filled = int(round(progress * width))
+        line = (
+            f"[{'#' * filled}{'-' * (width - filled)}] {progress:6.1%} "
+            f"{sum(s['lines'] for s in snapshots)} lines, "
+            f"{sum(s['records_per_second'] for s in snapshots):.0f} rec/s, "
+            f"{sum(s['mb_per_second'] for s in snapshots):.1f} MB/s, "
+            f"{sum(s['parse_errors'] for s in snapshots)} parse errors, "
+            f"max RSS {max(s['rss_mb'] for s in snapshots):.0f} MB, "
+            f"ETA {'unknown' if eta is None else format_duration(max(eta, 0.0))}"
+        )
+        stragglers = [f"#{rank}" for rank, (_, straggler, _) in sorted(status.items()) if straggler]
+        stalled = [f"#{rank}" for rank, (_, _, stall) in sorted(status.items()) if stall]
+        if stragglers:
+            line += f" | stragglers: {', '.join(stragglers)}"
+        if stalled:
+            line += f" | stalled: {', '.join(stalled)}"
+        print(line, flush=True)
+
+        if self.metrics_path:
+            self.write_prometheus(status, eta)
+
+    def write_prometheus(self, status, eta):
+        """
+        Atomically rewrite the Prometheus textfile snapshot.
+
+        Args:
+            status: Output of _rank_status
+            eta: Job ETA in seconds, or None if unknown
+        """
+        job = os.environ.get("SLURM_JOB_ID", "local")
+        lines = []
+        for name, kind, help_text, key in _PROMETHEUS_METRICS:
+            lines.append(f"# HELP mastodon_{name} {help_text}")
+            lines.append(f"# TYPE mastodon_{name} {kind}")
+            for rank, s in sorted(self.snapshots.items()):
+                if key == "straggler":
+                    value = int(status[rank][1])
+                elif key == "stalled":
+                    value = int(status[rank][2])
+                else:
+                    value = s[key]
+                lines.append(f'mastodon_{name}{{job="{job}",rank="{rank}"}} {value}')
+        lines.append("# HELP mastodon_eta_seconds Projected seconds until the slowest rank finishes")
+        lines.append("# TYPE mastodon_eta_seconds gauge")
+        lines.append(f'mastodon_eta_seconds{{job="{job}"}} {"NaN" if eta is None else max(eta, 0.0)}')
+
+        tmp_path = self.metrics_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.metrics_path)
@@ -0,0 +1,396 @@
+import argparse
+import importlib.util
+import math
+import os
+import pickle
+import subprocess
+import sys
+import time
+from collections import defaultdict
+import numpy as np
+from MastodonData import MastodonData
+from metrics import current_rss_mb
+from sampling import plan_sample_blocks
+from spill import BYTES_PER_USER_ENTRY
+from util import read_records, processing_data, READ_BUFFER_SIZE
+
+# Safety margins applied to the predictions in the generated job script
+TIME_MARGIN = 1.5
+MEMORY_MARGIN = 1.25
+
+# A layout is worth its extra ranks only if it is this much faster
+RECOMMEND_TOLERANCE = 0.10
+
+SBATCH_TEMPLATE = """#!/bin/bash
+#SBATCH --job-name=mastodon_{name}
+#SBATCH --nodes={nodes}
+#SBATCH --ntasks={ranks}
+#SBATCH --ntasks-per-node={ranks_per_node}
+#SBATCH --cpus-per-task=1
+#SBATCH --time={time}
+#SBATCH --mem={mem}
+#SBATCH --output=./output/logs/mastodon_{name}_%j.out
+#SBATCH --error=./output/logs/mastodon_{name}_%j.err
+
+# Generated by src/plan.py: predicted {predicted_time} wall time, {rank_mb:.0f} MB
+# per rank and {root_mb:.0f} MB on rank 0 for {data}
+
+# Load required modules
+module load Python/3.10.4
+module load mpi4py/3.1.3
+
+# Create output directory
+mkdir -p ./output/results/{result_dir}
+mkdir -p ./output/logs
+
+# Run the MPI program with {ranks} processes on {nodes} node(s)
+srun -n {ranks} --nodes={nodes} --ntasks-per-node={ranks_per_node} python3 ./src/main.py -data $1 -output ./output/results/{result_dir}{extra_args}
+
+# Copy the output to a standardized file for analysis
+cp ./output/results/{result_dir}/runtime.txt ./output/{name}.txt
+
+echo "Job completed"
+"""
+
+
+def format_duration(seconds):
+    """Format seconds as the HH:MM:SS used by --time."""
+    seconds = int(math.ceil(seconds))
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def measure_startup():
+    """
+    Time a fresh interpreter importing the pipeline's dependencies.
+
+    mpi4py.MPI is included when it is installed, since importing it also
+    initialises MPI, which usually dominates a rank's startup.
+
+    Returns:
+        float: Seconds until the imports complete
+    """
+    modules = ["json", "numpy"]
+    if importlib.util.find_spec("mpi4py") is not None:
+        modules.append("mpi4py.MPI")
+    start = time.time()
+    subprocess.run([sys.executable, "-c", f"import {', '.join(modules)}"], check=False, capture_output=True)
+    return time.time() - start
+
+
+def profile_sample(data_path, sample_mb=32, block_size=1 << 20, seed=0):
+    """
+    Sample the input and calibrate per-stage costs on this machine.
+
+    Randomly placed blocks are read into memory once, then JSON parsing
+    and the full per-record processing are each timed over the records
+    already in memory, so every stage cost is measured on its own rather
+    than as the difference of two runs with cold and warm page caches.
+    Distinct users are counted as records accumulate to fit Heaps' law
+    U(n) = K * n**beta, and the user map is pickled and unpickled to
+    calibrate the gather step.
+
+    Args:
+        data_path: Path to the NDJSON file
+        sample_mb: Megabytes of input to sample
+        block_size: Size of each sample block in bytes
+        seed: Seed for the block placement
+
+    Returns:
+        dict: Calibrated profile of the input
+    """
+    file_size = os.path.getsize(data_path)
+    blocks = plan_sample_blocks(file_size, sample_mb * 1024 * 1024 / max(file_size, 1), block_size, seed)
+
+    # Stage 1: read and split records, keeping them for the later stages
+    start = time.perf_counter()
+    records = []
+    n_bytes = 0
+    for block_start, block_end in blocks:
+        for _, record in read_records(data_path, block_start, block_end):
+            records.append(bytes(record))
+            n_bytes += len(record) + 1
+    read_time = time.perf_counter() - start
+    n_records = len(records)
+    if n_records == 0:
+        raise ValueError(f"No records found in {data_path}")
+
+    # Stage 2: parse, tracking distinct-user growth
+    start = time.perf_counter()
+    users = set()
+    growth = []
+    for seen, record in enumerate(records, 1):
+        try:
+            users.add(MastodonData(record).user_id)
+        except ValueError:
+            pass
+        if seen % 256 == 0:
+            growth.append((seen, len(users)))
+    parse_time = time.perf_counter() - start
+    growth.append((n_records, len(users)))
+
+    # Stage 3: full processing into the aggregate dictionaries
+    hour_sentiment_dict = defaultdict(int)
+    user_sentiment_dict = {}
+    start = time.perf_counter()
+    for record in records:
+        processing_data(record, hour_sentiment_dict, user_sentiment_dict)
+    process_time = time.perf_counter() - start
+    del records
+
+    # Gather calibration: serialise and deserialise the user map
+    start = time.perf_counter()
+    payload = pickle.dumps(user_sentiment_dict, protocol=pickle.HIGHEST_PROTOCOL)
+    pickle.loads(payload)
+    pickle_time = time.perf_counter() - start
+
+    counts = np.array(growth, dtype=np.float64)
+    counts = counts[counts[:, 1] > 0]
+    if len(counts) >= 2 and counts[-1, 0] > counts[0, 0]:
+        beta, log_k = np.polyfit(np.log(counts[:, 0]), np.log(counts[:, 1]), 1)
+        beta = min(max(beta, 0.0), 1.0)
+    else:
+        beta, log_k = 1.0, 0.0
+
+    n_users = max(len(user_sentiment_dict), 1)
+    return {
+        "file_size": file_size,
+        "sampled_bytes": n_bytes,
+        "sampled_records": n_records,
+        "bytes_per_record": n_bytes / n_records,
+        "read_mb_per_second": n_bytes / max(read_time, 1e-9) / (1024 * 1024),
+        "read_seconds_per_record": read_time / n_records,
+        "parse_seconds_per_record": parse_time / n_records,
+        "process_seconds_per_record": process_time / n_records,
+        "heaps_k": float(np.exp(log_k)),
+        "heaps_beta": float(beta),
+        "pickled_bytes_per_user": len(payload) / n_users,
+        "pickle_seconds_per_user": pickle_time / n_users,
+        "hours": len(hour_sentiment_dict),
+        "base_rss_mb": current_rss_mb(),
+        "startup_seconds": measure_startup(),
+    }
+
+
+def distinct_users(profile, n_records):
+    """Distinct users expected among n_records records, by Heaps' law."""
+    if n_records <= 0:
+        return 0.0
+    return min(profile["heaps_k"] * n_records ** profile["heaps_beta"], n_records)
+
+
+def predict(profile, ranks, nodes, network_gbps=10.0, fs_mb_per_second=None):
+    """
+    Predict wall time, memory and communication of one layout.
+
+    Every rank reads and processes an equal byte share. The user maps are
+    then merged the way main.py merges them: each node gathers to its
+    leader over shared memory, and the leaders send their node-merged maps
+    to rank 0 over the network.
+
+    Args:
+        profile: Result of profile_sample
+        ranks: Total number of MPI ranks
+        nodes: Number of nodes
+        network_gbps: Inter-node bandwidth in Gbit/s
+        fs_mb_per_second: Aggregate shared filesystem bandwidth in MB/s
+            (optional); caps the combined read rate of all ranks
+
+    Returns:
+        dict: Predicted times in seconds, memory in MB and volume in bytes
+    """
+    ranks_per_node = math.ceil(ranks / nodes)
+    n_records = profile["file_size"] / profile["bytes_per_record"]
+    records_per_rank = n_records / ranks
+
+    read_seconds = records_per_rank * profile["read_seconds_per_record"]
+    if fs_mb_per_second:
+        read_seconds = max(read_seconds, profile["file_size"] / (1024 * 1024) / fs_mb_per_second)
+    # Profiled over records already in memory, so this excludes reading
+    process_seconds = records_per_rank * profile["process_seconds_per_record"]
+
+    users_per_rank = distinct_users(profile, records_per_rank)
+    users_per_node = distinct_users(profile, n_records / nodes)
+    users_total = distinct_users(profile, n_records)
+    pickled = profile["pickled_bytes_per_user"]
+
+    # Volumes: ranks to their node leader, then node leaders to rank 0
+    intra_node_bytes = (ranks - nodes) * users_per_rank * pickled
+    inter_node_bytes = (nodes - 1) * users_per_node * pickled
+    pickle_seconds = profile["pickle_seconds_per_user"] * (
+        (ranks_per_node - 1) * users_per_rank + (nodes - 1) * users_per_node
+    )
+    network_seconds = inter_node_bytes * 8 / (network_gbps * 1e9)
+    reduce_seconds = pickle_seconds + network_seconds
+
+    # Rank 0 holds its own map, the maps gathered from its node, the
+    # node-merged maps from the other leaders, and the final merged map
+    entry_mb = BYTES_PER_USER_ENTRY / (1024 * 1024)
+    pickled_mb = pickled / (1024 * 1024)
+    rank_mb = profile["base_rss_mb"] + READ_BUFFER_SIZE / (1024 * 1024) + users_per_rank * entry_mb
+    root_mb = (
+        rank_mb
+        + (ranks_per_node - 1) * users_per_rank * (pickled_mb + entry_mb)
+        + (nodes - 1) * users_per_node * (pickled_mb + entry_mb)
+        + users_total * entry_mb
+    )
+
+    wall_seconds = profile["startup_seconds"] + read_seconds + process_seconds + reduce_seconds
+    return {
+        "ranks": ranks,
+        "nodes": nodes,
+        "ranks_per_node": ranks_per_node,
+        "records": n_records,
+        "users": users_total,
+        "read_seconds": read_seconds,
+        "process_seconds": process_seconds,
+        "reduce_seconds": reduce_seconds,
+        "wall_seconds": wall_seconds,
+        "rank_mb": rank_mb,
+        "root_mb": root_mb,
+        "root_node_mb": root_mb + (ranks_per_node - 1) * rank_mb,
+        "node_mb": ranks_per_node * rank_mb,
+        "intra_node_bytes": intra_node_bytes,
+        "inter_node_bytes": inter_node_bytes,
+    }
+
+
+def candidate_layouts(max_nodes, cores_per_node):
+    """(ranks, nodes) layouts from one rank up to every core of max_nodes nodes."""
+    per_node = sorted({1, cores_per_node} | {2 ** i for i in range(1, 10) if 2 ** i < cores_per_node})
+    return [(nodes * n, nodes) for nodes in range(1, max_nodes + 1) for n in per_node
+            if nodes == 1 or n > 1]
+
+
+def recommend(predictions, node_mem_mb):
+    """
+    Pick the smallest layout that fits in memory and is close to the fastest.
+
+    Args:
+        predictions: predict() results
+        node_mem_mb: Memory available per node in MB
+
+    Returns:
+        dict: The recommended prediction, or None if no layout fits
+    """
+    fitting = [p for p in predictions if p["root_node_mb"] * MEMORY_MARGIN <= node_mem_mb]
+    if not fitting:
+        return None
+    fastest = min(p["wall_seconds"] for p in fitting)
+    good = [p for p in fitting if p["wall_seconds"] <= fastest * (1 + RECOMMEND_TOLERANCE)]
+    return min(good, key=lambda p: (p["ranks"], p["nodes"]))
+
+
+def render_sbatch(prediction, data_path, extra_args=""):
+    """
+    Fill the job script template for a predicted layout.
+
+    --time and --mem include the TIME_MARGIN and MEMORY_MARGIN margins.
+
+    Args:
+        prediction: predict() result
+        data_path: Input the prediction was made for (for the header comment)
+        extra_args: Extra arguments appended to the main.py command line
+
+    Returns:
+        str: sbatch script
+    """
+    name = f"{prediction['nodes']}n{prediction['ranks']}c"
+    time_limit = max(prediction["wall_seconds"] * TIME_MARGIN, 300)
+    mem_gb = math.ceil(max(prediction["root_node_mb"], prediction["node_mb"]) * MEMORY_MARGIN / 1024)
+    return SBATCH_TEMPLATE.format(
+        name=name,
+        nodes=prediction["nodes"],
+        ranks=prediction["ranks"],
+        ranks_per_node=prediction["ranks_per_node"],
+        time=format_duration(time_limit),
+        mem=f"{mem_gb}G",
+        predicted_time=format_duration(prediction["wall_seconds"]),
+        rank_mb=prediction["rank_mb"],
+        root_mb=prediction["root_mb"],
+        data=os.path.basename(data_path),
+        result_dir=f"plan_{name}",
+        extra_args=f" {extra_args}" if extra_args else "",
+    )
+
+
+def format_plan(profile, predictions, chosen, node_mem_mb):
+    """
+    Render the profile, the layout table and any warnings.
+
+    Args:
+        profile: Result of profile_sample
+        predictions: predict() results
+        chosen: Layout to write the job script for
+        node_mem_mb: Memory available per node in MB
+
+    Returns:
+        list: Output lines
+    """
+    output = [
+        f"Sampled {profile['sampled_records']} records ({profile['sampled_bytes'] / 2 ** 20:.1f} MB): "
+        f"{profile['bytes_per_record']:.0f} bytes/record, read {profile['read_mb_per_second']:.0f} MB/s, "
+        f"{1 / max(profile['parse_seconds_per_record'], 1e-12):.0f} records/s parsed, "
+        f"{1 / max(profile['process_seconds_per_record'], 1e-12):.0f} records/s processed",
+        f"Distinct users U(n) = {profile['heaps_k']:.2f} * n^{profile['heaps_beta']:.3f}; "
+        f"{profile['pickled_bytes_per_user']:.0f} bytes/user pickled",
+        "",
+        f"{'layout':>8} {'time':>9} {'read':>7} {'proc':>7} {'reduce':>7} {'rank MB':>8} {'root MB':>8} "
+        f"{'inter-node':>11}",
+    ]
+    for p in predictions:
+        marker = "*" if p is chosen else " "
+        output.append(
+            f"{marker}{p['nodes']}n{p['ranks']}c".rjust(8) + f" {format_duration(p['wall_seconds']):>9} "
+            f"{p['read_seconds']:>7.1f} {p['process_seconds']:>7.1f} {p['reduce_seconds']:>7.1f} "
+            f"{p['rank_mb']:>8.0f} {p['root_mb']:>8.0f} {p['inter_node_bytes'] / 2 ** 20:>9.1f}MB"
+        )
+
+    if chosen is not None and chosen["root_node_mb"] * MEMORY_MARGIN > node_mem_mb:
+        output.append("")
+        output.append(
+            f"WARNING: gathering user aggregates to rank 0 needs about {chosen['root_mb']:.0f} MB "
+            f"({chosen['root_node_mb']:.0f} MB on its node, {chosen['users']:.0f} users), more than the "
+            f"{node_mem_mb:.0f} MB available per node; set -mem-budget to rank users from spilled runs"
+        )
+    return output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predict runtime and memory and generate a SLURM job script")
+    parser.add_argument("command", choices=["plan"], help="Command to run")
+    parser.add_argument("-data", type=str, required=True, help="Path to Mastodon data file (ndjson)")
+    parser.add_argument("-ranks", type=int, help="Total MPI ranks (default: recommend a layout)")
+    parser.add_argument("-nodes", type=int, default=1, help="Number of nodes for -ranks")
+    parser.add_argument("-max-nodes", type=int, default=2, help="Largest node count to consider")
+    parser.add_argument("-cores-per-node", type=int, default=8, help="Ranks per node to consider at most")
+    parser.add_argument("-node-mem-gb", type=float, default=32, help="Memory available per node in GB")
+    parser.add_argument("-network-gbps", type=float, default=10, help="Inter-node bandwidth in Gbit/s")
+    parser.add_argument("-fs-mbps", type=float, help="Aggregate shared filesystem bandwidth in MB/s")
+    parser.add_argument("-sample-mb", type=float, default=32, help="Megabytes of input to sample")
+    parser.add_argument("-sbatch", type=str, help="Write the job script to this path")
+    parser.add_argument("-main-args", type=str, default="", help="Extra arguments for main.py in the job script")
+    args = parser.parse_args()
+
+    profile = profile_sample(args.data, args.sample_mb)
+    node_mem_mb = args.node_mem_gb * 1024
+    layouts = candidate_layouts(args.max_nodes, args.cores_per_node)
+    if args.ranks and (args.ranks, args.nodes) not in layouts:
+        layouts.append((args.ranks, args.nodes))
+    predictions = [predict(profile, ranks, nodes, args.network_gbps, args.fs_mbps) for ranks, nodes in layouts]
+
+    if args.ranks:
+        chosen = next(p for p in predictions if (p["ranks"], p["nodes"]) == (args.ranks, args.nodes))
+    else:
+        chosen = recommend(predictions, node_mem_mb) or min(predictions, key=lambda p: p["root_node_mb"])
+
+    for line in format_plan(profile, predictions, chosen, node_mem_mb):
+        print(line)
+
+    script = render_sbatch(chosen, args.data, args.main_args)
+    if args.sbatch:
+        with open(args.sbatch, "w") as f:
+            f.write(script)
+        print(f"\nWrote {args.sbatch}; submit with: sbatch {args.sbatch} {args.data}")
+    else:
+        print()
+        print(script)
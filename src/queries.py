@@ -0,0 +1,365 @@
+import heapq
+import math
+from collections import defaultdict, Counter
+
+# Metrics a query can collect
+METRICS = ("hours", "days", "users", "languages", "interactions", "sentiment")
+
+# Record fields a predicate can test, and whether they are boolean
+PREDICATE_FIELDS = {
+    "language": False,
+    "visibility": False,
+    "bot": True,
+    "sensitive": True,
+    "reply": True,
+}
+
+
+def record_fields(mastodon_data):
+    """
+    Extract the fields predicates test, once per record.
+
+    Args:
+        mastodon_data: Parsed post
+
+    Returns:
+        dict: Field name -> value
+    """
+    return {
+        "language": mastodon_data.language,
+        "visibility": mastodon_data.visibility,
+        "bot": mastodon_data.bot,
+        "sensitive": mastodon_data.sensitive,
+        "reply": bool(mastodon_data.in_reply_to_account_id),
+    }
+
+
+def parse_term(text):
+    """
+    Parse one predicate term such as "language=en" or "bot!=true".
+
+    Returns:
+        tuple: (field, value, negated)
+
+    Raises:
+        ValueError: If the term or its field is invalid
+    """
+    negated = "!=" in text
+    field, sep, value = text.partition("!=" if negated else "=")
+    field = field.strip()
+    value = value.strip()
+    if not sep or not field or not value:
+        raise ValueError(f"invalid predicate term '{text}', expected field=value or field!=value")
+    if field not in PREDICATE_FIELDS:
+        raise ValueError(f"unknown predicate field '{field}' (choose from {', '.join(PREDICATE_FIELDS)})")
+    if PREDICATE_FIELDS[field]:
+        if value.lower() not in ("true", "false"):
+            raise ValueError(f"field '{field}' takes true or false, got '{value}'")
+        value = value.lower() == "true"
+    return field, value, negated
+
+
+class Query:
+    """
+    A named slice of the data: a conjunction of predicate terms plus the
+    metrics to collect for records matching all of them.
+
+    Each query keeps its own accumulators; evaluation and merging are
+    driven by a QueryBatch so that all queries share one scan.
+    """
+
+    def __init__(self, name, terms=(), metrics=METRICS):
+        """
+        Initialize the query.
+
+        Args:
+            name: Name the results are reported under
+            terms: Iterable of (field, value, negated) predicate terms;
+                empty matches every record
+            metrics: Iterable of metric names from METRICS
+        """
+        unknown = set(metrics) - set(METRICS)
+        if unknown:
+            raise ValueError(f"unknown metrics {sorted(unknown)} (choose from {', '.join(METRICS)})")
+        self.name = name
+        self.terms = tuple(terms)
+        self.metrics = frozenset(metrics)
+
+        self.hour_sentiment = defaultdict(float)
+        self.hourly_post_counts = defaultdict(int)
+        self.day_sentiment = defaultdict(float)
+        self.user_sentiment = {}
+        self.language_counts = Counter()
+        self.interaction_counts = defaultdict(int)
+        # count, sum, sum of squares, min, max
+        self.sentiment_stats = [0, 0.0, 0.0, math.inf, -math.inf]
+
+    @classmethod
+    def parse(cls, spec):
+        """
+        Build a query from a "NAME:TERMS[:METRICS]" specification.
+
+        TERMS is a comma-separated list of field=value or field!=value
+        terms over language, visibility, bot, sensitive and reply ("*" or
+        empty for all records); METRICS is a comma-separated subset of
+        METRICS (default: all). For example "en-humans:language=en,bot=false:hours,users".
+
+        Raises:
+            ValueError: If the specification is invalid
+        """
+        parts = spec.split(":")
+        if not parts[0] or len(parts) > 3:
+            raise ValueError(f"invalid query '{spec}', expected NAME:TERMS[:METRICS]")
+        terms_text = parts[1].strip() if len(parts) > 1 else ""
+        terms = [] if terms_text in ("", "*") else [parse_term(t) for t in terms_text.split(",")]
+        metrics = [m.strip() for m in parts[2].split(",")] if len(parts) > 2 and parts[2].strip() else METRICS
+        return cls(parts[0], terms, metrics)
+
+    def add_counts(self, language, interactions):
+        """Count a matching record's language and interactions."""
+        if "languages" in self.metrics and language:
+            self.language_counts[language] += 1
+        if "interactions" in self.metrics:
+            for kind, count in interactions.items():
+                self.interaction_counts[kind] += count
+
+    def add_sentiment(self, mastodon_data, hour_key, day_key):
+        """
+        Add a matching record's sentiment.
+
+        Args:
+            mastodon_data: Parsed post with a sentiment value
+            hour_key: "YYYY-MM-DD HH" key, or None for an invalid date
+            day_key: "YYYY-MM-DD" key, or None for an invalid date
+        """
+        sentiment = mastodon_data.sentiment
+        if hour_key is not None:
+            if "hours" in self.metrics:
+                self.hour_sentiment[hour_key] += sentiment
+                self.hourly_post_counts[hour_key] += 1
+            if "days" in self.metrics:
+                self.day_sentiment[day_key] += sentiment
+
+        if "users" in self.metrics and mastodon_data.user_id:
+            entry = self.user_sentiment.get(mastodon_data.user_id)
+            if entry is None:
+                self.user_sentiment[mastodon_data.user_id] = (mastodon_data.username, sentiment, 1)
+            else:
+                self.user_sentiment[mastodon_data.user_id] = (
+                    mastodon_data.username, entry[1] + sentiment, entry[2] + 1
+                )
+
+        if "sentiment" in self.metrics:
+            stats = self.sentiment_stats
+            stats[0] += 1
+            stats[1] += sentiment
+            stats[2] += sentiment * sentiment
+            stats[3] = min(stats[3], sentiment)
+            stats[4] = max(stats[4], sentiment)
+
+    def format(self, format_hour, top_n=5):
+        """
+        Format this query's results for output.
+
+        Args:
+            format_hour: Function turning an hour key into a display range
+            top_n: Number of entries per ranking
+
+        Returns:
+            dict: Formatted results for the selected metrics
+        """
+        formatted = {
+            "where": [
+                f"{field}{'!=' if negated else '='}{str(value).lower() if isinstance(value, bool) else value}"
+                for field, value, negated in self.terms
+            ]
+        }
+
+        if "hours" in self.metrics:
+            hours = self.hour_sentiment.items()
+            formatted["happiest_hours"] = [
+                {"hour": format_hour(hour), "sentiment": score}
+                for hour, score in heapq.nlargest(top_n, hours, key=lambda x: x[1])
+            ]
+            formatted["saddest_hours"] = [
+                {"hour": format_hour(hour), "sentiment": score}
+                for hour, score in heapq.nsmallest(top_n, hours, key=lambda x: x[1])
+            ]
+            formatted["busiest_hours"] = [
+                {"hour": format_hour(hour), "posts": int(count)}
+                for hour, count in heapq.nlargest(top_n, self.hourly_post_counts.items(), key=lambda x: x[1])
+            ]
+
+        if "days" in self.metrics:
+            days = self.day_sentiment.items()
+            formatted["happiest_days"] = [
+                {"day": day, "sentiment": score} for day, score in heapq.nlargest(top_n, days, key=lambda x: x[1])
+            ]
+            formatted["saddest_days"] = [
+                {"day": day, "sentiment": score} for day, score in heapq.nsmallest(top_n, days, key=lambda x: x[1])
+            ]
+
+        if "users" in self.metrics:
+            users = self.user_sentiment.items()
+
+            def format_users(entries):
+                return [
+                    {"id": user_id, "username": info[0], "sentiment": info[1], "posts": info[2]}
+                    for user_id, info in entries
+                ]
+
+            formatted["happiest_users"] = format_users(heapq.nlargest(top_n, users, key=lambda x: x[1][1]))
+            formatted["saddest_users"] = format_users(heapq.nsmallest(top_n, users, key=lambda x: x[1][1]))
+            formatted["most_active_users"] = format_users(heapq.nlargest(top_n, users, key=lambda x: x[1][2]))
+
+        if "languages" in self.metrics:
+            formatted["top_languages"] = [
+                {"language": lang, "posts": count} for lang, count in self.language_counts.most_common(top_n)
+            ]
+
+        if "interactions" in self.metrics:
+            formatted["interaction_stats"] = dict(self.interaction_counts)
+
+        if "sentiment" in self.metrics:
+            count, total, total_sq, low, high = self.sentiment_stats
+            mean = total / count if count else 0
+            formatted["sentiment_stats"] = {
+                "mean": mean,
+                "std": math.sqrt(max(total_sq / count - mean * mean, 0.0)) if count else 0,
+                "min": low if count else 0,
+                "max": high if count else 0,
+                "total_posts": count
+            }
+
+        return formatted
+
+
+def _merge_small_aggregates(parts):
+    """Merge per-rank (language counts, interaction counts, sentiment stats) lists of all queries."""
+    merged = None
+    for part in parts:
+        if merged is None:
+            merged = [(Counter(langs), defaultdict(int, inter), list(stats)) for langs, inter, stats in part]
+            continue
+        for (langs, inter, stats), (other_langs, other_inter, other_stats) in zip(merged, part):
+            langs.update(other_langs)
+            for kind, count in other_inter.items():
+                inter[kind] += count
+            stats[0] += other_stats[0]
+            stats[1] += other_stats[1]
+            stats[2] += other_stats[2]
+            stats[3] = min(stats[3], other_stats[3])
+            stats[4] = max(stats[4], other_stats[4])
+    return merged
+
+
+def _merge_query_users(parts):
+    """Merge per-rank lists of user sentiment dicts, one dict per query."""
+    from reduction import merge_user_sentiment
+    return [merge_user_sentiment(dicts) for dicts in zip(*parts)]
+
+
+class QueryBatch:
+    """
+    Many named queries evaluated together in a single scan.
+
+    Per record, the fields predicates test are extracted once and every
+    distinct predicate term across the batch is evaluated once; each query
+    then only combines the shared term results. Merging is batched too:
+    all queries' hour and day arrays are summed in one shared-memory
+    reduction each, and their remaining aggregates travel together.
+    """
+
+    def __init__(self, queries):
+        """
+        Initialize the batch.
+
+        Args:
+            queries: List of Query objects with unique names
+        """
+        names = [query.name for query in queries]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"duplicate query names: {', '.join(duplicates)}")
+        self.queries = list(queries)
+
+        # Deduplicate predicate terms and record which ones each query needs
+        self.terms = []
+        term_index = {}
+        self._query_terms = []
+        for query in self.queries:
+            indices = []
+            for field, value, negated in query.terms:
+                key = (field, value)
+                if key not in term_index:
+                    term_index[key] = len(self.terms)
+                    self.terms.append(key)
+                indices.append((term_index[key], negated))
+            self._query_terms.append(tuple(indices))
+
+    def __len__(self):
+        return len(self.queries)
+
+    def match(self, mastodon_data):
+        """
+        Evaluate every query's predicate against one record.
+
+        Args:
+            mastodon_data: Parsed post
+
+        Returns:
+            list: Queries the record matches
+        """
+        fields = record_fields(mastodon_data)
+        results = [fields[field] == value for field, value in self.terms]
+        return [
+            query for query, indices in zip(self.queries, self._query_terms)
+            if all(results[i] != negated for i, negated in indices)
+        ]
+
+    def merge(self, topology):
+        """
+        Merge every query's accumulators onto global rank 0.
+
+        Collective over the topology's communicator; every rank must hold
+        the same queries in the same order.
+
+        Args:
+            topology: NodeTopology of the communicator
+        """
+        from reduction import (
+            hierarchical_sum_dicts, hierarchical_merge,
+            hour_to_index, index_to_hour, day_to_index, index_to_day
+        )
+
+        hours = [d for query in self.queries for d in (query.hour_sentiment, query.hourly_post_counts)]
+        merged_hours = hierarchical_sum_dicts(topology, hours, hour_to_index, index_to_hour)
+        merged_days = hierarchical_sum_dicts(
+            topology, [query.day_sentiment for query in self.queries], day_to_index, index_to_day
+        )
+        merged_users = hierarchical_merge(
+            topology, [query.user_sentiment for query in self.queries], _merge_query_users
+        )
+        merged_small = hierarchical_merge(
+            topology,
+            [(query.language_counts, query.interaction_counts, query.sentiment_stats) for query in self.queries],
+            _merge_small_aggregates
+        )
+        if topology.comm.Get_rank() != 0:
+            return
+
+        for i, query in enumerate(self.queries):
+            query.hour_sentiment = merged_hours[2 * i]
+            query.hourly_post_counts = merged_hours[2 * i + 1]
+            query.day_sentiment = merged_days[i]
+            query.user_sentiment = merged_users[i]
+            query.language_counts, query.interaction_counts, query.sentiment_stats = merged_small[i]
+
+    def format(self, format_hour, top_n=5):
+        """
+        Format all query results for output.
+
+        Returns:
+            dict: Query name -> formatted results
+        """
+        return {query.name: query.format(format_hour, top_n) for query in self.queries}
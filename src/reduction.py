@@ -0,0 +1,215 @@
+import datetime
+import numpy as np
+from mpi4py import MPI
+
+HOUR_FORMAT = "%Y-%m-%d %H"
+DAY_FORMAT = "%Y-%m-%d"
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+
+
+def hour_to_index(hour_key):
+    """
+    Convert a "YYYY-MM-DD HH" key to hours since the Unix epoch.
+
+    Keys are split by hand rather than with strptime: strftime writes
+    years before 1000 without zero padding (e.g. "1-01-01 00"), which
+    %Y cannot read back.
+    """
+    day_key, hour = hour_key.rsplit(" ", 1)
+    return day_to_index(day_key) * 24 + int(hour)
+
+
+def index_to_hour(index):
+    """Convert hours since the Unix epoch back to a "YYYY-MM-DD HH" key."""
+    return (_EPOCH + datetime.timedelta(hours=int(index))).strftime(HOUR_FORMAT)
+
+
+def day_to_index(day_key):
+    """Convert a "YYYY-MM-DD" key to days since the Unix epoch."""
+    year, month, day = day_key.split("-")
+    return datetime.date(int(year), int(month), int(day)).toordinal() - _EPOCH_ORDINAL
+
+
+def index_to_day(index):
+    """Convert days since the Unix epoch back to a "YYYY-MM-DD" key."""
+    return (_EPOCH + datetime.timedelta(days=int(index))).strftime(DAY_FORMAT)
+
+
+def merge_user_sentiment(user_dicts):
+    """
+    Merge user_id -> (username, value, ...) dicts by summing the values.
+
+    Works for both the (username, score) tuples of main.py and the
+    (username, score, count) tuples of MastodonAnalyzer.
+
+    Args:
+        user_dicts: Iterable of user sentiment dicts
+
+    Returns:
+        dict: Merged user sentiment dict
+    """
+    merged = {}
+    for proc_data in user_dicts:
+        for user_id, entry in proc_data.items():
+            existing = merged.get(user_id)
+            if existing is None:
+                merged[user_id] = entry
+            else:
+                merged[user_id] = (entry[0],) + tuple(a + b for a, b in zip(existing[1:], entry[1:]))
+    return merged
+
+
+def _empty_like(d):
+    """Create an empty dict of the same kind (dict or defaultdict) as d."""
+    if getattr(d, "default_factory", None) is not None:
+        return type(d)(d.default_factory)
+    return type(d)()
+
+
+class NodeTopology:
+    """
+    Communicators for a two-level, node-aware reduction.
+
+    Ranks are grouped by the shared-memory node they run on. Within a node
+    they combine through shared memory; only one leader per node (node rank
+    0) talks across the network. Global rank 0 is always the leader of its
+    node and rank 0 of the leader communicator.
+    """
+
+    def __init__(self, comm):
+        """
+        Split a communicator by node.
+
+        Args:
+            comm: MPI communicator spanning all ranks
+        """
+        self.comm = comm
+        self.node_comm = comm.Split_type(MPI.COMM_TYPE_SHARED, key=comm.Get_rank())
+        self.node_rank = self.node_comm.Get_rank()
+        self.node_size = self.node_comm.Get_size()
+
+        color = 0 if self.node_rank == 0 else MPI.UNDEFINED
+        self.leader_comm = comm.Split(color, key=comm.Get_rank())
+
+    @property
+    def is_leader(self):
+        return self.node_rank == 0
+
+    def allreduce(self, value, op):
+        """
+        Reduce a small value over all ranks, crossing nodes once per node.
+
+        Args:
+            value: Picklable value to reduce
+            op: MPI reduction operation (e.g. MPI.MIN)
+
+        Returns:
+            Reduced value on every rank
+        """
+        value = self.node_comm.reduce(value, op=op, root=0)
+        if self.is_leader:
+            value = self.leader_comm.allreduce(value, op=op)
+        return self.node_comm.bcast(value, root=0)
+
+    def free(self):
+        """Release the node and leader communicators."""
+        if self.leader_comm != MPI.COMM_NULL:
+            self.leader_comm.Free()
+        self.node_comm.Free()
+
+
+def hierarchical_sum_dicts(topology, dicts, to_index, from_index):
+    """
+    Sum time-keyed dicts over all ranks through per-node shared memory.
+
+    Keys are mapped to integer indices, and the sorted union of the indices
+    occupied on any rank is agreed on first (one gather per node and one
+    allgather among the leaders), so arrays are as long as the number of
+    distinct keys rather than the span between the earliest and latest;
+    one outlying timestamp cannot blow up the buffer. Every rank scatters
+    its values straight into its own row of a node-wide
+    MPI.Win.Allocate_shared buffer, the node leader sums the rows, and only
+    the leaders reduce the per-node arrays to global rank 0.
+
+    Args:
+        topology: NodeTopology of the communicator
+        dicts: List of key -> number dicts sharing one key space
+        to_index: Function mapping a key to an integer index
+        from_index: Function mapping an integer index back to a key
+
+    Returns:
+        list: One merged dict per input dict on global rank 0, None elsewhere;
+        merged values are floats
+    """
+    local_index = {key: to_index(key) for d in dicts for key in d}
+    local_keys = np.unique(np.fromiter(local_index.values(), dtype=np.int64, count=len(local_index)))
+    node_keys = topology.node_comm.gather(local_keys, root=0)
+    keys = None
+    if topology.is_leader:
+        keys = np.unique(np.concatenate(node_keys))
+        keys = np.unique(np.concatenate(topology.leader_comm.allgather(keys)))
+    keys = topology.node_comm.bcast(keys, root=0)
+    if len(keys) == 0:
+        return [_empty_like(d) for d in dicts] if topology.comm.Get_rank() == 0 else None
+    position = dict(zip(local_index, np.searchsorted(keys, list(local_index.values())).tolist()))
+
+    n_rows = len(dicts)
+    n_keys = len(keys)
+    itemsize = MPI.DOUBLE.Get_size()
+    nbytes = topology.node_size * n_rows * n_keys * itemsize if topology.is_leader else 0
+    win = MPI.Win.Allocate_shared(nbytes, itemsize, comm=topology.node_comm)
+    buf, _ = win.Shared_query(0)
+    shared = np.ndarray(buffer=buf, dtype=np.float64, shape=(topology.node_size, n_rows, n_keys))
+
+    win.Fence()
+    row = shared[topology.node_rank]
+    row.fill(0.0)
+    for i, d in enumerate(dicts):
+        for key, value in d.items():
+            row[i, position[key]] += value
+    win.Fence()
+
+    merged = None
+    if topology.is_leader:
+        node_total = shared.sum(axis=0)
+        total = np.empty_like(node_total) if topology.comm.Get_rank() == 0 else None
+        topology.leader_comm.Reduce(node_total, total, op=MPI.SUM, root=0)
+
+        if topology.comm.Get_rank() == 0:
+            # Every key in the union was seen on some rank, even if its values sum to zero
+            merged_keys = [from_index(index) for index in keys.tolist()]
+            merged = []
+            for i, d in enumerate(dicts):
+                result = _empty_like(d)
+                for key, value in zip(merged_keys, total[i].tolist()):
+                    result[key] = value
+                merged.append(result)
+    win.Free()
+    return merged
+
+
+def hierarchical_merge(topology, obj, merge):
+    """
+    Merge per-rank objects in two levels: within each node, then across nodes.
+
+    Ranks on a node send their object to the node leader, which merges
+    them; only the merged per-node objects cross the network to rank 0.
+
+    Args:
+        topology: NodeTopology of the communicator
+        obj: This rank's picklable partial result
+        merge: Function merging a list of partial results into one
+
+    Returns:
+        Merged object on global rank 0, None elsewhere
+    """
+    node_parts = topology.node_comm.gather(obj, root=0)
+    if not topology.is_leader:
+        return None
+
+    node_merged = merge(node_parts)
+    all_parts = topology.leader_comm.gather(node_merged, root=0)
+    if topology.comm.Get_rank() != 0:
+        return None
+    return merge(all_parts)
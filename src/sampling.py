@@ -0,0 +1,294 @@
+import math
+import os
+import random
+from collections import defaultdict
+from util import read_records, processing_data
+
+# Size of each randomly placed sample block in bytes
+DEFAULT_BLOCK_SIZE = 1 << 20
+
+# z-score for a two-sided 95% confidence interval
+Z_95 = 1.96
+
+# Fewest blocks a sample is planned with; one block gives no variance estimate
+MIN_SAMPLE_BLOCKS = 2
+
+
+class SampleAccumulator:
+    """
+    Running per-block totals for a stratified cluster sample.
+
+    Every sampled block is one sample unit. For each key (hour or user) the
+    accumulator keeps the sum and the sum of squares of the per-block totals,
+    which is all that is needed to scale the sample up to an estimate of the
+    full-file total and to attach a standard error to it. Keys that do not
+    appear in a block contribute a zero for that block implicitly.
+    """
+
+    def __init__(self):
+        self.n_blocks = 0
+        self.sampled_bytes = 0
+        self.records = 0
+        self.records_sq = 0
+        self.hour_sum = defaultdict(float)
+        self.hour_sumsq = defaultdict(float)
+        self.user_sum = defaultdict(float)
+        self.user_sumsq = defaultdict(float)
+        self.usernames = {}
+
+    def add_block(self, n_bytes, n_records, hour_sentiment_dict, user_sentiment_dict):
+        """
+        Fold the totals of one sampled block into the accumulator.
+
+        Args:
+            n_bytes: Number of bytes read for the block
+            n_records: Number of records processed in the block
+            hour_sentiment_dict: Hour -> sentiment total within the block
+            user_sentiment_dict: user_id -> (username, score) within the block
+        """
+        self.n_blocks += 1
+        self.sampled_bytes += n_bytes
+        self.records += n_records
+        self.records_sq += n_records * n_records
+
+        for hour, score in hour_sentiment_dict.items():
+            self.hour_sum[hour] += score
+            self.hour_sumsq[hour] += score * score
+
+        for user_id, (username, score) in user_sentiment_dict.items():
+            self.user_sum[user_id] += score
+            self.user_sumsq[user_id] += score * score
+            self.usernames[user_id] = username
+
+    def merge(self, other):
+        """
+        Merge another rank's accumulator into this one.
+
+        Args:
+            other: SampleAccumulator from another process
+        """
+        self.n_blocks += other.n_blocks
+        self.sampled_bytes += other.sampled_bytes
+        self.records += other.records
+        self.records_sq += other.records_sq
+
+        for target, source in (
+            (self.hour_sum, other.hour_sum),
+            (self.hour_sumsq, other.hour_sumsq),
+            (self.user_sum, other.user_sum),
+            (self.user_sumsq, other.user_sumsq),
+        ):
+            for key, value in source.items():
+                target[key] += value
+        self.usernames.update(other.usernames)
+
+
+def plan_sample_blocks(file_size, fraction, block_size=DEFAULT_BLOCK_SIZE, seed=0):
+    """
+    Choose randomly placed byte blocks spread evenly across a file.
+
+    The file is cut into equal-width strata and one block is placed at a
+    random offset inside each stratum, so the sample covers the whole time
+    span of a roughly time-ordered dump instead of clustering in one place.
+    At least MIN_SAMPLE_BLOCKS blocks are planned, however small the
+    fraction or the file, so every estimate has a confidence interval.
+
+    Args:
+        file_size: Size of the file in bytes
+        fraction: Fraction of the file to read (0 < fraction <= 1)
+        block_size: Size of each sample block in bytes
+        seed: Seed for the random block placement
+
+    Returns:
+        list: Sorted (start_byte, end_byte) tuples
+    """
+    if file_size <= 0:
+        return []
+
+    fraction = min(max(fraction, 0.0), 1.0)
+    n_strata = max(MIN_SAMPLE_BLOCKS, math.ceil(file_size * fraction / block_size))
+    stratum_width = file_size / n_strata
+    rng = random.Random(seed)
+
+    blocks = []
+    for i in range(n_strata):
+        stratum_start = i * stratum_width
+        slack = stratum_width - block_size
+        if slack > 0:
+            start = int(stratum_start + rng.random() * slack)
+            end = start + block_size
+        else:
+            # Stratum is no wider than a block: read all of it
+            start = int(stratum_start)
+            end = int(stratum_start + stratum_width)
+        blocks.append((start, min(end, file_size)))
+    return blocks
+
+
+def _estimate(total, total_sq, n_blocks, n_units):
+    """
+    Scale a sample total to a full-file estimate with a 95% interval.
+
+    Blocks are treated as a simple random sample of n_units equal-sized
+    units, which slightly overstates the variance of the stratified design
+    and therefore gives conservative intervals.
+
+    Args:
+        total: Sum of the per-block values
+        total_sq: Sum of squares of the per-block values
+        n_blocks: Number of sampled blocks
+        n_units: Number of block-sized units in the whole file
+
+    Returns:
+        tuple: (estimate, ci_low, ci_high); the interval bounds are None
+        when fewer than two blocks were sampled, as the variance between
+        blocks is then unknown
+    """
+    mean = total / n_blocks
+    estimate = n_units * mean
+    if n_blocks < 2:
+        return estimate, None, None
+
+    variance = max(total_sq - total * total / n_blocks, 0.0) / (n_blocks - 1)
+    finite_correction = max(1.0 - n_blocks / n_units, 0.0)
+    std_error = n_units * math.sqrt(finite_correction * variance / n_blocks)
+    return estimate, estimate - Z_95 * std_error, estimate + Z_95 * std_error
+
+
+def _rank_range(intervals, index):
+    """
+    Find the range of ranks an entry could take given all intervals.
+
+    An entry is certainly beaten by every entry whose lower bound is above
+    its upper bound, and could at worst be beaten by every entry whose upper
+    bound is above its lower bound.
+
+    Args:
+        intervals: List of (key, estimate, ci_low, ci_high) sorted by estimate
+        index: Position of the entry in intervals
+
+    Returns:
+        tuple: (best_rank, worst_rank), both 1-based
+    """
+    _, _, low, high = intervals[index]
+    best = 1 + sum(1 for i, (_, _, other_low, _) in enumerate(intervals) if i != index and other_low > high)
+    worst = 1 + sum(1 for i, (_, _, _, other_high) in enumerate(intervals) if i != index and other_high > low)
+    return best, worst
+
+
+def _top_estimates(sums, sumsqs, n_blocks, n_units, top_n, largest):
+    """
+    Rank keys by estimated total and attach intervals and rank ranges.
+
+    Args:
+        sums: Key -> sum of per-block values
+        sumsqs: Key -> sum of squares of per-block values
+        n_blocks: Number of sampled blocks
+        n_units: Number of block-sized units in the whole file
+        top_n: Number of entries to return
+        largest: True for the highest estimates, False for the lowest
+
+    Returns:
+        list: (key, estimate, ci_low, ci_high, best_rank, worst_rank) tuples
+    """
+    # Unknown interval bounds rank as unbounded
+    intervals = [
+        (key, est, -math.inf if low is None else low, math.inf if high is None else high)
+        for key, est, low, high in (
+            (key,) + _estimate(total, sumsqs[key], n_blocks, n_units) for key, total in sums.items()
+        )
+    ]
+    if not largest:
+        # Negate so the saddest ranking can reuse the "beaten by" logic
+        intervals = [(key, -est, -high, -low) for key, est, low, high in intervals]
+    ordered = sorted(intervals, key=lambda x: -x[1])
+
+    results = []
+    for index in range(min(top_n, len(ordered))):
+        key, est, low, high = ordered[index]
+        best, worst = _rank_range(ordered, index)
+        if not largest:
+            est, low, high = -est, -high, -low
+        if math.isinf(low) or math.isinf(high):
+            low = high = None
+        results.append((key, est, low, high, best, worst))
+    return results
+
+
+def sample_estimates(data_path, fraction, comm=None, top_n=5, block_size=DEFAULT_BLOCK_SIZE, seed=0):
+    """
+    Estimate hourly and per-user sentiment totals from a stratified sample.
+
+    Root plans the sample blocks and broadcasts them; blocks are dealt out to
+    ranks round-robin so sample I/O is spread across all processes. Each
+    block is aggregated on its own and folded into a SampleAccumulator,
+    which is then gathered and merged on root.
+
+    Args:
+        data_path: Path to the Mastodon NDJSON file
+        fraction: Fraction of the file to read
+        comm: MPI communicator (optional)
+        top_n: Number of hours and users to rank
+        block_size: Size of each sample block in bytes
+        seed: Seed for the random block placement
+
+    Returns:
+        dict: Estimates and sample metadata on root, None on other ranks
+    """
+    comm_rank = comm.Get_rank() if comm else 0
+    comm_size = comm.Get_size() if comm else 1
+
+    plan = None
+    if comm_rank == 0:
+        file_size = os.path.getsize(data_path)
+        plan = (file_size, plan_sample_blocks(file_size, fraction, block_size, seed))
+    if comm:
+        plan = comm.bcast(plan, root=0)
+    file_size, blocks = plan
+
+    accumulator = SampleAccumulator()
+    for start, end in blocks[comm_rank::comm_size]:
+        hour_sentiment_dict = defaultdict(int)
+        user_sentiment_dict = {}
+        n_records = 0
+        for _, record in read_records(data_path, start, end):
+            processing_data(record, hour_sentiment_dict, user_sentiment_dict)
+            n_records += 1
+        accumulator.add_block(end - start, n_records, hour_sentiment_dict, user_sentiment_dict)
+
+    if comm and comm_size > 1:
+        all_accumulators = comm.gather(accumulator, root=0)
+        if comm_rank != 0:
+            return None
+        accumulator = SampleAccumulator()
+        for proc_accumulator in all_accumulators:
+            accumulator.merge(proc_accumulator)
+
+    if accumulator.n_blocks == 0:
+        return None
+
+    # Blocks are equal-sized units of the file apart from the last one
+    n_units = max(file_size / block_size, accumulator.n_blocks)
+    n = accumulator.n_blocks
+
+    def with_usernames(entries):
+        return [
+            (user_id, accumulator.usernames.get(user_id, ""), est, low, high, best, worst)
+            for user_id, est, low, high, best, worst in entries
+        ]
+
+    return {
+        "fraction": fraction,
+        "blocks": n,
+        "sampled_bytes": accumulator.sampled_bytes,
+        "file_size": file_size,
+        "estimated_records": _estimate(accumulator.records, accumulator.records_sq, n, n_units),
+        "happiest_hours": _top_estimates(accumulator.hour_sum, accumulator.hour_sumsq, n, n_units, top_n, True),
+        "saddest_hours": _top_estimates(accumulator.hour_sum, accumulator.hour_sumsq, n, n_units, top_n, False),
+        "happiest_users": with_usernames(
+            _top_estimates(accumulator.user_sum, accumulator.user_sumsq, n, n_units, top_n, True)
+        ),
+        "saddest_users": with_usernames(
+            _top_estimates(accumulator.user_sum, accumulator.user_sumsq, n, n_units, top_n, False)
+        ),
+    }
@@ -0,0 +1,394 @@
+import argparse
+import os
+import re
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+import numpy as np
+
+# Rank counts of the SLURM jobs (1n1c, 1n8c, 2n8c runs 8 ranks as well)
+DEFAULT_RANKS = [1, 2, 4, 8]
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+_PHASE_TIME = re.compile(r"Processor #(\d+) completed (.+?) in ([\d.]+) seconds")
+_TOTAL_TIME = re.compile(r"Program runs in ([\d.]+) seconds")
+
+
+def make_input(data_path, n_lines, out_path):
+    """
+    Write an input file of exactly n_lines records taken from a data file.
+
+    The source lines are repeated from the start if the file is shorter,
+    so inputs for weak scaling can grow past the size of the sample data.
+
+    Args:
+        data_path: Source NDJSON file
+        n_lines: Number of lines to write
+        out_path: Path of the file to create
+
+    Returns:
+        str: out_path
+    """
+    if os.path.exists(out_path):
+        return out_path
+    written = 0
+    with open(out_path, "wb") as out:
+        while written < n_lines:
+            written_before = written
+            with open(data_path, "rb") as f:
+                for line in f:
+                    if written >= n_lines:
+                        break
+                    if line.strip():
+                        out.write(line if line.endswith(b"\n") else line + b"\n")
+                        written += 1
+            if written == written_before:
+                raise ValueError(f"No records in {data_path}")
+    return out_path
+
+
+def parse_timings(output):
+    """
+    Extract per-rank phase times and the total runtime from main.py output.
+
+    Args:
+        output: Captured stdout of one run
+
+    Returns:
+        tuple: ({phase: {rank: seconds}}, total seconds or None)
+    """
+    phases = {}
+    for rank, phase, seconds in _PHASE_TIME.findall(output):
+        phases.setdefault(phase, {})[int(rank)] = float(seconds)
+    total = _TOTAL_TIME.search(output)
+    return phases, float(total.group(1)) if total else None
+
+
+def run_once(n_ranks, data_path, output_dir, mpiexec="mpiexec", mpiexec_args="--oversubscribe",
+             extra_args=()):
+    """
+    Run main.py under mpiexec and collect its timings.
+
+    Args:
+        n_ranks: Number of MPI ranks
+        data_path: Input file
+        output_dir: Directory for the run's results
+        mpiexec: MPI launcher
+        mpiexec_args: Extra launcher arguments (allow oversubscription by default)
+        extra_args: Extra arguments passed to main.py
+
+    Returns:
+        dict: {"wall", "total", "phases"} for the run; wall is the launcher's
+        elapsed time measured here, total the runtime main.py reports,
+        which it rounds to 10 ms
+
+    Raises:
+        RuntimeError: If the run fails or its output has no runtime line
+    """
+    command = [mpiexec, *shlex.split(mpiexec_args), "-n", str(n_ranks),
+               sys.executable, MAIN_SCRIPT, "-data", data_path, "-output", output_dir, *extra_args]
+    start = time.perf_counter()
+    result = subprocess.run(command, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} failed with exit code {result.returncode}:\n{result.stderr}")
+
+    phases, total = parse_timings(result.stdout)
+    if total is None:
+        raise RuntimeError(f"{' '.join(command)} printed no 'Program runs in' line:\n{result.stdout}")
+    return {"wall": wall, "total": total, "phases": phases}
+
+
+def measure(n_ranks, data_path, output_dir, repeats, **run_args):
+    """
+    Run one configuration several times and keep the median timings.
+
+    Args:
+        n_ranks: Number of MPI ranks
+        data_path: Input file
+        output_dir: Directory for the run's results
+        repeats: Number of runs
+        run_args: Keyword arguments for run_once
+
+    Returns:
+        dict: {"ranks", "time", "processing", "imbalance"}; time is the
+        wall time of the whole run, which unlike main.py's rounded report
+        is never zero, processing the slowest rank's data processing time
+        and imbalance its ratio to the mean
+    """
+    runs = [run_once(n_ranks, data_path, output_dir, **run_args) for _ in range(repeats)]
+    processing = [run["phases"].get("data processing", {}) for run in runs]
+    slowest = [max(p.values()) if p else 0.0 for p in processing]
+    imbalance = [max(p.values()) / statistics.mean(p.values()) if p and statistics.mean(p.values()) else 1.0
+                 for p in processing]
+    return {
+        "ranks": n_ranks,
+        "time": statistics.median(run["wall"] for run in runs),
+        "processing": statistics.median(slowest),
+        "imbalance": statistics.median(imbalance),
+    }
+
+
+def karp_flatt(speedup, n_ranks):
+    """
+    Experimentally determined serial fraction e = (1/S - 1/p) / (1 - 1/p).
+
+    Args:
+        speedup: Measured speedup S
+        n_ranks: Number of ranks p
+
+    Returns:
+        float: Serial fraction, or None for a single rank
+    """
+    if n_ranks <= 1:
+        return None
+    return (1 / speedup - 1 / n_ranks) / (1 - 1 / n_ranks)
+
+
+def amdahl_fit(ranks, times):
+    """
+    Least-squares fit of Amdahl's law T(p) = T1 * (f + (1 - f) / p).
+
+    The model is linear in 1/p, T(p) = a + b / p, so f = a / (a + b).
+
+    Args:
+        ranks: Rank counts
+        times: Measured runtimes
+
+    Returns:
+        tuple: (serial fraction f, fitted single-rank time T1), or (None, None)
+        with fewer than two distinct rank counts
+    """
+    if len(set(ranks)) < 2:
+        return None, None
+    design = np.column_stack([np.ones(len(ranks)), 1 / np.asarray(ranks, dtype=np.float64)])
+    (a, b), *_ = np.linalg.lstsq(design, np.asarray(times, dtype=np.float64), rcond=None)
+    t1 = a + b
+    serial = min(max(a / t1, 0.0), 1.0) if t1 > 0 else None
+    return serial, t1
+
+
+def strong_scaling(results):
+    """
+    Add speedup, efficiency and Karp-Flatt fraction to a fixed-size series.
+
+    Args:
+        results: measure() results for one input size, sorted by ranks
+
+    Returns:
+        tuple: (rows with derived metrics, Amdahl serial fraction)
+    """
+    base = results[0]
+    rows = []
+    for result in results:
+        # Scale the baseline down to one rank if the grid does not start at 1
+        speedup = base["time"] * base["ranks"] / result["time"]
+        rows.append(dict(result, speedup=speedup, efficiency=speedup / result["ranks"],
+                         karp_flatt=karp_flatt(speedup, result["ranks"])))
+    serial, _ = amdahl_fit([r["ranks"] for r in results], [r["time"] for r in results])
+    return rows, serial
+
+
+def weak_scaling(results):
+    """
+    Add weak-scaling efficiency and scaled speedup to a fixed work-per-rank series.
+
+    Args:
+        results: measure() results with input size proportional to ranks
+
+    Returns:
+        list: Rows with efficiency T1 / Tp and scaled speedup p * T1 / Tp
+    """
+    base = results[0]
+    return [dict(r, efficiency=base["time"] / r["time"], speedup=r["ranks"] * base["time"] / r["time"])
+            for r in results]
+
+
+def _format_optional(value, fmt):
+    return "-" if value is None else format(value, fmt)
+
+
+def format_strong_table(size_rows):
+    """
+    Render strong-scaling results as a text table.
+
+    Args:
+        size_rows: List of (n_lines, rows, amdahl serial fraction)
+
+    Returns:
+        list: Lines of the table
+    """
+    lines = []
+    for n_lines, rows, serial in size_rows:
+        lines.append(f"Strong scaling, {n_lines} lines "
+                     f"(Amdahl serial fraction {_format_optional(serial, '.4f')})")
+        lines.append(f"{'ranks':>6} {'time(s)':>9} {'proc(s)':>9} {'speedup':>8} "
+                     f"{'effic.':>7} {'karp-flatt':>10} {'imbal.':>7}")
+        for r in rows:
+            lines.append(f"{r['ranks']:>6} {r['time']:>9.2f} {r['processing']:>9.2f} {r['speedup']:>8.2f} "
+                         f"{r['efficiency']:>7.2%} {_format_optional(r['karp_flatt'], '.4f'):>10} "
+                         f"{r['imbalance']:>7.2f}")
+        lines.append("")
+    return lines
+
+
+def format_weak_table(lines_per_rank, rows):
+    """
+    Render weak-scaling results as a text table.
+
+    Args:
+        lines_per_rank: Input lines per rank
+        rows: weak_scaling() rows
+
+    Returns:
+        list: Lines of the table
+    """
+    lines = [f"Weak scaling, {lines_per_rank} lines per rank",
+             f"{'ranks':>6} {'lines':>10} {'time(s)':>9} {'proc(s)':>9} {'scaled':>8} {'effic.':>7} {'imbal.':>7}"]
+    for r in rows:
+        lines.append(f"{r['ranks']:>6} {r['ranks'] * lines_per_rank:>10} {r['time']:>9.2f} "
+                     f"{r['processing']:>9.2f} {r['speedup']:>8.2f} {r['efficiency']:>7.2%} "
+                     f"{r['imbalance']:>7.2f}")
+    lines.append("")
+    return lines
+
+
+def plot_scaling(strong, weak, figures_dir):
+    """
+    Plot speedup and efficiency curves, if matplotlib is available.
+
+    Args:
+        strong: List of (n_lines, rows, amdahl serial fraction)
+        weak: (lines_per_rank, rows) or None
+        figures_dir: Directory for the PNG files
+
+    Returns:
+        list: Paths of the written figures
+    """
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed; skipping plots")
+        return []
+
+    written = []
+    if strong:
+        fig, (ax_speedup, ax_efficiency) = plt.subplots(1, 2, figsize=(11, 4.5))
+        max_ranks = max(r["ranks"] for _, rows, _ in strong for r in rows)
+        ax_speedup.plot([1, max_ranks], [1, max_ranks], "k--", label="ideal")
+        for n_lines, rows, serial in strong:
+            ranks = [r["ranks"] for r in rows]
+            label = f"{n_lines} lines"
+            ax_speedup.plot(ranks, [r["speedup"] for r in rows], "o-", label=label)
+            if serial is not None:
+                p = np.linspace(1, max_ranks, 100)
+                ax_speedup.plot(p, 1 / (serial + (1 - serial) / p), ":", label=f"Amdahl f={serial:.3f}")
+            ax_efficiency.plot(ranks, [r["efficiency"] for r in rows], "o-", label=label)
+        ax_speedup.set(xlabel="ranks", ylabel="speedup", title="Strong scaling")
+        ax_efficiency.set(xlabel="ranks", ylabel="parallel efficiency", ylim=(0, 1.1), title="Efficiency")
+        ax_speedup.legend()
+        ax_efficiency.legend()
+        fig.tight_layout()
+        path = os.path.join(figures_dir, "strong_scaling.png")
+        fig.savefig(path, dpi=120)
+        plt.close(fig)
+        written.append(path)
+
+    if weak:
+        lines_per_rank, rows = weak
+        fig, ax = plt.subplots(figsize=(6, 4.5))
+        ax.plot([r["ranks"] for r in rows], [r["efficiency"] for r in rows], "o-")
+        ax.axhline(1.0, color="k", linestyle="--")
+        ax.set(xlabel="ranks", ylabel="weak-scaling efficiency", ylim=(0, 1.1),
+               title=f"Weak scaling, {lines_per_rank} lines per rank")
+        fig.tight_layout()
+        path = os.path.join(figures_dir, "weak_scaling.png")
+        fig.savefig(path, dpi=120)
+        plt.close(fig)
+        written.append(path)
+    return written
+
+
+def run_harness(data_path, ranks=None, sizes=None, weak_lines=None, repeats=3, work_dir="./output/scaling",
+                figures_dir="./output/figures", mpiexec="mpiexec", mpiexec_args="--oversubscribe",
+                extra_args=()):
+    """
+    Run the strong- and weak-scaling grid and write tables and plots.
+
+    Args:
+        data_path: Source NDJSON file for the generated inputs
+        ranks: Rank counts to run (default: DEFAULT_RANKS)
+        sizes: Input sizes in lines for strong scaling (default: the whole file)
+        weak_lines: Lines per rank for weak scaling (optional)
+        repeats: Runs per configuration; the median is reported
+        work_dir: Directory for generated inputs and run outputs
+        figures_dir: Directory for tables and plots
+        mpiexec: MPI launcher
+        mpiexec_args: Extra launcher arguments
+        extra_args: Extra arguments passed to main.py
+    """
+    ranks = sorted(ranks or DEFAULT_RANKS)
+    os.makedirs(work_dir, exist_ok=True)
+    os.makedirs(figures_dir, exist_ok=True)
+    run_args = {"mpiexec": mpiexec, "mpiexec_args": mpiexec_args, "extra_args": extra_args}
+
+    strong = []
+    for n_lines in sizes or [None]:
+        input_path = data_path
+        if n_lines:
+            input_path = make_input(data_path, n_lines, os.path.join(work_dir, f"strong-{n_lines}.ndjson"))
+        label = n_lines or "all"
+        results = []
+        for n_ranks in ranks:
+            print(f"Strong scaling: {label} lines on {n_ranks} ranks")
+            results.append(measure(n_ranks, input_path, os.path.join(work_dir, f"strong-{label}-{n_ranks}"),
+                                   repeats, **run_args))
+        rows, serial = strong_scaling(results)
+        strong.append((label, rows, serial))
+
+    weak = None
+    if weak_lines:
+        results = []
+        for n_ranks in ranks:
+            n_lines = weak_lines * n_ranks
+            input_path = make_input(data_path, n_lines, os.path.join(work_dir, f"weak-{n_lines}.ndjson"))
+            print(f"Weak scaling: {n_lines} lines on {n_ranks} ranks")
+            results.append(measure(n_ranks, input_path, os.path.join(work_dir, f"weak-{n_ranks}"),
+                                   repeats, **run_args))
+        weak = (weak_lines, weak_scaling(results))
+
+    output = format_strong_table(strong)
+    if weak:
+        output += format_weak_table(*weak)
+    for line in output:
+        print(line)
+
+    with open(os.path.join(figures_dir, "scaling.txt"), "w") as f:
+        for line in output:
+            f.write(line + "\n")
+    for path in plot_scaling(strong, weak, figures_dir):
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Strong and weak scaling harness for main.py")
+    parser.add_argument("-data", type=str, required=True, help="Source Mastodon data file (ndjson)")
+    parser.add_argument("-ranks", type=int, nargs="+", help="Rank counts to run (default: 1 2 4 8)")
+    parser.add_argument("-sizes", type=int, nargs="+",
+                        help="Input sizes in lines for strong scaling (default: the whole file)")
+    parser.add_argument("-weak-lines", type=int, help="Lines per rank for weak scaling")
+    parser.add_argument("-repeats", type=int, default=3, help="Runs per configuration")
+    parser.add_argument("-work-dir", type=str, default="./output/scaling",
+                        help="Directory for generated inputs and run outputs")
+    parser.add_argument("-figures", type=str, default="./output/figures", help="Directory for tables and plots")
+    parser.add_argument("-mpiexec", type=str, default="mpiexec", help="MPI launcher")
+    parser.add_argument("-mpiexec-args", type=str, default="--oversubscribe",
+                        help="Extra launcher arguments (default allows oversubscription with Open MPI)")
+    args, extra = parser.parse_known_args()
+    run_harness(args.data, args.ranks, args.sizes, args.weak_lines, args.repeats, args.work_dir,
+                args.figures, args.mpiexec, args.mpiexec_args, extra)
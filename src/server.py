@@ -0,0 +1,301 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+from timeline import Timelines
+
+# Largest request head accepted, in bytes
+MAX_REQUEST_BYTES = 16 * 1024
+
+# Largest n answered by /top-users and /top-hours; larger requests are capped
+MAX_RESULTS = 1000
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error",
+}
+
+
+class QueryCache:
+    """
+    Least-recently-used cache of query results.
+
+    Keys are (endpoint, normalised parameters); the whole cache is dropped
+    when the underlying run changes.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Queries run in worker threads
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return a cached result and mark it recently used, or None."""
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Store a result, evicting the least recently used one if full."""
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+
+def _parse_time(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class QueryServer:
+    """
+    Long-lived query service over a run's memory-mapped timeline store.
+
+    The store written by main.py -timelines is mapped once and shared by
+    every request. Queries run in worker threads so slow ones do not block
+    the event loop, identical queries are answered from an LRU cache, and
+    a watcher remaps the store and drops the cache when a new run replaces
+    it.
+
+    Endpoints (GET, JSON responses):
+        /top-users?n=5&order=happiest|saddest&from=...&to=...
+        /top-hours?n=5&order=happiest|saddest&from=...&to=...
+        /user/<account id>
+        /stats
+    n is capped at MAX_RESULTS; a negative n is a bad request.
+    """
+
+    def __init__(self, store_dir, cache_size=1024, poll_interval=2.0):
+        """
+        Map the store.
+
+        Args:
+            store_dir: Timeline store directory of the run
+            cache_size: Maximum number of cached query results
+            poll_interval: Seconds between checks for a new run
+
+        Raises:
+            FileNotFoundError: If there is no store in store_dir yet
+        """
+        self.store_dir = store_dir
+        self.poll_interval = poll_interval
+        self.cache = QueryCache(cache_size)
+        self.timelines = None
+        self.version = None
+        self.loaded_at = None
+        self.reloads = 0
+        self.requests = 0
+        if not self.reload():
+            raise FileNotFoundError(
+                f"No timeline store in {store_dir}; write one with main.py -timelines {store_dir}"
+            )
+
+    def _stamp(self):
+        """Modification stamp of the store; its metadata is written last."""
+        try:
+            return os.stat(os.path.join(self.store_dir, "timelines.json")).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload(self):
+        """
+        Remap the store if a different run has landed since the last load.
+
+        Returns:
+            bool: True if the store was (re)loaded
+        """
+        stamp = self._stamp()
+        if stamp is None or stamp == self.version:
+            return False
+        timelines = Timelines(self.store_dir)
+        # Decode once up front so the first period query is as fast as the rest
+        timelines.absolute_hours()
+        timelines.entry_rows()
+        self.timelines = timelines
+        self.version = stamp
+        self.loaded_at = time.time()
+        self.cache.clear()
+        self.reloads += 1
+        return True
+
+    async def watch(self):
+        """Poll for new runs and swap them in."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if await loop.run_in_executor(None, self.reload):
+                    print(f"Reloaded {self.store_dir}", flush=True)
+            except (OSError, ValueError) as e:
+                # A run may still be writing the store; retry on the next poll
+                print(f"Reload of {self.store_dir} failed: {e}", flush=True)
+
+    def query(self, path, params):
+        """
+        Answer one query.
+
+        Args:
+            path: Request path
+            params: Dict of query parameters
+
+        Returns:
+            tuple: (HTTP status, JSON-serialisable body)
+        """
+        timelines = self.timelines
+        if path == "/stats":
+            return 200, {
+                "store": self.store_dir,
+                "users": len(timelines),
+                "entries": timelines.meta["n_entries"],
+                "loaded_at": self.loaded_at,
+                "reloads": self.reloads,
+                "requests": self.requests,
+                "cache_entries": len(self.cache.entries),
+                "cache_hits": self.cache.hits,
+                "cache_misses": self.cache.misses,
+            }
+
+        try:
+            n = int(params.get("n", 5))
+            if n < 0:
+                raise ValueError(f"n must not be negative, got {n}")
+            n = min(n, MAX_RESULTS)
+            largest = params.get("order", "happiest") != "saddest"
+            time_from = _parse_time(params, "from")
+            time_to = _parse_time(params, "to")
+        except ValueError as e:
+            return 400, {"error": str(e)}
+
+        key = (path, n, largest, time_from, time_to)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        if path == "/top-users":
+            rows = timelines.top_users(n, time_from, time_to, largest)
+            result = 200, [{"id": user_id, "sentiment": total, "posts": count} for user_id, total, count in rows]
+        elif path == "/top-hours":
+            rows = timelines.top_hours(n, time_from, time_to, largest)
+            result = 200, [{"hour": hour, "sentiment": total, "posts": count} for hour, total, count in rows]
+        elif path.startswith("/user/"):
+            try:
+                rows = timelines.user_timeline(path[len("/user/"):])
+            except ValueError:
+                return 400, {"error": "account id must be numeric"}
+            result = 200, [{"hour": hour, "sentiment": total, "posts": count} for hour, total, count in rows]
+        else:
+            return 404, {"error": f"unknown endpoint {path}"}
+
+        # Keep the result only if no new run was swapped in meanwhile
+        if timelines is self.timelines:
+            self.cache.put(key, result)
+        return result
+
+    async def handle(self, reader, writer):
+        """Serve one HTTP/1.1 request per connection."""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+
+        self.requests += 1
+        start = time.perf_counter()
+        request_line = head.split(b"\r\n", 1)[0].decode("latin-1").split()
+        if len(request_line) != 3:
+            status, body = 400, {"error": "malformed request"}
+        elif request_line[0] != "GET":
+            status, body = 405, {"error": "only GET is supported"}
+        else:
+            url = urlsplit(request_line[1])
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            loop = asyncio.get_running_loop()
+            try:
+                status, body = await loop.run_in_executor(None, self.query, url.path, params)
+            except Exception as e:
+                status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        payload = json.dumps(body).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"X-Query-Time-Ms: {elapsed_ms:.3f}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + payload
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+async def serve(store_dir, host="127.0.0.1", port=8750, unix_socket=None, cache_size=1024, poll_interval=2.0):
+    """
+    Run the query server until cancelled.
+
+    Args:
+        store_dir: Timeline store directory of the run
+        host: Interface for HTTP (ignored with unix_socket)
+        port: Port for HTTP (ignored with unix_socket)
+        unix_socket: Serve on this Unix socket path instead of TCP (optional)
+        cache_size: Maximum number of cached query results
+        poll_interval: Seconds between checks for a new run
+
+    Raises:
+        FileNotFoundError: If there is no store in store_dir yet
+    """
+    server = QueryServer(store_dir, cache_size, poll_interval)
+    if unix_socket:
+        listener = await asyncio.start_unix_server(server.handle, path=unix_socket, limit=MAX_REQUEST_BYTES)
+        where = unix_socket
+    else:
+        listener = await asyncio.start_server(server.handle, host, port, limit=MAX_REQUEST_BYTES)
+        where = f"http://{host}:{port}"
+    print(f"Serving {store_dir} ({len(server.timelines)} users) on {where}", flush=True)
+
+    watcher = asyncio.create_task(server.watch())
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        watcher.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve queries over a run's per-user timelines")
+    parser.add_argument("-timelines", type=str, required=True, help="Timeline store directory written by main.py")
+    parser.add_argument("-host", type=str, default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("-port", type=int, default=8750, help="Port to listen on")
+    parser.add_argument("-socket", type=str, help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("-cache", type=int, default=1024, help="Maximum number of cached query results")
+    parser.add_argument("-poll", type=float, default=2.0, help="Seconds between checks for a new run")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.timelines, args.host, args.port, args.socket, args.cache, args.poll))
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    except KeyboardInterrupt:
+        pass
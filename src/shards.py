@@ -0,0 +1,282 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+from collections import defaultdict
+
+SHARD_CACHE_VERSION = 1
+
+# Files taken from a directory or pattern input. Plain .json files (cache
+# manifests, results) are only read when named explicitly.
+DATA_SUFFIXES = (".ndjson", ".jsonl")
+_SIDECAR_SUFFIXES = (".zonemap.json",)
+
+# Bytes hashed from each end of a shard for its fingerprint
+FINGERPRINT_SAMPLE_BYTES = 64 << 10
+
+
+def expand_inputs(spec):
+    """
+    Expand a -data argument into the list of shard files to analyze.
+
+    A directory stands for the .ndjson and .jsonl files directly inside it,
+    a pattern containing *, ? or [ for the matching files with those
+    suffixes (** included), and anything else for a single file of any
+    name. A pattern that itself ends in a suffix, e.g. "*.json", takes the
+    files it matches as they are. Zone map sidecars are never shards.
+    Shards are returned in sorted order, which every rank computes
+    identically.
+
+    Args:
+        spec: File path, directory path or glob pattern
+
+    Returns:
+        list: Paths of the shard files
+
+    Raises:
+        FileNotFoundError: If a directory or pattern matches no files
+    """
+    if os.path.isdir(spec):
+        paths = [
+            os.path.join(spec, name) for name in os.listdir(spec)
+            if name.endswith(DATA_SUFFIXES) and not name.endswith(_SIDECAR_SUFFIXES) and not name.startswith(".")
+        ]
+    elif any(char in spec for char in "*?["):
+        extension = os.path.splitext(spec)[1]
+        suffixes = (extension,) if extension and not any(char in extension for char in "*?[") else DATA_SUFFIXES
+        paths = [
+            path for path in glob.glob(spec, recursive=True)
+            if path.endswith(suffixes) and not path.endswith(_SIDECAR_SUFFIXES)
+        ]
+    else:
+        return [spec]
+
+    paths = sorted(path for path in paths if os.path.isfile(path))
+    if not paths:
+        raise FileNotFoundError(f"no input files match '{spec}'")
+    return paths
+
+
+def shard_fingerprint(path, sample_bytes=FINGERPRINT_SAMPLE_BYTES):
+    """
+    Cheap fingerprint of a shard's contents.
+
+    Hashes the size, the modification time and the first and last
+    sample_bytes of the file, so a rewritten, appended or truncated shard
+    gets a new fingerprint without reading it in full.
+
+    Args:
+        path: Path of the shard
+        sample_bytes: Bytes hashed from each end of the file
+
+    Returns:
+        str: Hex digest
+    """
+    stat = os.stat(path)
+    digest = hashlib.blake2b(f"{stat.st_size}:{stat.st_mtime_ns}".encode("ascii"), digest_size=16)
+    with open(path, "rb") as f:
+        digest.update(f.read(sample_bytes))
+        if stat.st_size > sample_bytes:
+            f.seek(max(stat.st_size - sample_bytes, sample_bytes))
+            digest.update(f.read(sample_bytes))
+    return digest.hexdigest()
+
+
+def plan_units(shards, record_filter=None, comm=None):
+    """
+    Global list of byte-range work units over all shards.
+
+    Without a filter every shard is one unit covering the whole file.
+    With a filter, each shard's zone map (built collectively if missing)
+    drops the blocks that cannot match, and the surviving block runs
+    become the units. Units are listed in shard order; cutting the list
+    into equal shares of bytes with util.partition_units lets a rank's
+    share span shard boundaries, so many small shards and a few large ones
+    load every rank equally.
+
+    Args:
+        shards: List of shard paths, identical on every rank
+        record_filter: RecordFilter used to prune blocks (optional)
+        comm: MPI communicator for building missing zone maps (optional)
+
+    Returns:
+        tuple: (list of (path, start_byte, end_byte) units, zone map blocks
+        kept, zone map blocks in total); the block counts are 0 without a filter
+    """
+    if record_filter is None:
+        return [(path, 0, os.path.getsize(path)) for path in shards], 0, 0
+
+    from zonemap import ensure_zone_map, select_ranges
+
+    units = []
+    blocks_kept = 0
+    blocks_total = 0
+    for path in shards:
+        zone_map = ensure_zone_map(path, comm)
+        ranges, kept = select_ranges(zone_map, record_filter)
+        units.extend((path, start, end) for start, end in ranges)
+        blocks_kept += kept
+        blocks_total += len(zone_map["blocks"])
+    return units, blocks_kept, blocks_total
+
+
+def add_aggregates(hour_sentiment_dict, user_sentiment_dict, hours, users):
+    """
+    Add one set of per-hour and per-user sentiment to another, in place.
+
+    Args:
+        hour_sentiment_dict: hour -> sentiment dict to add to
+        user_sentiment_dict: user_id -> (username, score) dict to add to
+        hours: hour -> sentiment dict to add
+        users: user_id -> (username, score) dict to add
+    """
+    for hour, sentiment in hours.items():
+        hour_sentiment_dict[hour] += sentiment
+    for user_id, (username, score) in users.items():
+        entry = user_sentiment_dict.get(user_id)
+        user_sentiment_dict[user_id] = (username, score if entry is None else entry[1] + score)
+
+
+class ShardCache:
+    """
+    Per-shard sentiment aggregates kept between runs, keyed by fingerprint.
+
+    Every rank stores the per-hour and per-user sentiment of each byte
+    range it scans as a piece file in the cache directory; the manifest
+    lists, per shard, its fingerprint and the pieces that together cover
+    it. On a later run with the same settings, shards whose fingerprint is
+    unchanged are not scanned at all: their pieces are dealt to the ranks
+    and loaded instead. Only new or changed shards are planned as work
+    units. The directory must be shared by all ranks.
+    """
+
+    def __init__(self, cache_dir, settings, comm=None):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Directory shared by all ranks
+            settings: JSON-serialisable dict of everything the aggregates
+                depend on besides the input (filters, lexicon); a manifest
+                written with other settings is ignored
+            comm: MPI communicator (optional)
+        """
+        self.cache_dir = cache_dir
+        self.settings = dict(settings, version=SHARD_CACHE_VERSION)
+        self.comm = comm
+        self.comm_rank = comm.Get_rank() if comm else 0
+        self.manifest_path = os.path.join(cache_dir, "manifest.json")
+        self.fingerprints = {}
+        self.cached = {}
+        self.previous = {}
+        self.written = defaultdict(list)
+        if self.comm_rank == 0:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("settings") != self.settings:
+            return {}
+        return manifest.get("shards", {})
+
+    def split(self, shards):
+        """
+        Separate unchanged shards from those that must be scanned.
+
+        Collective: root fingerprints the shards and reads the manifest.
+
+        Args:
+            shards: List of shard paths
+
+        Returns:
+            tuple: (shards to scan, piece files of the unchanged shards)
+        """
+        state = None
+        if self.comm_rank == 0:
+            fingerprints = {path: shard_fingerprint(path) for path in shards}
+            self.previous = self._load_manifest()
+            cached = {
+                path: self.previous[os.path.abspath(path)]["pieces"] for path in shards
+                if self.previous.get(os.path.abspath(path), {}).get("fingerprint") == fingerprints[path]
+            }
+            state = (fingerprints, cached)
+        if self.comm:
+            state = self.comm.bcast(state, root=0)
+        self.fingerprints, self.cached = state
+
+        to_scan = [path for path in shards if path not in self.cached]
+        pieces = [piece for path in shards if path in self.cached for piece in self.cached[path]]
+        return to_scan, pieces
+
+    def load(self, pieces, n_parts=1, part=0):
+        """
+        Read this part's share of the cached pieces.
+
+        Args:
+            pieces: Piece files returned by split
+            n_parts: Number of parts the pieces are dealt to (e.g. MPI ranks)
+            part: Index of this part
+
+        Yields:
+            tuple: (hour -> sentiment dict, user_id -> (username, score) dict)
+        """
+        for piece in pieces[part::n_parts]:
+            with open(os.path.join(self.cache_dir, piece), "rb") as f:
+                yield pickle.load(f)
+
+    def store(self, path, start_byte, end_byte, hours, users):
+        """
+        Write the aggregates of one scanned byte range as a piece file.
+
+        Args:
+            path: Shard the range belongs to
+            start_byte: Start of the range
+            end_byte: End of the range
+            hours: hour -> sentiment dict of the records starting in the range
+            users: user_id -> (username, score) dict of the same records
+        """
+        shard_key = hashlib.blake2b(os.path.abspath(path).encode("utf-8"), digest_size=8).hexdigest()
+        piece = f"{shard_key}-{self.fingerprints[path][:16]}-{start_byte}-{end_byte}.pkl"
+        piece_path = os.path.join(self.cache_dir, piece)
+        with open(piece_path + ".part", "wb") as f:
+            pickle.dump((dict(hours), users), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(piece_path + ".part", piece_path)
+        self.written[path].append(piece)
+
+    def commit(self):
+        """
+        Record the scanned shards in the manifest.
+
+        Collective: root gathers the pieces every rank wrote, rewrites the
+        manifest and deletes piece files no shard refers to any more.
+        Entries of shards outside this run's input are kept while their
+        files exist, so analyzing a subset of the shards does not drop the
+        others from the cache.
+        """
+        all_written = [self.written]
+        if self.comm:
+            all_written = self.comm.gather(self.written, root=0)
+        if self.comm_rank != 0:
+            return
+
+        entries = {path: entry for path, entry in self.previous.items() if os.path.exists(path)}
+        for path, fingerprint in self.fingerprints.items():
+            entries[os.path.abspath(path)] = {"fingerprint": fingerprint, "pieces": list(self.cached.get(path, []))}
+        for written in all_written:
+            for path, pieces in written.items():
+                entries[os.path.abspath(path)]["pieces"].extend(pieces)
+
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"settings": self.settings, "shards": entries}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+        referenced = {piece for entry in entries.values() for piece in entry["pieces"]}
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pkl") and name not in referenced:
+                os.remove(os.path.join(self.cache_dir, name))
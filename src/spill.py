@@ -0,0 +1,246 @@
+import glob
+import heapq
+import os
+import struct
+import uuid
+import zlib
+
+# Rough cost of one user_id -> (username, score) entry held in a Python dict,
+# counting the key and value strings, the tuple, the float and the slot
+BYTES_PER_USER_ENTRY = 320
+
+# Run record header: user_id length, username length, score
+_RECORD_HEADER = struct.Struct("<HHd")
+
+
+def partition_of(user_id: str, n_partitions: int):
+    """
+    Stable hash partition of a user id, identical on every rank and run.
+
+    Args:
+        user_id: Account id
+        n_partitions: Number of partitions
+
+    Returns:
+        int: Partition index in [0, n_partitions)
+    """
+    return zlib.crc32(user_id.encode("utf-8")) % n_partitions
+
+
+def write_run(path: str, entries):
+    """
+    Write (user_id, username, score) entries, sorted by user_id, to a run file.
+
+    Args:
+        path: Path of the run file to create
+        entries: Iterable of (user_id, username, score) sorted by user_id
+    """
+    with open(path, "wb") as f:
+        for user_id, username, score in entries:
+            user_id_bytes = user_id.encode("utf-8")
+            username_bytes = (username or "").encode("utf-8")
+            f.write(_RECORD_HEADER.pack(len(user_id_bytes), len(username_bytes), score))
+            f.write(user_id_bytes)
+            f.write(username_bytes)
+
+
+def read_run(path: str):
+    """
+    Stream the entries of a run file in stored (user_id) order.
+
+    Args:
+        path: Path of the run file
+
+    Yields:
+        tuple: (user_id, username, score)
+    """
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(_RECORD_HEADER.size)
+            if len(header) < _RECORD_HEADER.size:
+                return
+            id_len, name_len, score = _RECORD_HEADER.unpack(header)
+            user_id = f.read(id_len).decode("utf-8")
+            username = f.read(name_len).decode("utf-8")
+            yield user_id, username, score
+
+
+def merge_runs(paths):
+    """
+    K-way merge sorted run files, combining entries of the same user.
+
+    Only one entry per run is held in memory at a time.
+
+    Args:
+        paths: Run file paths
+
+    Yields:
+        tuple: (user_id, username, score) with each user_id exactly once
+    """
+    current_id = None
+    current_name = ""
+    current_score = 0.0
+    for user_id, username, score in heapq.merge(*(read_run(p) for p in paths), key=lambda x: x[0]):
+        if user_id == current_id:
+            current_score += score
+            current_name = username
+            continue
+        if current_id is not None:
+            yield current_id, current_name, current_score
+        current_id, current_name, current_score = user_id, username, score
+    if current_id is not None:
+        yield current_id, current_name, current_score
+
+
+def streaming_top_n(entries, n):
+    """
+    Find the n highest and n lowest scoring users in one pass.
+
+    Args:
+        entries: Iterable of (user_id, username, score)
+        n: Number of users to keep at each end
+
+    Returns:
+        tuple: (happiest, saddest) lists of (user_id, (username, score))
+    """
+    happiest = []
+    saddest = []
+    for i, (user_id, username, score) in enumerate(entries):
+        # The index breaks ties so entries themselves are never compared
+        if len(happiest) < n:
+            heapq.heappush(happiest, (score, i, user_id, username))
+        elif score > happiest[0][0]:
+            heapq.heapreplace(happiest, (score, i, user_id, username))
+        if len(saddest) < n:
+            heapq.heappush(saddest, (-score, i, user_id, username))
+        elif -score > saddest[0][0]:
+            heapq.heapreplace(saddest, (-score, i, user_id, username))
+
+    happiest = [(user_id, (username, score)) for score, _, user_id, username in sorted(happiest, reverse=True)]
+    saddest = [(user_id, (username, -neg)) for neg, _, user_id, username in sorted(saddest, reverse=True)]
+    return happiest, saddest
+
+
+class UserSpiller:
+    """
+    Spills per-rank user aggregates to sorted run files under a memory budget.
+
+    Entries are hash-partitioned by user id into one partition per rank, so
+    at the end each rank can merge the runs of its own partition from every
+    rank and obtain exact per-user totals for a disjoint set of users. The
+    spill directory must therefore be visible to all ranks (for example the
+    job's output directory on the shared filesystem).
+
+    Runs go to a subdirectory private to this job, named by root and
+    shared with every rank, so run files left behind by an earlier job
+    that crashed or was aborted are never merged into this one's totals.
+    """
+
+    def __init__(self, budget_mb, spill_dir, comm=None):
+        """
+        Initialize the spiller.
+
+        Args:
+            budget_mb: Memory budget for the in-memory user map in megabytes
+            spill_dir: Directory shared by all ranks for the run files
+            comm: MPI communicator (optional); construction is collective
+        """
+        self.comm = comm
+        self.comm_rank = comm.Get_rank() if comm else 0
+        self.n_partitions = comm.Get_size() if comm else 1
+        self.max_entries = max(1, int(budget_mb * 1024 * 1024 / BYTES_PER_USER_ENTRY))
+        self.runs_written = 0
+        self.entries_spilled = 0
+
+        job_id = None
+        if self.comm_rank == 0:
+            job_id = f"job-{os.environ.get('SLURM_JOB_ID', 'local')}-{uuid.uuid4().hex[:12]}"
+        if comm:
+            job_id = comm.bcast(job_id, root=0)
+        self.spill_dir = os.path.join(spill_dir, job_id)
+
+    @property
+    def spilled(self):
+        return self.runs_written > 0
+
+    def maybe_spill(self, user_sentiment_dict: dict):
+        """
+        Spill and clear the user map if it has grown past the budget.
+
+        Args:
+            user_sentiment_dict: user_id -> (username, score) map
+
+        Returns:
+            bool: True if the map was spilled
+        """
+        if len(user_sentiment_dict) < self.max_entries:
+            return False
+        self.spill(user_sentiment_dict)
+        return True
+
+    def spill(self, user_sentiment_dict: dict):
+        """
+        Write the user map as one sorted run per partition and clear it.
+
+        Args:
+            user_sentiment_dict: user_id -> (username, score) map
+        """
+        partitions = [[] for _ in range(self.n_partitions)]
+        for user_id, (username, score) in user_sentiment_dict.items():
+            partitions[partition_of(user_id, self.n_partitions)].append((user_id, username, score))
+
+        os.makedirs(self.spill_dir, exist_ok=True)
+        for partition, entries in enumerate(partitions):
+            if not entries:
+                continue
+            entries.sort(key=lambda x: x[0])
+            write_run(self._run_path(partition, self.runs_written), entries)
+            self.entries_spilled += len(entries)
+
+        self.runs_written += 1
+        user_sentiment_dict.clear()
+
+    def _run_path(self, partition, sequence):
+        return os.path.join(
+            self.spill_dir, f"run-r{self.comm_rank}-p{partition}-{sequence}.bin"
+        )
+
+    def top_n_users(self, user_sentiment_dict: dict, n: int):
+        """
+        Flush remaining users and merge all runs into the global top-n.
+
+        Collective: every rank must call this once spilling occurred on any
+        rank. Each rank merges its own partition across all ranks' runs,
+        then the per-partition top-n lists are combined on root. The run
+        files and the job's spill directory are removed afterwards.
+
+        Args:
+            user_sentiment_dict: Users still held in memory on this rank
+            n: Number of users to rank
+
+        Returns:
+            tuple: (happiest, saddest) on root, (None, None) elsewhere
+        """
+        self.spill(user_sentiment_dict)
+        if self.comm:
+            self.comm.Barrier()
+
+        paths = glob.glob(os.path.join(self.spill_dir, f"run-r*-p{self.comm_rank}-*.bin"))
+        happiest, saddest = streaming_top_n(merge_runs(paths), n)
+        for path in paths:
+            os.remove(path)
+        if self.comm:
+            self.comm.Barrier()
+        if self.comm_rank == 0:
+            try:
+                os.rmdir(self.spill_dir)
+            except OSError:
+                pass
+
+        if self.comm and self.n_partitions > 1:
+            all_tops = self.comm.gather((happiest, saddest), root=0)
+            if self.comm_rank != 0:
+                return None, None
+            happiest = heapq.nlargest(n, (e for top, _ in all_tops for e in top), key=lambda x: x[1][1])
+            saddest = heapq.nsmallest(n, (e for _, top in all_tops for e in top), key=lambda x: x[1][1])
+        return happiest, saddest
@@ -0,0 +1,446 @@
+import argparse
+import datetime
+import json
+import os
+from array import array
+import numpy as np
+
+TIMELINE_VERSION = 1
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_HOUR_FORMAT = "%Y-%m-%d %H"
+
+# Local user ids each rank contributes to the choice of sort splitters
+_SPLITTER_SAMPLES = 64
+
+_COLUMNS = ("users", "offsets", "hour_deltas", "sentiment", "counts")
+
+
+def epoch_hour(created_datetime):
+    """
+    Hour bucket of a post as hours since the Unix epoch.
+
+    A timestamp with an offset is converted to UTC first; a naive one is
+    taken as UTC already.
+
+    Args:
+        created_datetime: datetime of the post
+
+    Returns:
+        int: Hours since 1970-01-01 00:00 UTC
+    """
+    if created_datetime.tzinfo is not None:
+        created_datetime = created_datetime.astimezone(datetime.timezone.utc)
+    delta = created_datetime.replace(tzinfo=None) - _EPOCH
+    return delta.days * 24 + delta.seconds // 3600
+
+
+def collapse(users, hours, sentiment, counts):
+    """
+    Sort entries by (user, hour) and sum duplicates together.
+
+    Args:
+        users: Account ids
+        hours: Hour buckets
+        sentiment: Sentiment sums
+        counts: Post counts
+
+    Returns:
+        tuple: (users, hours, sentiment, counts) with one entry per distinct
+        (user, hour), sorted by user then hour
+    """
+    if len(users) == 0:
+        return users, hours, sentiment, counts
+    order = np.lexsort((hours, users))
+    users = users[order]
+    hours = hours[order]
+    starts = np.flatnonzero(np.r_[True, (users[1:] != users[:-1]) | (hours[1:] != hours[:-1])])
+    return (
+        users[starts],
+        hours[starts],
+        np.add.reduceat(sentiment[order], starts),
+        np.add.reduceat(counts[order], starts),
+    )
+
+
+class TimelineBuffer:
+    """
+    Per-rank buffer of (user, hour, sentiment) observations.
+
+    Observations are appended to typed arrays and collapsed to one entry
+    per (user, hour) whenever the buffer reaches compact_every entries, so
+    memory tracks the number of active user-hours rather than posts.
+    """
+
+    def __init__(self, compact_every=1 << 20):
+        self.compact_every = compact_every
+        self._users = array('q')
+        self._hours = array('q')
+        self._sentiment = array('d')
+        self._collapsed = collapse(
+            np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float64), np.empty(0, dtype=np.int64),
+        )
+
+    def add(self, user_id, created_datetime, sentiment):
+        """
+        Record one post.
+
+        Args:
+            user_id: Account id (numeric string)
+            created_datetime: datetime of the post
+            sentiment: Sentiment of the post
+        """
+        try:
+            user = int(user_id)
+        except (TypeError, ValueError):
+            return
+        self._users.append(user)
+        self._hours.append(epoch_hour(created_datetime))
+        self._sentiment.append(sentiment)
+        if len(self._users) >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Collapse buffered observations into the sorted (user, hour) entries."""
+        if not self._users:
+            return
+        fresh = (
+            np.frombuffer(self._users, dtype=np.int64),
+            np.frombuffer(self._hours, dtype=np.int64),
+            np.frombuffer(self._sentiment, dtype=np.float64),
+            np.ones(len(self._users), dtype=np.int64),
+        )
+        self._collapsed = collapse(*(np.concatenate(pair) for pair in zip(self._collapsed, fresh)))
+        self._users = array('q')
+        self._hours = array('q')
+        self._sentiment = array('d')
+
+    def absorb(self, other):
+        """
+        Add all observations of another buffer to this one.
+
+        Args:
+            other: TimelineBuffer, for instance a worker thread's partial buffer
+        """
+        self.compact()
+        other.compact()
+        self._collapsed = collapse(*(np.concatenate(pair) for pair in zip(self._collapsed, other._collapsed)))
+
+    def entries(self):
+        """
+        All entries collapsed and sorted.
+
+        Returns:
+            tuple: (users, hours, sentiment, counts) arrays
+        """
+        self.compact()
+        return self._collapsed
+
+
+def distributed_sort(entries, comm=None):
+    """
+    Sample-sort (user, hour) entries across ranks.
+
+    Every rank proposes evenly spaced user ids from its own sorted entries;
+    the gathered proposals give size - 1 splitters, each rank sends every
+    user range to its owner with one all-to-all, and owners merge what
+    they receive. Afterwards rank r holds all entries of a contiguous user
+    range, sorted, and ranges increase with rank.
+
+    Args:
+        entries: This rank's collapsed (users, hours, sentiment, counts)
+        comm: MPI communicator (optional)
+
+    Returns:
+        tuple: This rank's share of the globally sorted entries
+    """
+    if not comm or comm.Get_size() == 1:
+        return entries
+    comm_size = comm.Get_size()
+
+    users = entries[0]
+    local_ids = np.unique(users)
+    n_samples = min(len(local_ids), _SPLITTER_SAMPLES)
+    proposals = local_ids[np.linspace(0, len(local_ids) - 1, n_samples).astype(np.int64)] if n_samples else local_ids
+    candidates = np.sort(np.concatenate(comm.allgather(proposals)))
+    if len(candidates):
+        splitters = candidates[(np.arange(1, comm_size) * len(candidates)) // comm_size]
+    else:
+        splitters = np.zeros(comm_size - 1, dtype=np.int64)
+
+    # Entries are sorted by user, so each destination gets one contiguous slice
+    cuts = np.r_[0, np.searchsorted(users, splitters, side="left"), len(users)]
+    outgoing = [tuple(column[cuts[i]:cuts[i + 1]] for column in entries) for i in range(comm_size)]
+    incoming = comm.alltoall(outgoing)
+    return collapse(*(np.concatenate(column) for column in zip(*incoming)))
+
+
+def write_timelines(buffer, output_dir, comm=None):
+    """
+    Sort every rank's timeline entries and write them as one CSR store.
+
+    The store is a directory of .npy arrays:
+        users        sorted account ids (n_users)
+        offsets      entries of users[i] are offsets[i]:offsets[i + 1]
+        hour_deltas  hour of a user's first entry minus hour_origin, then
+                     the gap to the previous entry of the same user
+        sentiment    sentiment sum of each (user, hour)
+        counts       post count of each (user, hour)
+    Root creates the arrays at their final size and each rank writes its
+    sorted slice in place, so output_dir must be shared by all ranks. The
+    arrays are written under temporary names and renamed into place, with
+    the metadata file last, so readers that have an older store mapped
+    keep a consistent view. Collective.
+
+    Args:
+        buffer: This rank's TimelineBuffer
+        output_dir: Directory of the store
+        comm: MPI communicator (optional)
+
+    Returns:
+        dict: Store metadata
+    """
+    comm_rank = comm.Get_rank() if comm else 0
+    users, hours, sentiment, counts = distributed_sort(buffer.entries(), comm)
+
+    # Gaps between consecutive hours of the same user; row starts are
+    # filled in once the global origin is known
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]]) if len(users) else np.empty(0, dtype=np.int64)
+    deltas = np.diff(hours, prepend=0)
+    deltas[starts] = 0
+    local = (
+        len(starts), len(users),
+        int(hours.min()) if len(hours) else None,
+        int(hours.max()) if len(hours) else None,
+        int(deltas.max(initial=0)), int(counts.max(initial=0)),
+    )
+    all_local = comm.allgather(local) if comm else [local]
+
+    n_users = sum(entry[0] for entry in all_local)
+    n_entries = sum(entry[1] for entry in all_local)
+    user_base = sum(entry[0] for entry in all_local[:comm_rank])
+    entry_base = sum(entry[1] for entry in all_local[:comm_rank])
+    hour_origin = min((entry[2] for entry in all_local if entry[2] is not None), default=0)
+    hour_last = max((entry[3] for entry in all_local if entry[3] is not None), default=0)
+    deltas[starts] = hours[starts] - hour_origin
+
+    # Narrowest column types that hold every value on every rank
+    max_delta = max([hour_last - hour_origin] + [entry[4] for entry in all_local])
+    max_count = max(entry[5] for entry in all_local)
+    delta_dtype = np.uint16 if max_delta < 1 << 16 else np.uint32
+    count_dtype = np.uint16 if max_count < 1 << 16 else np.uint32
+
+    shapes = {
+        "users": (n_users, np.int64),
+        "offsets": (n_users + 1, np.int64),
+        "hour_deltas": (n_entries, delta_dtype),
+        "sentiment": (n_entries, np.float64),
+        "counts": (n_entries, count_dtype),
+    }
+    meta = {"version": TIMELINE_VERSION, "hour_origin": hour_origin,
+            "n_users": n_users, "n_entries": n_entries}
+    if comm_rank == 0:
+        os.makedirs(output_dir, exist_ok=True)
+        for name, (length, dtype) in shapes.items():
+            np.lib.format.open_memmap(os.path.join(output_dir, f"{name}.npy.part"), mode="w+",
+                                      dtype=dtype, shape=(length,)).flush()
+    if comm:
+        comm.Barrier()
+
+    local_columns = {
+        "users": users[starts],
+        "offsets": starts + entry_base,
+        "hour_deltas": deltas.astype(delta_dtype),
+        "sentiment": sentiment,
+        "counts": counts.astype(count_dtype),
+    }
+    for name, values in local_columns.items():
+        base = entry_base if name in ("hour_deltas", "sentiment", "counts") else user_base
+        column = np.load(os.path.join(output_dir, f"{name}.npy.part"), mmap_mode="r+")
+        column[base:base + len(values)] = values
+        if name == "offsets" and comm_rank == 0:
+            column[-1] = n_entries
+        column.flush()
+        del column
+    if comm:
+        comm.Barrier()
+
+    if comm_rank == 0:
+        for name in _COLUMNS:
+            path = os.path.join(output_dir, f"{name}.npy")
+            os.replace(path + ".part", path)
+        with open(os.path.join(output_dir, "timelines.json.part"), "w") as f:
+            json.dump(meta, f)
+        os.replace(os.path.join(output_dir, "timelines.json.part"), os.path.join(output_dir, "timelines.json"))
+    return meta
+
+
+class Timelines:
+    """
+    Read-only, memory-mapped view of a timeline store.
+
+    Opening maps the arrays without reading them; a user lookup is one
+    binary search over users plus a read of that user's entries. Period
+    queries decode every entry's hour once and keep the result.
+    """
+
+    def __init__(self, store_dir):
+        """
+        Map a store written by write_timelines.
+
+        Args:
+            store_dir: Directory of the store
+
+        Raises:
+            ValueError: If the store version is not supported
+        """
+        with open(os.path.join(store_dir, "timelines.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != TIMELINE_VERSION:
+            raise ValueError(f"Unsupported timeline store version in {store_dir}")
+        self.hour_origin = self.meta["hour_origin"]
+        for name in _COLUMNS:
+            setattr(self, name, np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode="r"))
+        self._hours = None
+        self._rows = None
+
+    def __len__(self):
+        return len(self.users)
+
+    def user_timeline(self, user_id):
+        """
+        Sentiment history of one account.
+
+        Args:
+            user_id: Account id
+
+        Returns:
+            list: (hour key, sentiment sum, post count) tuples in time order;
+            empty if the account has no posts
+        """
+        user = int(user_id)
+        i = int(np.searchsorted(self.users, user))
+        if i == len(self.users) or self.users[i] != user:
+            return []
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        hours = self.hour_origin + np.cumsum(self.hour_deltas[start:end], dtype=np.int64)
+        return [
+            ((_EPOCH + datetime.timedelta(hours=int(hour))).strftime(_HOUR_FORMAT), float(total), int(count))
+            for hour, total, count in zip(hours, self.sentiment[start:end], self.counts[start:end])
+        ]
+
+    def absolute_hours(self):
+        """
+        Decode the hour of every entry at once.
+
+        Returns:
+            np.ndarray: Hours since the Unix epoch, one per entry
+        """
+        if self._hours is None:
+            running = np.cumsum(self.hour_deltas, dtype=np.int64)
+            # Undo the running sum carried over from the previous users
+            row_starts = np.asarray(self.offsets[:-1])
+            row_lengths = np.diff(self.offsets)
+            carried = running[row_starts[row_lengths > 0]] - self.hour_deltas[row_starts[row_lengths > 0]]
+            self._hours = self.hour_origin + running - np.repeat(carried, row_lengths[row_lengths > 0])
+        return self._hours
+
+    def entry_rows(self):
+        """
+        User index of every entry.
+
+        Returns:
+            np.ndarray: Row of users each entry belongs to
+        """
+        if self._rows is None:
+            self._rows = np.repeat(np.arange(len(self.users)), np.diff(self.offsets))
+        return self._rows
+
+    def _period_mask(self, time_from, time_to):
+        hours = self.absolute_hours()
+        keep = np.ones(len(hours), dtype=bool)
+        if time_from is not None:
+            keep &= hours >= epoch_hour(time_from)
+        if time_to is not None:
+            keep &= hours < epoch_hour(time_to)
+        return keep
+
+    def top_hours(self, n=5, time_from=None, time_to=None, largest=True):
+        """
+        Rank hours by total sentiment over all accounts within a period.
+
+        Args:
+            n: Number of hours to return
+            time_from: Inclusive lower bound as a datetime (optional)
+            time_to: Exclusive upper bound as a datetime (optional)
+            largest: True for the happiest hours, False for the saddest
+
+        Returns:
+            list: (hour key, sentiment sum, post count) tuples in rank order
+        """
+        keep = self._period_mask(time_from, time_to)
+        # Bin over the distinct hours only: one outlying timestamp would
+        # otherwise stretch the bins over centuries of empty hours
+        hours, slots = np.unique(self.absolute_hours()[keep], return_inverse=True)
+        totals = np.bincount(slots, weights=self.sentiment[keep], minlength=len(hours))
+        posts = np.bincount(slots, weights=self.counts[keep], minlength=len(hours))
+
+        keyed = -totals if largest else totals
+        chosen = np.argsort(keyed, kind="stable")[:n]
+        return [
+            ((_EPOCH + datetime.timedelta(hours=int(hours[i]))).strftime(_HOUR_FORMAT),
+             float(totals[i]), int(posts[i]))
+            for i in chosen
+        ]
+
+    def top_users(self, n=5, time_from=None, time_to=None, largest=True):
+        """
+        Rank accounts by total sentiment within a period.
+
+        Args:
+            n: Number of accounts to return
+            time_from: Inclusive lower bound as a datetime (optional)
+            time_to: Exclusive upper bound as a datetime (optional)
+            largest: True for the happiest accounts, False for the saddest
+
+        Returns:
+            list: (account id, sentiment sum, post count) tuples in rank order
+        """
+        keep = self._period_mask(time_from, time_to)
+        rows = self.entry_rows()[keep]
+        totals = np.bincount(rows, weights=self.sentiment[keep], minlength=len(self.users))
+        posts = np.bincount(rows, weights=self.counts[keep], minlength=len(self.users))
+        active = np.flatnonzero(posts)
+
+        k = min(n, len(active))
+        if k == 0:
+            return []
+        keyed = -totals[active] if largest else totals[active]
+        chosen = active[np.argsort(keyed, kind="stable")[:k]]
+        return [(str(self.users[i]), float(totals[i]), int(posts[i])) for i in chosen]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query per-user sentiment timelines written by main.py")
+    parser.add_argument("-timelines", type=str, required=True, help="Timeline store directory")
+    parser.add_argument("-user", type=str, help="Print the sentiment history of this account id")
+    parser.add_argument("-top", type=int, default=5, help="Number of happiest and saddest accounts to print")
+    parser.add_argument("-from", "--from", dest="time_from", type=str,
+                        help="Only count hours at or after this ISO 8601 time")
+    parser.add_argument("-to", "--to", dest="time_to", type=str,
+                        help="Only count hours before this ISO 8601 time")
+    args = parser.parse_args()
+
+    timelines = Timelines(args.timelines)
+    if args.user:
+        for hour, total, count in timelines.user_timeline(args.user):
+            print(f"{hour}:00 sentiment {total:+.4f} over {count} posts")
+    else:
+        time_from = datetime.datetime.fromisoformat(args.time_from.replace("Z", "+00:00")) if args.time_from else None
+        time_to = datetime.datetime.fromisoformat(args.time_to.replace("Z", "+00:00")) if args.time_to else None
+        for title, largest in (("Happiest", True), ("Saddest", False)):
+            print(f"Top {title} Users")
+            for i, (user_id, total, count) in enumerate(
+                    timelines.top_users(args.top, time_from, time_to, largest), start=1):
+                print(f"{i}. ID {user_id} with total sentiment {total:+.4f} over {count} posts")
@@ -1,107 +1,221 @@
 import datetime
+import heapq
 import os
-import io
-import json
-import mmap
+import resource
+import time
 from MastodonData import MastodonData
 
+# Fallback reference point for process_uptime
+_IMPORTED_AT = time.time()
+
 # A long separator for clearer printing output
 SEPARATOR = "=" * 50
 
-def preprocess_data(data: str):
-    """
-    Remove extra whitespace and validate the data line.
-    Returns None if the line is invalid.
-    """
-    if data and data.strip():
-        return data.strip()
-    return None
+# Initial size of the reusable buffer of read_records
+READ_BUFFER_SIZE = 8 << 20
 
-def processing_data(preprocessed_line: str, hour_sentiment_dict: dict, user_sentiment_dict: dict):
+def processing_data(record, hour_sentiment_dict: dict, user_sentiment_dict: dict, scorer=None,
+                    record_filter=None, timelines=None, accounts=None, validation=None, offset=None):
     """
-    Process a preprocessed JSON line into sentiment by hour and per user.
+    Process a raw JSON record into sentiment by hour and per user.
     Updates the dictionaries in place.
     
     Args:
-        preprocessed_line: A string containing a valid JSON object
+        record: One JSON object as str, bytes or memoryview
         hour_sentiment_dict: Dictionary to store hour -> sentiment score
         user_sentiment_dict: Dictionary to store user_id -> (username, score)
+        scorer: BatchSentimentScorer for posts without a sentiment value
+            (optional); such posts are accumulated when their batch is scored
+        record_filter: RecordFilter the parsed record must match (optional)
+        timelines: TimelineBuffer collecting per-user hourly history (optional)
+        accounts: AccountCache for skipping repeated account objects (optional)
+        validation: RecordValidator counting malformed records (optional)
+        offset: Byte offset of the record, for the validation quarantine (optional)
+    
+    Returns:
+        bool: False if the line could not be parsed or processed
+    
+    Raises:
+        ValidationAbort: If the validator's early failure rate is too high
     """
     try:
-        mastodon_data = MastodonData(preprocessed_line)
-        
+        mastodon_data = MastodonData(record, accounts)
+    except Exception:
+        if validation is not None:
+            validation.bad_json(offset)
+        return False
+    if validation is not None:
+        validation.check(mastodon_data, offset)
+    
+    try:
         # Skip entries without required data
         if not mastodon_data.created_at or mastodon_data.sentiment is None:
-            return
-            
-        # Process sentiment per hour
-        try:
-            created_datetime = datetime.datetime.fromisoformat(
-                mastodon_data.created_at.replace('Z', '+00:00')
-            )
-            # Hour key format: YYYY-MM-DD HH (e.g., 2023-03-15 14)
-            hour_key = created_datetime.strftime("%Y-%m-%d %H")
-            hour_sentiment_dict[hour_key] += mastodon_data.sentiment
-        except Exception:
-            # Skip entries with invalid dates
-            pass
+            return True
         
-        # Process sentiment per user if user_id exists
-        if mastodon_data.user_id:
-            if mastodon_data.user_id in user_sentiment_dict:
-                username, score = user_sentiment_dict[mastodon_data.user_id]
-                user_sentiment_dict[mastodon_data.user_id] = (mastodon_data.username, score + mastodon_data.sentiment)
-            else:
-                user_sentiment_dict[mastodon_data.user_id] = (mastodon_data.username, mastodon_data.sentiment)
-    except Exception as e:
+        # Skip records outside the requested time range or language
+        if record_filter is not None and not record_filter.matches(mastodon_data):
+            return True
+        
+        # Defer posts lacking sentiment to the batch lexicon scorer
+        if scorer is not None and mastodon_data.sentiment_missing:
+            scorer.defer(mastodon_data, mastodon_data.content)
+            return True
+        
+        accumulate_sentiment(mastodon_data, hour_sentiment_dict, user_sentiment_dict, timelines)
+        return True
+    except Exception:
         # Skip entries that can't be processed
-        pass
+        return False
 
-def count_lines(file_path: str):
+def accumulate_sentiment(mastodon_data: MastodonData, hour_sentiment_dict: dict, user_sentiment_dict: dict,
+                         timelines=None):
     """
-    Count the number of lines in the file efficiently.
+    Add one post's sentiment to the per-hour and per-user dictionaries.
     
     Args:
-        file_path: Path to the file
-        
-    Returns:
-        int: Number of lines in the file
-    """
-    with open(file_path, 'rb') as f:
-        # Memory map the file for efficient line counting
-        try:
-            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
-            line_count = 0
-            while mm.readline():
-                line_count += 1
-            return line_count
-        except ValueError:
-            # Fallback for files that can't be memory-mapped
-            return sum(1 for _ in f)
+        mastodon_data: Parsed post with a sentiment value
+        hour_sentiment_dict: Dictionary to store hour -> sentiment score
+        user_sentiment_dict: Dictionary to store user_id -> (username, score)
+        timelines: TimelineBuffer collecting per-user hourly history (optional)
+    """
+    # Process sentiment per hour
+    try:
+        created_datetime = datetime.datetime.fromisoformat(
+            mastodon_data.created_at.replace('Z', '+00:00')
+        )
+        # Hour key format: YYYY-MM-DD HH (e.g., 2023-03-15 14)
+        hour_key = created_datetime.strftime("%Y-%m-%d %H")
+        hour_sentiment_dict[hour_key] += mastodon_data.sentiment
+        if timelines is not None and mastodon_data.user_id:
+            timelines.add(mastodon_data.user_id, created_datetime, mastodon_data.sentiment)
+    except Exception:
+        # Skip entries with invalid dates
+        pass
+    
+    # Process sentiment per user if user_id exists
+    if mastodon_data.user_id:
+        if mastodon_data.user_id in user_sentiment_dict:
+            username, score = user_sentiment_dict[mastodon_data.user_id]
+            user_sentiment_dict[mastodon_data.user_id] = (mastodon_data.username, score + mastodon_data.sentiment)
+        else:
+            user_sentiment_dict[mastodon_data.user_id] = (mastodon_data.username, mastodon_data.sentiment)
 
-def read_data_chunk(file_path: str, start_line: int, end_line: int):
+# Process uptime when the first input bytes arrived, for time-to-first-record
+_first_read_uptime = None
+
+def read_records(file_path: str, start_byte: int, end_byte: int, buffer_size: int = READ_BUFFER_SIZE):
     """
-    Read a chunk of lines from a file, skipping to start_line and
-    stopping at end_line.
+    Read the records (lines) that start inside a byte range of a file.
+    
+    The file is read with readinto() into one reusable bytearray and split
+    on b"\\n" in place: each record is a memoryview slice of the buffer, so
+    lines are neither decoded nor copied. A partial line at the end of the
+    buffer is moved to its front before the next read, and the buffer grows
+    if a single line does not fit. A record is only valid until the next
+    one is requested; copy it with bytes() to keep it.
+    
+    A line belongs to the range in which its first byte falls, so ranges
+    that tile the file visit every line exactly once. When start_byte lands
+    in the middle of a line, the reader snaps forward to the next newline.
+    Blank lines are skipped.
     
     Args:
         file_path: Path to the file
-        start_line: Line number to start reading (0-indexed)
-        end_line: Line number to stop reading (exclusive)
+        start_byte: Byte offset where the range begins (inclusive)
+        end_byte: Byte offset where the range ends (exclusive)
+        buffer_size: Initial size of the read buffer in bytes
         
     Yields:
-        str: Each line in the specified range
+        tuple: (byte offset of the record, memoryview of the record without
+        its newline)
+    """
+    buf = bytearray(buffer_size)
+    view = memoryview(buf)
+    with open(file_path, 'rb', buffering=0) as file:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(file.fileno(), start_byte, end_byte - start_byte, os.POSIX_FADV_SEQUENTIAL)
+        
+        # Start one byte early and drop everything up to the first newline,
+        # so a record starting exactly at start_byte is kept
+        base = max(start_byte - 1, 0)  # File offset of buf[0]
+        file.seek(base)
+        skip_partial = start_byte > 0
+        pos = 0     # Start of the next record in buf
+        filled = 0  # Number of valid bytes in buf
+        eof = False
+        
+        while True:
+            newline = buf.find(b"\n", pos, filled)
+            if newline < 0:
+                if eof:
+                    # Last line of the file without a trailing newline
+                    if pos < filled and not skip_partial and base + pos < end_byte and buf[pos:filled].strip():
+                        yield base + pos, view[pos:filled]
+                    return
+                
+                tail = filled - pos
+                if tail == len(buf):
+                    # The line does not fit: continue in a buffer twice the size
+                    buf = bytearray(2 * len(buf))
+                    buf[:tail] = view[pos:filled]
+                    view = memoryview(buf)
+                else:
+                    buf[:tail] = bytes(view[pos:filled])
+                base += pos
+                pos = 0
+                filled = tail
+                n_read = file.readinto(view[filled:])
+                eof = n_read == 0
+                filled += n_read
+                if _first_read_uptime is None and n_read:
+                    _mark_first_read()
+                continue
+            
+            record_start = base + pos
+            if skip_partial:
+                skip_partial = False
+            elif record_start >= end_byte:
+                return
+            elif newline > pos and (buf[pos] > 32 or buf[pos:newline].strip()):
+                yield record_start, view[pos:newline]
+            pos = newline + 1
+
+def _mark_first_read():
+    global _first_read_uptime
+    _first_read_uptime = process_uptime()
+
+def partition_units(units: list, n_parts: int, part: int):
     """
-    with open(file_path, 'r', encoding='utf-8') as file:
-        # Skip lines before start_line
-        for _ in range(start_line):
-            next(file, None)
+    Cut a list of work units over one or more files into n_parts pieces
+    of equal total size.
+    
+    The units are laid end to end, so a part may take the tail of one file
+    and the head of the next. Cuts may fall inside a unit; read_records
+    snaps them to line boundaries, so every line is still read by exactly
+    one part.
+    
+    Args:
+        units: List of (path, start_byte, end_byte) tuples
+        n_parts: Number of parts (e.g. MPI ranks)
+        part: Index of the part to return
         
-        # Read lines from start_line to end_line
-        for i, line in enumerate(file):
-            if i >= end_line - start_line:
-                break
-            yield line
+    Returns:
+        list: (path, start_byte, end_byte) tuples belonging to the part
+    """
+    total = sum(end - start for _, start, end in units)
+    share_start = total * part // n_parts
+    share_end = total * (part + 1) // n_parts
+    
+    selected = []
+    offset = 0
+    for path, start, end in units:
+        length = end - start
+        low = max(share_start, offset)
+        high = min(share_end, offset + length)
+        if low < high:
+            selected.append((path, start + low - offset, start + high - offset))
+        offset += length
+    return selected
 
 def format_hour_range(hour_str: str):
     """
@@ -259,6 +373,76 @@ def merge_list(x: list, y: list, n=5):
     merged = list(heapq.merge(x, y, key=lambda item: -item[1]))[:n]
     return merged
 
+def peak_rss_mb():
+    """
+    Peak resident set size of the current process.
+    
+    Returns:
+        float: Peak RSS in megabytes
+    """
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def process_uptime():
+    """
+    Seconds since the current process was started, including interpreter
+    startup and imports.
+    
+    Returns:
+        float: Uptime in seconds (time since this module was imported where
+        /proc is unavailable)
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name; starttime is field 22
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            system_uptime = float(f.read().split()[0])
+        return max(system_uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 0.0)
+    except (OSError, ValueError, IndexError):
+        return time.time() - _IMPORTED_AT
+
+def time_to_first_record():
+    """
+    Seconds from process start until read_records first received input.
+    
+    Returns:
+        float: Time to first record, or None if nothing has been read
+    """
+    return _first_read_uptime
+
+def format_startup(all_startup):
+    """
+    Summarise per-rank startup cost for logs.
+    
+    Args:
+        all_startup: List of (startup seconds, time to first record or None)
+            per rank, as gathered from process_uptime and time_to_first_record
+    
+    Returns:
+        str: One-line summary with the slowest rank
+    """
+    startups = [startup for startup, _ in all_startup]
+    firsts = [(first, rank) for rank, (_, first) in enumerate(all_startup) if first is not None]
+    line = f"Startup (interpreter and imports): max {max(startups):.2f} s, min {min(startups):.2f} s"
+    if firsts:
+        slowest, slowest_rank = max(firsts)
+        line += (f"; time to first record: max {slowest:.2f} s (processor #{slowest_rank}), "
+                 f"min {min(firsts)[0]:.2f} s")
+    return line
+
+def write_startup(file, all_startup):
+    """
+    Write per-rank startup cost lines to an open runtime file.
+    
+    Args:
+        file: Text file open for writing
+        all_startup: List of (startup seconds, time to first record or None) per rank
+    """
+    for rank, (startup, first) in enumerate(all_startup):
+        first_text = f"{first:.2f} seconds" if first is not None else "no records read"
+        file.write(f"Startup of processor #{rank}: {startup:.2f} seconds, time to first record: {first_text}\n")
+
 def dump_num_processor(comm_size):
     """
     Print the number of processors used.
@@ -269,4 +453,56 @@ def dump_num_processor(comm_size):
     print(SEPARATOR * 2)
     print(f"Running with {comm_size} processors")
     print(SEPARATOR * 2)
-    print()
\ No newline at end of file
+    print()
+
+def dump_sample_estimates(estimates: dict, output_dir=None):
+    """
+    Print sample-based estimates with their 95% confidence intervals.
+
+    Args:
+        estimates: Dict returned by sampling.sample_estimates
+        output_dir: Directory to save output file (optional)
+    """
+    output = [
+        f"Sampled {estimates['blocks']} blocks, {estimates['sampled_bytes']} of "
+        f"{estimates['file_size']} bytes (fraction {estimates['fraction']})",
+        "Estimated records: {:.0f} ({})".format(
+            estimates["estimated_records"][0], _format_interval(*estimates["estimated_records"][1:], "{:.0f}")
+        ),
+    ]
+
+    for title, key in (("Happiest Hours", "happiest_hours"), ("Saddest Hours", "saddest_hours")):
+        output.append(SEPARATOR)
+        output.append(f"Estimated {title}")
+        output.append(SEPARATOR)
+        for i, (hour, est, low, high, best, worst) in enumerate(estimates[key], start=1):
+            output.append(
+                f"{i}. {format_hour_range(hour)} with sentiment {est:+.2f} "
+                f"({_format_interval(low, high)}, rank {best}-{worst})"
+            )
+
+    for title, key in (("Happiest Users", "happiest_users"), ("Saddest Users", "saddest_users")):
+        output.append(SEPARATOR)
+        output.append(f"Estimated {title}")
+        output.append(SEPARATOR)
+        for i, (user_id, username, est, low, high, best, worst) in enumerate(estimates[key], start=1):
+            output.append(
+                f"{i}. {username} (ID: {user_id}) with total sentiment {est:+.2f} "
+                f"({_format_interval(low, high)}, rank {best}-{worst})"
+            )
+
+    for line in output:
+        print(line)
+    print()
+
+    # Save to file if output_dir is specified
+    if output_dir:
+        with open(os.path.join(output_dir, "sample_estimates.txt"), "w") as f:
+            for line in output:
+                f.write(line + "\n")
+
+def _format_interval(low, high, number_format="{:+.2f}"):
+    """Describe a 95% confidence interval, which is unknown (None) for single-block samples."""
+    if low is None or high is None:
+        return "95% CI unavailable"
+    return f"95% CI {number_format.format(low)} to {number_format.format(high)}"
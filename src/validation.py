@@ -0,0 +1,186 @@
+import random
+
+# Failure classes counted per record, in report order
+FAILURE_CLASSES = ("bad_json", "missing_timestamp", "missing_user", "bad_sentiment")
+
+
+class ValidationAbort(RuntimeError):
+    """Raised when too many of the first records fail validation."""
+
+
+class RecordValidator:
+    """
+    Cheap per-rank validation counters with a sampled quarantine.
+
+    Good records cost one call and three attribute checks; only failing
+    records are classified. A record may fail several classes but counts
+    once towards the failure rate. The byte offsets of failing records are
+    kept in a fixed-size uniform reservoir sample, so the quarantine stays
+    small however broken the input is.
+
+    Once abort_after records have been seen, the first failure checks the
+    failure rate so far and raises ValidationAbort if it exceeds
+    abort_rate, so a run over input with the wrong schema stops within
+    seconds instead of producing empty output hours later.
+    """
+
+    def __init__(self, sample_size=1000, abort_after=5000, abort_rate=0.5, seed=0):
+        """
+        Initialize empty counters.
+
+        Args:
+            sample_size: Failing records kept in the quarantine sample
+            abort_after: Records to see before judging the failure rate
+                (0 disables the early abort)
+            abort_rate: Failure rate above which the run is aborted
+            seed: Seed of the reservoir sample (use the rank for distinct samples)
+        """
+        self.sample_size = sample_size
+        self.abort_after = abort_after
+        self.abort_rate = abort_rate
+        self.seed = seed
+        self.counts = dict.fromkeys(FAILURE_CLASSES, 0)
+        self.records = 0
+        self.failed_records = 0
+        self.samples = []
+        # Input file the offsets passed to check and bad_json refer to
+        self.source = None
+        self._random = random.Random(seed)
+        self._judged = not abort_after
+
+    def check(self, mastodon_data, offset=None):
+        """
+        Count a parsed record and classify it if it is incomplete.
+
+        Args:
+            mastodon_data: Parsed post
+            offset: Byte offset of the record in its file (optional)
+
+        Raises:
+            ValidationAbort: If the early failure rate is too high
+        """
+        self.records += 1
+        if mastodon_data.created_at and mastodon_data.user_id and not mastodon_data.sentiment_invalid:
+            return
+        kinds = []
+        if not mastodon_data.created_at:
+            kinds.append("missing_timestamp")
+        if not mastodon_data.user_id:
+            kinds.append("missing_user")
+        if mastodon_data.sentiment_invalid:
+            kinds.append("bad_sentiment")
+        self._fail(kinds, offset)
+
+    def bad_json(self, offset=None):
+        """
+        Count a record that could not be parsed as a post.
+
+        Raises:
+            ValidationAbort: If the early failure rate is too high
+        """
+        self.records += 1
+        self._fail(("bad_json",), offset)
+
+    def _fail(self, kinds, offset):
+        for kind in kinds:
+            self.counts[kind] += 1
+        self.failed_records += 1
+
+        # Reservoir sample over all failing records seen so far
+        sample = (self.source, offset, ",".join(kinds))
+        if len(self.samples) < self.sample_size:
+            self.samples.append(sample)
+        else:
+            slot = self._random.randrange(self.failed_records)
+            if slot < self.sample_size:
+                self.samples[slot] = sample
+
+        if not self._judged and self.records >= self.abort_after:
+            self._judged = True
+            if self.failed_records > self.abort_rate * self.records:
+                raise ValidationAbort(
+                    f"{self.failed_records} of the first {self.records} records failed validation "
+                    f"({format_counts(self.counts)}); check the input schema"
+                )
+
+    def absorb(self, other):
+        """
+        Add another validator's counters and samples to this one.
+
+        Args:
+            other: RecordValidator, for instance a worker thread's
+        """
+        for kind, count in other.counts.items():
+            self.counts[kind] += count
+        self.records += other.records
+        self.failed_records += other.failed_records
+        # Merging two reservoir samples keeps a (roughly) uniform sample
+        self.samples = self._random.sample(
+            self.samples + other.samples, min(self.sample_size, len(self.samples) + len(other.samples))
+        )
+
+    def summary(self):
+        """Counters and samples for gathering to the root rank."""
+        return {
+            "records": self.records,
+            "failed_records": self.failed_records,
+            "counts": dict(self.counts),
+            "samples": list(self.samples),
+        }
+
+
+def merge_summaries(summaries):
+    """
+    Sum per-rank validation summaries.
+
+    Args:
+        summaries: List of RecordValidator.summary() results, one per rank
+
+    Returns:
+        dict: Summed counters, with samples tagged by rank as
+        (rank, file, offset, classes) tuples
+    """
+    return {
+        "records": sum(s["records"] for s in summaries),
+        "failed_records": sum(s["failed_records"] for s in summaries),
+        "counts": {kind: sum(s["counts"][kind] for s in summaries) for kind in FAILURE_CLASSES},
+        "samples": [(rank,) + sample for rank, s in enumerate(summaries) for sample in s["samples"]],
+    }
+
+
+def format_counts(counts):
+    """Describe failure counts as "bad_json 3, missing_user 1"."""
+    return ", ".join(f"{kind} {counts[kind]}" for kind in FAILURE_CLASSES)
+
+
+def format_validation(merged):
+    """
+    Describe merged validation counters for logs.
+
+    Args:
+        merged: Result of merge_summaries
+
+    Returns:
+        str: One-line summary
+    """
+    rate = merged["failed_records"] / merged["records"] if merged["records"] else 0.0
+    return (f"Validation: {merged['failed_records']} of {merged['records']} records failed ({rate:.2%}): "
+            f"{format_counts(merged['counts'])}")
+
+
+def write_quarantine(path, merged, data_path):
+    """
+    Write the sampled byte offsets of failing records.
+
+    Args:
+        path: Quarantine file to write
+        merged: Result of merge_summaries
+        data_path: Input (file, directory or pattern) the records came from
+    """
+    with open(path, "w") as f:
+        f.write(f"# Sample of {len(merged['samples'])} of {merged['failed_records']} failing records in {data_path}\n")
+        f.write("# file\toffset\tfailures\tprocessor\n")
+        for rank, source, offset, kinds in sorted(
+            merged["samples"], key=lambda s: (s[1] or "", s[2] is None, s[2] or 0, s[0])
+        ):
+            f.write(f"{source or ''}\t{'' if offset is None else offset}\t{kinds}\t{rank}\n")
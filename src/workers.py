@@ -0,0 +1,211 @@
+import os
+import sys
+import sysconfig
+import threading
+from collections import defaultdict
+from accounts import AccountCache
+from validation import RecordValidator, ValidationAbort
+from util import read_records, partition_units, processing_data, accumulate_sentiment
+
+# Seconds between progress polls of the worker threads
+POLL_INTERVAL = 0.5
+
+
+def gil_disabled():
+    """
+    Check whether threads can run Python code in parallel.
+
+    True only on a free-threaded CPython build whose GIL has not been
+    re-enabled at runtime (an extension module without free-threading
+    support turns it back on).
+
+    Returns:
+        bool: True if the GIL is disabled
+    """
+    if not sysconfig.get_config_var("Py_GIL_DISABLED"):
+        return False
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def available_cores():
+    """
+    Cores this rank may use: its CPU affinity, which SLURM sets from
+    --cpus-per-task.
+
+    Returns:
+        int: Number of cores
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def resolve_threads(requested=None):
+    """
+    Number of worker threads to parse with in this rank.
+
+    Args:
+        requested: Threads asked for, or None for one per available core
+
+    Returns:
+        int: Thread count; 1 (the single-threaded path) on builds with a GIL
+    """
+    if not gil_disabled():
+        return 1
+    return max(requested or available_cores(), 1)
+
+
+class PartialAggregates:
+    """
+    Accumulators private to one worker thread.
+
+    Each thread parses its own share of the rank's byte ranges into its
+    own dictionaries, timeline buffer, account cache and lexicon scorer,
+    so threads never share mutable state; the partials are merged once
+    the threads finish, before any MPI communication.
+    """
+
+    def __init__(self, timelines=False, lexicon=None, validation=None):
+        """
+        Initialize empty accumulators.
+
+        Args:
+            timelines: Collect a per-user hourly timeline buffer
+            lexicon: Lexicon for scoring posts without sentiment (optional)
+            validation: Thread's own RecordValidator (optional)
+        """
+        self.hour_sentiment = defaultdict(int)
+        self.user_sentiment = {}
+        self.timelines = None
+        if timelines:
+            from timeline import TimelineBuffer
+            self.timelines = TimelineBuffer()
+        self.accounts = AccountCache()
+        self.scorer = None
+        if lexicon is not None:
+            from lexicon import BatchSentimentScorer
+            self.scorer = BatchSentimentScorer(lexicon, self._apply_score)
+        self.validation = validation
+
+        # Progress counters, read by the main thread while the worker runs
+        self.lines = 0
+        self.bytes = 0
+        self.parse_errors = 0
+        self.processed = 0
+        self.error = None
+
+    def _apply_score(self, mastodon_data, score):
+        mastodon_data.sentiment = score
+        accumulate_sentiment(mastodon_data, self.hour_sentiment, self.user_sentiment, self.timelines)
+
+    def run(self, units, record_filter=None):
+        """
+        Parse and aggregate every record starting in the given work units.
+
+        Args:
+            units: List of (path, start_byte, end_byte) units
+            record_filter: RecordFilter records must match (optional)
+        """
+        try:
+            for path, start_byte, end_byte in units:
+                if self.validation is not None:
+                    self.validation.source = path
+                for offset, record in read_records(path, start_byte, end_byte):
+                    self.lines += 1
+                    self.bytes += len(record) + 1
+                    # Reject on the raw bytes before any JSON parsing
+                    if record_filter and not record_filter.raw_match(record):
+                        continue
+                    if not processing_data(record, self.hour_sentiment, self.user_sentiment, self.scorer,
+                                           record_filter, self.timelines, self.accounts, self.validation, offset):
+                        self.parse_errors += 1
+                    self.processed += 1
+            if self.scorer:
+                self.scorer.flush()
+        except Exception as e:
+            self.error = e
+
+
+def process_threaded(units, n_threads, record_filter=None, lexicon=None, timelines=False,
+                     monitor=None, validation=None):
+    """
+    Process a rank's work units with worker threads and merge their results.
+
+    The units are split into n_threads equal shares of bytes. Only the
+    calling thread talks to the progress monitor (and so to MPI); it polls
+    the workers' counters while they run.
+
+    Args:
+        units: This rank's list of (path, start_byte, end_byte) units
+        n_threads: Number of worker threads
+        record_filter: RecordFilter records must match (optional)
+        lexicon: Lexicon for scoring posts without sentiment (optional)
+        timelines: Collect per-user hourly timelines
+        monitor: ProgressMonitor fed with the workers' progress (optional)
+        validation: RecordValidator to add the threads' failure counters to
+            (optional); each thread validates with its own copy
+
+    Returns:
+        tuple: (PartialAggregates merged from all threads, account cache
+        statistics summed over the threads)
+
+    Raises:
+        ValidationAbort: As soon as any thread's early failure rate is too high
+    """
+    from reduction import merge_user_sentiment
+
+    partials = [
+        PartialAggregates(timelines, lexicon, None if validation is None else RecordValidator(
+            validation.sample_size, validation.abort_after, validation.abort_rate,
+            seed=validation.seed * n_threads + i
+        ))
+        for i in range(n_threads)
+    ]
+    threads = [
+        threading.Thread(target=partial.run, args=(partition_units(units, n_threads, i), record_filter),
+                         name=f"parser-{i}")
+        for i, partial in enumerate(partials)
+    ]
+    for thread in threads:
+        thread.start()
+
+    reported = [0, 0, 0]
+    while threads:
+        threads[0].join(POLL_INTERVAL)
+        threads = [thread for thread in threads if thread.is_alive()]
+        # Abort without waiting for the other threads to finish their ranges
+        for partial in partials:
+            if isinstance(partial.error, ValidationAbort):
+                raise partial.error
+        if monitor is not None:
+            totals = [sum(p.lines for p in partials), sum(p.bytes for p in partials),
+                      sum(p.parse_errors for p in partials)]
+            monitor.update(lines=totals[0] - reported[0], nbytes=totals[1] - reported[1],
+                           parse_errors=totals[2] - reported[2], work=totals[1] - reported[1])
+            reported = totals
+
+    for partial in partials:
+        if partial.error is not None:
+            raise partial.error
+
+    merged = partials[0]
+    for partial in partials[1:]:
+        for hour, sentiment in partial.hour_sentiment.items():
+            merged.hour_sentiment[hour] += sentiment
+        if merged.timelines is not None:
+            merged.timelines.absorb(partial.timelines)
+        merged.lines += partial.lines
+        merged.bytes += partial.bytes
+        merged.parse_errors += partial.parse_errors
+        merged.processed += partial.processed
+        if merged.scorer is not None:
+            merged.scorer.scored += partial.scorer.scored
+    merged.user_sentiment = merge_user_sentiment(partial.user_sentiment for partial in partials)
+    if validation is not None:
+        for partial in partials:
+            validation.absorb(partial.validation)
+
+    stats = [partial.accounts.stats() for partial in partials]
+    return merged, {key: sum(s[key] for s in stats) for key in stats[0]}
@@ -0,0 +1,314 @@
+import datetime
+import json
+import os
+import re
+from util import read_records
+
+# Size of the byte blocks summarised by the zone map
+DEFAULT_ZONE_BLOCK_SIZE = 64 << 20
+
+ZONE_MAP_VERSION = 2
+
+# Every createdAt value in a raw line; the post's own timestamp is one of them
+_CREATED_AT = re.compile(rb'"createdAt":\s*"([^"]*)"')
+
+# Timestamps are compared as "YYYY-MM-DDTHH:MM:SS" strings in UTC
+_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def zone_map_path(data_path):
+    """Path of the sidecar zone map for a data file."""
+    return data_path + ".zonemap.json"
+
+
+def normalize_timestamp(value):
+    """
+    Convert a user-supplied date or datetime to a comparable UTC string.
+
+    Args:
+        value: ISO 8601 date or datetime, e.g. "2025-01-30" or "2025-01-30T11:00Z"
+
+    Returns:
+        str: "YYYY-MM-DDTHH:MM:SS" in UTC
+    """
+    parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed.strftime(_TIMESTAMP_FORMAT)
+
+
+def record_timestamp(value):
+    """
+    Convert a record's createdAt value to a comparable UTC string.
+
+    Timestamps already in UTC ("Z", "+00:00" or no offset, with or without
+    fractional seconds) are cut to their first 19 characters without
+    parsing; any other offset is converted to UTC like the filter bounds.
+
+    Args:
+        value: createdAt value of a record
+
+    Returns:
+        str: "YYYY-MM-DDTHH:MM:SS" in UTC, or None if the value is not a timestamp
+    """
+    if len(value) >= 19 and value[19:].lstrip(".0123456789") in ("", "Z", "+00:00"):
+        return value[:19]
+    try:
+        return normalize_timestamp(value)
+    except ValueError:
+        return None
+
+
+class RecordFilter:
+    """
+    Time-range and language predicate applied at three levels.
+
+    Blocks are ruled out from the zone map, raw lines are rejected on
+    their text before any JSON parsing, and parsed records are checked
+    exactly. The raw check is conservative: it only rejects a line when no
+    createdAt value in it (post or account) falls in range, or when the
+    language key is absent.
+    """
+
+    def __init__(self, time_from=None, time_to=None, language=None):
+        """
+        Initialize the filter.
+
+        Args:
+            time_from: Inclusive lower bound on createdAt (ISO 8601, optional)
+            time_to: Exclusive upper bound on createdAt (ISO 8601, optional)
+            language: Language code to keep (optional)
+        """
+        self.time_from = normalize_timestamp(time_from) if time_from else None
+        self.time_to = normalize_timestamp(time_to) if time_to else None
+        self.language = language
+        self._language_key = (
+            re.compile(rb'"language":\s*"' + re.escape(language.encode("utf-8")) + rb'"') if language else None
+        )
+
+    def _in_range(self, timestamp):
+        if timestamp is None:
+            return False
+        if self.time_from and timestamp < self.time_from:
+            return False
+        if self.time_to and timestamp >= self.time_to:
+            return False
+        return True
+
+    def block_may_match(self, block):
+        """
+        Check whether a zone map block can contain matching records.
+
+        Args:
+            block: Zone map block entry with "min", "max" and "languages"
+
+        Returns:
+            bool: False if the block can be skipped
+        """
+        if block["min"] is None:
+            return False
+        if self.time_from and block["max"] < self.time_from:
+            return False
+        if self.time_to and block["min"] >= self.time_to:
+            return False
+        if self.language and self.language not in block["languages"]:
+            return False
+        return True
+
+    def raw_match(self, line):
+        """
+        Cheap pre-parse check on the raw bytes of a line.
+
+        Args:
+            line: Raw NDJSON line as bytes or memoryview
+
+        Returns:
+            bool: False if the line certainly does not match
+        """
+        if self._language_key and not self._language_key.search(line):
+            return False
+        if self.time_from or self.time_to:
+            for value in _CREATED_AT.findall(line):
+                timestamp = record_timestamp(value.decode("ascii", "replace"))
+                # Leave values that are not timestamps to the exact check
+                if timestamp is None or self._in_range(timestamp):
+                    return True
+            return False
+        return True
+
+    def matches(self, mastodon_data):
+        """
+        Exact check on a parsed record.
+
+        Args:
+            mastodon_data: Parsed MastodonData object
+
+        Returns:
+            bool: True if the record satisfies every predicate
+        """
+        if self.language and mastodon_data.language != self.language:
+            return False
+        if self.time_from or self.time_to:
+            return self._in_range(record_timestamp(mastodon_data.created_at))
+        return True
+
+
+def _summarise_block(data_path, start, end):
+    """
+    Compute the zone map entry of one block.
+
+    Args:
+        data_path: Path to the NDJSON file
+        start: First byte of the block
+        end: Byte after the block
+
+    Returns:
+        dict: {"min", "max", "languages"} for the posts starting in the block
+    """
+    low = None
+    high = None
+    languages = set()
+    for _, record in read_records(data_path, start, end):
+        try:
+            json_data = json.loads(record.tobytes())
+        except ValueError:
+            continue
+        doc = json_data.get("doc", json_data)
+        created_at = doc.get("createdAt") or doc.get("created_at")
+        timestamp = record_timestamp(created_at) if isinstance(created_at, str) else None
+        if timestamp:
+            low = timestamp if low is None or timestamp < low else low
+            high = timestamp if high is None or timestamp > high else high
+        if doc.get("language"):
+            languages.add(doc["language"])
+    return {"min": low, "max": high, "languages": sorted(languages)}
+
+
+def build_zone_map(data_path, comm=None, block_size=DEFAULT_ZONE_BLOCK_SIZE):
+    """
+    Scan a file in parallel and write its sidecar zone map.
+
+    Blocks are dealt to ranks round-robin; root assembles and writes the
+    sidecar file, or keeps the map in memory only if the data directory
+    is not writable.
+
+    Args:
+        data_path: Path to the NDJSON file
+        comm: MPI communicator (optional)
+        block_size: Size of each zone map block in bytes
+
+    Returns:
+        dict: The zone map on every rank
+    """
+    comm_rank = comm.Get_rank() if comm else 0
+    comm_size = comm.Get_size() if comm else 1
+
+    stat = os.stat(data_path)
+    n_blocks = (stat.st_size + block_size - 1) // block_size
+    local = {
+        i: _summarise_block(data_path, i * block_size, min((i + 1) * block_size, stat.st_size))
+        for i in range(comm_rank, n_blocks, comm_size)
+    }
+
+    if comm and comm_size > 1:
+        all_local = comm.gather(local, root=0)
+        if comm_rank == 0:
+            local = {i: block for proc_blocks in all_local for i, block in proc_blocks.items()}
+
+    zone_map = None
+    if comm_rank == 0:
+        zone_map = {
+            "version": ZONE_MAP_VERSION,
+            "file_size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "block_size": block_size,
+            "blocks": [local[i] for i in range(n_blocks)],
+        }
+        try:
+            with open(zone_map_path(data_path), "w") as f:
+                json.dump(zone_map, f)
+        except OSError as e:
+            # A read-only dataset: use the map for this run only
+            print(f"Zone map of {data_path} kept in memory, not saved: {e}")
+
+    if comm and comm_size > 1:
+        zone_map = comm.bcast(zone_map, root=0)
+    return zone_map
+
+
+def load_zone_map(data_path, block_size=DEFAULT_ZONE_BLOCK_SIZE):
+    """
+    Load the sidecar zone map if it exists and matches the data file.
+
+    Args:
+        data_path: Path to the NDJSON file
+        block_size: Expected block size in bytes
+
+    Returns:
+        dict: The zone map, or None if it is missing or stale
+    """
+    try:
+        with open(zone_map_path(data_path)) as f:
+            zone_map = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    stat = os.stat(data_path)
+    if (zone_map.get("version") != ZONE_MAP_VERSION
+            or zone_map.get("file_size") != stat.st_size
+            or zone_map.get("mtime") != stat.st_mtime
+            or zone_map.get("block_size") != block_size):
+        return None
+    return zone_map
+
+
+def ensure_zone_map(data_path, comm=None, block_size=DEFAULT_ZONE_BLOCK_SIZE):
+    """
+    Load the zone map on root, building it collectively if needed.
+
+    Args:
+        data_path: Path to the NDJSON file
+        comm: MPI communicator (optional)
+        block_size: Size of each zone map block in bytes
+
+    Returns:
+        dict: The zone map on every rank
+    """
+    zone_map = None
+    if not comm or comm.Get_rank() == 0:
+        zone_map = load_zone_map(data_path, block_size)
+    if comm:
+        zone_map = comm.bcast(zone_map, root=0)
+    if zone_map is None:
+        zone_map = build_zone_map(data_path, comm, block_size)
+    return zone_map
+
+
+def select_ranges(zone_map, record_filter):
+    """
+    Byte ranges of the blocks the filter cannot rule out.
+
+    Adjacent surviving blocks are merged into one range.
+
+    Args:
+        zone_map: Zone map dict
+        record_filter: RecordFilter to prune with
+
+    Returns:
+        tuple: (list of (start_byte, end_byte), number of blocks kept)
+    """
+    block_size = zone_map["block_size"]
+    file_size = zone_map["file_size"]
+    ranges = []
+    kept = 0
+    for i, block in enumerate(zone_map["blocks"]):
+        if not record_filter.block_may_match(block):
+            continue
+        kept += 1
+        start = i * block_size
+        end = min(start + block_size, file_size)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges, kept
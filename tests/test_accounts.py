@@ -0,0 +1,123 @@
+import json
+
+import pytest
+
+import accounts
+from accounts import AccountCache, format_account_stats
+from MastodonData import MastodonData
+
+
+def account(user_id="109", followers=10, note="<p>hi</p>"):
+    return {"id": user_id, "username": f"u{user_id}", "bot": False, "followersCount": followers,
+            "createdAt": "2022-11-01T00:00:00.000Z", "note": note, "emojis": []}
+
+
+def post(author, content="hello", **fields):
+    doc = {"createdAt": "2025-01-30T11:55:33.000Z", "sentiment": 0.5, "content": content, "account": author}
+    doc.update(fields)
+    return json.dumps({"doc": doc}, ensure_ascii=False).encode("utf-8")
+
+
+def same_fields(record, cache):
+    cached = MastodonData(record, accounts=cache)
+    plain = MastodonData(record)
+    return all(getattr(cached, name) == getattr(plain, name)
+               for name in ("user_id", "username", "bot", "followers_count", "account_created_at",
+                            "sentiment", "content"))
+
+
+def test_repeated_accounts_are_cut_out():
+    cache = AccountCache()
+    record = post(account(), mentions=[{"id": "5", "acct": "x"}])
+    stripped, resolved = cache.strip(record)
+    assert b'"account": {"id":"109"}' in stripped
+    assert json.loads(stripped)["doc"]["mentions"] == [{"id": "5", "acct": "x"}]
+    assert resolved["109"]["followersCount"] == 10 and "note" not in resolved["109"]
+
+    assert same_fields(record, cache)
+    assert same_fields(memoryview(record), cache)
+    stats = cache.stats()
+    assert (stats["lookups"], stats["hits"], stats["accounts"]) == (3, 2, 1)
+    assert stats["bytes_skipped"] == 2 * stats["cached_bytes"]
+
+
+def test_changed_account_is_recached():
+    cache = AccountCache()
+    cache.strip(post(account(followers=10)))
+    before = cache.cached_bytes
+    record = post(account(followers=10000))
+    assert same_fields(record, cache)
+    assert cache.hits == 0
+    assert cache.cached_bytes == before + 3
+    assert cache.strip(record)[1]["109"]["followersCount"] == 10000
+
+
+def test_id_outside_the_account_is_not_a_key():
+    cache = AccountCache()
+    # No string id in the account: the first match is the mention's id
+    numeric = account()
+    numeric["id"] = 7
+    record = post(numeric, mentions=[{"id": "109", "acct": "x"}])
+    stripped, resolved = cache.strip(record)
+    assert json.loads(stripped)["doc"]["account"] == {"id": 7}
+    assert resolved[7]["username"] == "u109"
+    assert cache.entries == {}
+
+    # The real account 109 is still parsed and cached as itself
+    assert cache.strip(post(account()))[1]["109"]["username"] == "u109"
+    assert list(cache.entries) == [b"109"]
+
+
+def test_nested_and_null_accounts():
+    cache = AccountCache()
+    reblogged = post(account("1"), reblog={"account": account("2"), "content": "orig"})
+    stripped, resolved = cache.strip(reblogged)
+    assert sorted(resolved) == ["1", "2"]
+    assert json.loads(stripped)["doc"]["reblog"] == {"account": {"id": "2"}, "content": "orig"}
+
+    record = post(None)
+    assert cache.strip(record) == (record, {})
+    assert cache.strip(b'{"account": {"id": "3", "note": "unterminated') == (
+        b'{"account": {"id": "3", "note": "unterminated', {},
+    )
+
+
+def test_miss_decodes_the_account_not_the_record(monkeypatch):
+    decoded = []
+    decoder = accounts._DECODER
+
+    class RecordingDecoder:
+        def raw_decode(self, text):
+            decoded.append(len(text))
+            return decoder.raw_decode(text)
+
+    monkeypatch.setattr(accounts, "_DECODER", RecordingDecoder())
+    cache = AccountCache()
+    # A long note with multibyte characters spans several decode windows
+    author = account(note="é" * 5000)
+    record = post(author, content="x" * (1 << 20))
+    assert same_fields(record, cache)
+    assert cache.strip(record)[1]["109"]["username"] == "u109"
+    assert max(decoded) < 4 * accounts._DECODE_WINDOW
+
+
+def test_cache_stops_growing_at_max_bytes():
+    cache = AccountCache(max_bytes=300)
+    for user_id in ("1", "2", "3"):
+        assert cache.strip(post(account(user_id)))[1][user_id]["username"] == f"u{user_id}"
+    assert cache.cached_bytes <= 300
+    assert 0 < len(cache.entries) < 3
+
+
+def test_format_account_stats():
+    line = format_account_stats({"lookups": 4, "hits": 3, "bytes_skipped": 3 << 20, "accounts": 1})
+    assert "3 of 4" in line and "75.00%" in line and "3.0 MB" in line
+    assert "0.00%" in format_account_stats({"lookups": 0, "hits": 0, "bytes_skipped": 0, "accounts": 0})
+
+
+@pytest.mark.parametrize("note", ["", "ünïcode ✓", '"quoted" {braces}'])
+def test_strip_round_trips_account_fields(note):
+    cache = AccountCache()
+    record = post(account(note=note))
+    for _ in range(2):
+        assert same_fields(record, cache)
@@ -0,0 +1,69 @@
+import json
+
+import numpy as np
+
+from MastodonData import MastodonData
+from graph import EdgeBuffer, CSRGraph, build_graph, merge_edges
+
+
+def post(user_id, sentiment=0.5, reply_to=None, mentions=()):
+    return MastodonData(json.dumps({"doc": {
+        "createdAt": "2025-01-30T11:55:33.000Z",
+        "sentiment": sentiment,
+        "inReplyToAccountId": reply_to,
+        "mentions": [{"id": m} for m in mentions],
+        "account": {"id": user_id, "username": f"u{user_id}"},
+    }}))
+
+
+def test_merge_edges_sums_duplicates():
+    src = np.array([2, 1, 2, 1, 3], dtype=np.int64)
+    dst = np.array([1, 2, 1, 3, 1], dtype=np.int64)
+    weights = np.ones(5, dtype=np.int64)
+    replies = np.array([1, 0, 0, 1, 1], dtype=np.int64)
+    sentiment = np.array([0.5, 1.0, -0.25, 2.0, 0.0])
+
+    src, dst, weights, replies, sentiment = merge_edges(src, dst, weights, replies, sentiment)
+    assert src.tolist() == [1, 1, 2, 3]
+    assert dst.tolist() == [2, 3, 1, 1]
+    assert weights.tolist() == [1, 1, 2, 1]
+    assert replies.tolist() == [0, 1, 1, 1]
+    assert sentiment.tolist() == [1.0, 2.0, 0.25, 0.0]
+
+
+def test_merge_edges_empty():
+    empty = np.empty(0, dtype=np.int64)
+    merged = merge_edges(empty, empty, empty, empty, np.empty(0))
+    assert all(len(column) == 0 for column in merged)
+
+
+def test_edge_buffer_emits_replies_and_mentions():
+    edges = EdgeBuffer()
+    assert edges.add_post(post("1", 0.5, reply_to="2", mentions=["3", "2"])) == 3
+    assert edges.add_post(post("2", -1.0, mentions=["1", "not-a-number"])) == 1
+    assert edges.add_post(post("", 1.0, reply_to="1")) == 0
+
+    src, dst, weights, replies, sentiment = edges.to_weighted_edges()
+    assert src.tolist() == [1, 1, 1, 2]
+    assert dst.tolist() == [2, 3, 2, 1]
+    assert replies.tolist() == [1, 0, 0, 0]
+    assert weights.sum() == 4
+
+
+def test_graph_degrees_and_top_k():
+    edges = EdgeBuffer()
+    edges.add_post(post("10", 0.5, reply_to="20", mentions=["30", "20"]))
+    edges.add_post(post("20", -1.0, mentions=["10"]))
+    edges.add_post(post("30", 0.25, reply_to="20"))
+    graph = build_graph(edges)
+
+    assert isinstance(graph, CSRGraph)
+    assert graph.node_ids.tolist() == [10, 20, 30]
+    assert graph.num_edges == 4
+    assert graph.out_degree().tolist() == [2, 1, 1]
+    assert graph.out_degree(weighted=True).tolist() == [3, 1, 1]
+    assert graph.in_degree().tolist() == [1, 2, 1]
+    assert graph.in_degree(weighted=True).tolist() == [1, 3, 1]
+    assert graph.sentiment_in().tolist() == [-1.0, 1.25, 0.5]
+    assert graph.top_k(graph.in_degree(weighted=True), k=2) == [("20", 3), ("10", 1)]
+    assert graph.top_k(graph.sentiment_in(), k=1, largest=False) == [("10", -1.0)]
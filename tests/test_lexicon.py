@@ -0,0 +1,84 @@
+import json
+
+import numpy as np
+import pytest
+
+from lexicon import BatchSentimentScorer, Lexicon, load_lexicon, strip_tags, tokenize
+
+WORDS = [("good", 3.0), ("Bad", -2.0), ("don't", -1.0), ("café", 2.0), ("two words", 9.0)]
+
+
+def token_text(buf, starts, ends):
+    return [buf[start:end].tobytes().decode("utf-8") for start, end in zip(starts, ends)]
+
+
+def test_tokenize_lowercases_and_hashes_by_content():
+    buf = np.frombuffer("Good, GOOD good café don't".encode("utf-8"), dtype=np.uint8)
+    starts, ends, hashes = tokenize(buf)
+    assert len(starts) == 5
+    assert token_text(buf, starts, ends) == ["Good", "GOOD", "good", "café", "don't"]
+    # The hash depends on the lowercased token, not its position
+    assert hashes[0] == hashes[1] == hashes[2]
+    assert len(set(hashes.tolist())) == 3
+
+
+def test_strip_tags_blanks_markup_only():
+    text = b'<p>good <a href="x">bad</a></p>\nplain > text'
+    separators = np.array([text.index(b"\n")])
+    stripped = strip_tags(np.frombuffer(text, dtype=np.uint8), separators)
+    assert len(stripped) == len(text)
+    starts, ends, _ = tokenize(stripped)
+    # Attribute values are blanked; a ">" outside any tag is left as is
+    assert token_text(stripped, starts, ends) == ["good", "bad", "plain", "text"]
+    assert stripped.tobytes().endswith(b"plain > text")
+
+
+def test_lexicon_lookup_ignores_phrases():
+    lexicon = Lexicon(WORDS)
+    assert len(lexicon) == 4
+    _, _, hashes = tokenize(np.frombuffer(b"bad unknown two", dtype=np.uint8))
+    scores, matched = lexicon.lookup(hashes)
+    assert scores.tolist() == [-2.0, 0.0, 0.0]
+    assert matched.tolist() == [True, False, False]
+
+
+def test_score_texts_averages_token_scores():
+    scorer = BatchSentimentScorer(Lexicon(WORDS), apply=None)
+    scores = scorer.score_texts([
+        "<p>Good good BAD</p>",
+        "<p>Caf&eacute; is <b>good</b></p>",
+        "",
+        "don't café",
+    ])
+    # Tags and entities are not tokens ("Caf&eacute;" leaves "caf"); text without tokens scores 0
+    assert scores.tolist() == pytest.approx([4.0 / 3, 1.0, 0.0, 0.5])
+
+
+def test_scorer_flushes_in_batches():
+    applied = []
+    scorer = BatchSentimentScorer(Lexicon(WORDS), lambda record, score: applied.append((record, score)),
+                                  batch_size=2)
+    scorer.defer("a", "good")
+    assert applied == []
+    scorer.defer("b", None)
+    assert applied == [("a", 3.0), ("b", 0.0)]
+    scorer.defer("c", "bad")
+    scorer.flush()
+    assert applied[-1] == ("c", -2.0)
+    assert scorer.scored == 3
+
+
+def test_load_lexicon_formats(tmp_path):
+    tsv = tmp_path / "afinn.tsv"
+    tsv.write_text("# comment\ngood\t3\nbad\t-2\n")
+    vader = tmp_path / "lexicon.vader"
+    vader.write_text("good\t3.0\t0.5\t[3, 3]\n")
+    words = tmp_path / "words.json"
+    words.write_text(json.dumps({"good": 3, "bad": -2}))
+
+    assert len(load_lexicon(str(tsv))) == 2
+    assert len(load_lexicon(str(vader))) == 1
+    assert len(load_lexicon(str(words))) == 2
+    assert len(load_lexicon(str(vader), fmt="tsv")) == 1
+    with pytest.raises(ValueError):
+        load_lexicon(str(tmp_path / "lexicon.csv"))
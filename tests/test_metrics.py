@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+import metrics
+from metrics import METRICS_TAG, ProgressMonitor, format_duration
+
+
+class FakeComm:
+    """Communicator of one rank whose incoming snapshots arrive at set times."""
+
+    def __init__(self, rank, size, arrivals=()):
+        self.rank = rank
+        self.size = size
+        self.start = time.time()
+        self.arrivals = sorted(arrivals, key=lambda arrival: arrival[0])
+        self.sent = []
+
+    def Get_rank(self):
+        return self.rank
+
+    def Get_size(self):
+        return self.size
+
+    def iprobe(self, tag):
+        assert tag == METRICS_TAG
+        return bool(self.arrivals) and time.time() - self.start >= self.arrivals[0][0]
+
+    def recv(self, tag):
+        return self.arrivals.pop(0)[1]
+
+    def send(self, snapshot, dest, tag):
+        self.sent.append(snapshot)
+
+
+def snapshot(rank, progress, elapsed=10.0, done=False):
+    return {
+        "rank": rank, "time": time.time(), "elapsed": elapsed, "lines": 100, "bytes": 1 << 20,
+        "parse_errors": 1, "records_per_second": 10.0, "mb_per_second": 0.1, "rss_mb": 50.0,
+        "progress": progress, "done": done,
+    }
+
+
+def test_format_duration():
+    assert format_duration(0) == "0:00:00"
+    assert format_duration(3725.9) == "1:02:05"
+
+
+def test_single_rank_progress(capsys):
+    monitor = ProgressMonitor(None, work_total=10, interval=0.0, check_every=1)
+    monitor.update(lines=5, nbytes=500, parse_errors=1, work=5)
+    monitor.finish()
+    lines = capsys.readouterr().out.splitlines()
+    assert "50.0%" in lines[0] and "5 lines" in lines[0] and "1 parse errors" in lines[0]
+    assert "100.0%" in lines[-1] and "ETA 0:00:00" in lines[-1]
+
+
+def test_stragglers_and_stalled_ranks_are_flagged(capsys):
+    monitor = ProgressMonitor(FakeComm(0, 4), work_total=10, stall_after=5.0)
+    monitor._record(snapshot(0, 0.5))
+    monitor._record(snapshot(1, 0.5))
+    # Rank 2 needs 90 s more against a median of 10 s
+    monitor._record(snapshot(2, 0.1))
+    monitor._record(snapshot(3, 0.5))
+    monitor._last_progress[3] -= 60
+    monitor.report()
+    out = capsys.readouterr().out
+    assert "stragglers: #2" in out
+    assert "stalled: #3" in out
+
+
+def test_prometheus_textfile(tmp_path, monkeypatch):
+    monkeypatch.setenv("SLURM_JOB_ID", "42")
+    path = tmp_path / "metrics.prom"
+    monitor = ProgressMonitor(FakeComm(0, 2), work_total=10, metrics_path=str(path))
+    monitor._record(snapshot(0, 1.0, done=True))
+    monitor.report()
+    text = path.read_text()
+    assert 'mastodon_lines_processed_total{job="42",rank="0"} 100' in text
+    assert 'mastodon_progress_ratio{job="42",rank="0"} 1.0' in text
+    # Rank 1 has not reported, so the job ETA is unknown
+    assert 'mastodon_eta_seconds{job="42"} NaN' in text
+
+
+def test_other_ranks_send_a_final_snapshot():
+    comm = FakeComm(1, 2)
+    monitor = ProgressMonitor(comm, work_total=4)
+    monitor.update(lines=4, work=4)
+    monitor.finish()
+    assert len(comm.sent) == 1
+    assert comm.sent[0]["rank"] == 1 and comm.sent[0]["done"]
+
+
+def test_rank_zero_keeps_reporting_while_waiting(capsys, monkeypatch):
+    monkeypatch.setattr(metrics, "FINISH_POLL_INTERVAL", 0.01)
+    comm = FakeComm(0, 3, arrivals=[(0.05, snapshot(1, 1.0, done=True)), (0.3, snapshot(2, 1.0, done=True))])
+    monitor = ProgressMonitor(comm, work_total=1, interval=0.1)
+    monitor.update(work=1)
+    monitor.finish()
+    lines = capsys.readouterr().out.splitlines()
+    # Progress lines while rank 2 was still running, then the final one
+    assert len(lines) >= 3
+    assert any("66.7%" in line for line in lines[:-1])
+    assert "100.0%" in lines[-1]
+    assert not comm.arrivals
+
+
+@pytest.mark.parametrize("work_total, expected", [(0, 0.0), (4, 0.5)])
+def test_snapshot_progress(work_total, expected):
+    monitor = ProgressMonitor(None, work_total=work_total)
+    monitor.update(work=2)
+    assert monitor.snapshot()["progress"] == expected
+    assert monitor.snapshot(done=True)["progress"] == 1.0
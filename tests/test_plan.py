@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+import plan
+from plan import distinct_users, format_duration, format_plan, predict, profile_sample, recommend, render_sbatch
+
+
+def post(i):
+    return json.dumps({"doc": {
+        "createdAt": f"2025-01-30T{i % 24:02d}:00:00.000Z", "sentiment": 0.1,
+        "account": {"id": str(i % 50), "username": f"u{i % 50}"},
+    }})
+
+
+def profile(**overrides):
+    values = {
+        "file_size": 100 * 2 ** 20, "bytes_per_record": 1024, "read_seconds_per_record": 2e-5,
+        "parse_seconds_per_record": 1e-6, "process_seconds_per_record": 1e-5, "heaps_k": 2.0,
+        "heaps_beta": 0.5, "pickled_bytes_per_user": 40.0, "pickle_seconds_per_user": 1e-7,
+        "base_rss_mb": 50.0, "startup_seconds": 0.5, "sampled_records": 1000, "sampled_bytes": 2 ** 20,
+        "read_mb_per_second": 50.0,
+    }
+    values.update(overrides)
+    return values
+
+
+def test_profile_sample_reads_every_record_once(tmp_path, monkeypatch):
+    path = tmp_path / "posts.ndjson"
+    path.write_text("".join(post(i) + "\n" for i in range(2000)))
+    reads = []
+    read_records = plan.read_records
+    monkeypatch.setattr(plan, "read_records", lambda *args: reads.append(args) or read_records(*args))
+    monkeypatch.setattr(plan, "measure_startup", lambda: 0.0)
+
+    result = profile_sample(str(path), sample_mb=64, block_size=4096)
+    assert result["sampled_records"] == 2000
+    assert result["sampled_bytes"] == path.stat().st_size
+    assert result["hours"] == 24
+    assert 0.0 < result["heaps_beta"] <= 1.0
+    assert min(result["read_seconds_per_record"], result["parse_seconds_per_record"],
+               result["process_seconds_per_record"]) >= 0.0
+    # Each block is read from disk once; parsing and processing reuse it
+    assert len(reads) == len({args[1:] for args in reads})
+
+
+def test_profile_sample_rejects_empty_input(tmp_path):
+    path = tmp_path / "empty.ndjson"
+    path.write_text("\n\n")
+    with pytest.raises(ValueError):
+        profile_sample(str(path))
+
+
+def test_predict_with_slow_reads_has_no_negative_stage():
+    # Reading costs more than processing, as with a cold page cache
+    prediction = predict(profile(), ranks=4, nodes=1)
+    assert prediction["process_seconds"] == pytest.approx(102400 / 4 * 1e-5)
+    assert min(prediction["read_seconds"], prediction["process_seconds"], prediction["reduce_seconds"]) >= 0
+    assert prediction["wall_seconds"] > prediction["read_seconds"] + prediction["process_seconds"]
+
+
+def test_predict_layouts():
+    one = predict(profile(), ranks=1, nodes=1)
+    four = predict(profile(), ranks=4, nodes=2)
+    assert four["ranks_per_node"] == 2
+    assert four["read_seconds"] == pytest.approx(one["read_seconds"] / 4)
+    assert one["inter_node_bytes"] == 0 and four["inter_node_bytes"] > 0
+    # A slow shared filesystem caps the combined read rate
+    assert predict(profile(), 4, 1, fs_mb_per_second=10)["read_seconds"] == pytest.approx(10.0)
+
+
+def test_distinct_users_follows_heaps_law():
+    assert distinct_users(profile(), 0) == 0.0
+    assert distinct_users(profile(), 100) == pytest.approx(20.0)
+    assert distinct_users(profile(heaps_k=10.0, heaps_beta=1.0), 5) == 5
+
+
+def test_recommend_and_render():
+    predictions = [predict(profile(), ranks, 1) for ranks in (1, 2, 4, 8)]
+    chosen = recommend(predictions, node_mem_mb=64 * 1024)
+    assert chosen in predictions
+    assert recommend(predictions, node_mem_mb=1) is None
+
+    script = render_sbatch(chosen, "/data/posts.ndjson", "-lexicon afinn.tsv")
+    assert f"#SBATCH --ntasks={chosen['ranks']}" in script
+    assert "#SBATCH --time=00:05:00" in script
+    assert script.count("-lexicon afinn.tsv") == 1
+    lines = format_plan(profile(), predictions, chosen, 64 * 1024)
+    assert [line.split()[0] for line in lines[4:] if line.lstrip().startswith("*")] == [f"*1n{chosen['ranks']}c"]
+
+
+def test_format_duration_rounds_up():
+    assert format_duration(0.2) == "00:00:01"
+    assert format_duration(3661) == "01:01:01"
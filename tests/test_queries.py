@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from MastodonData import MastodonData
+from queries import Query, QueryBatch, METRICS
+
+
+def post(language="en", bot=False, sensitive=False, reply_to=None, visibility="public"):
+    return MastodonData(json.dumps({"doc": {
+        "createdAt": "2025-01-30T11:55:33.000Z",
+        "sentiment": 0.1,
+        "language": language,
+        "visibility": visibility,
+        "sensitive": sensitive,
+        "inReplyToAccountId": reply_to,
+        "account": {"id": "1", "username": "u1", "bot": bot},
+    }}))
+
+
+def test_query_parse():
+    query = Query.parse("en-humans:language=en,bot=false:hours,users")
+    assert query.name == "en-humans"
+    assert query.terms == (("language", "en", False), ("bot", False, False))
+    assert query.metrics == {"hours", "users"}
+
+    query = Query.parse("not-replies:reply!=TRUE")
+    assert query.terms == (("reply", True, True),)
+    assert query.metrics == set(METRICS)
+
+    assert Query.parse("all").terms == ()
+    assert Query.parse("all:*").terms == ()
+
+
+@pytest.mark.parametrize("spec", [
+    ":language=en",
+    "a:language=en:hours:extra",
+    "a:language",
+    "a:colour=red",
+    "a:bot=maybe",
+    "a:language=en:hours,followers",
+])
+def test_query_parse_rejects_invalid(spec):
+    with pytest.raises(ValueError):
+        Query.parse(spec)
+
+
+def test_query_batch_match():
+    batch = QueryBatch([
+        Query.parse("all"),
+        Query.parse("en:language=en"),
+        Query.parse("en-humans:language=en,bot=false"),
+        Query.parse("not-en:language!=en"),
+        Query.parse("replies:reply=true,sensitive=false"),
+    ])
+    # Terms shared by queries are evaluated once
+    assert batch.terms == [("language", "en"), ("bot", False), ("reply", True), ("sensitive", False)]
+
+    names = lambda record: [query.name for query in batch.match(record)]
+    assert names(post()) == ["all", "en", "en-humans"]
+    assert names(post(bot=True)) == ["all", "en"]
+    assert names(post(language="de", reply_to="7")) == ["all", "not-en", "replies"]
+    assert names(post(language=None, reply_to="7", sensitive=True)) == ["all", "not-en"]
+
+
+def test_query_batch_rejects_duplicate_names():
+    with pytest.raises(ValueError):
+        QueryBatch([Query.parse("a:language=en"), Query.parse("a:bot=true")])
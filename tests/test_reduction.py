@@ -0,0 +1,69 @@
+import datetime
+import json
+from collections import defaultdict
+
+import pytest
+
+MPI = pytest.importorskip("mpi4py.MPI")
+
+from reduction import (
+    NodeTopology, hierarchical_sum_dicts, hour_to_index, index_to_hour, day_to_index, index_to_day,
+    merge_user_sentiment,
+)
+from util import processing_data
+
+OUTLIER_TIMES = ("0001-01-01T00:30:00Z", "2025-01-30T11:55:33Z", "9999-12-31T23:59:59Z")
+
+
+def record(created_at, user_id="1", sentiment=0.5):
+    return json.dumps({"doc": {
+        "createdAt": created_at, "sentiment": sentiment, "account": {"id": user_id, "username": f"u{user_id}"},
+    }}).encode("utf-8")
+
+
+@pytest.mark.parametrize("created_at", OUTLIER_TIMES)
+def test_keys_round_trip(created_at):
+    hours = defaultdict(int)
+    assert processing_data(record(created_at), hours, {})
+    (hour_key,) = hours
+    index = hour_to_index(hour_key)
+    assert index_to_hour(index) == hour_key
+
+    created = datetime.datetime.fromisoformat(created_at.replace("Z", "+00:00")).replace(tzinfo=None)
+    day_key = created.strftime("%Y-%m-%d")
+    assert index_to_day(day_to_index(day_key)) == day_key
+    assert index // 24 == day_to_index(day_key)
+
+
+def test_index_is_hours_since_epoch():
+    assert hour_to_index("1970-01-01 00") == 0
+    assert hour_to_index("1969-12-31 23") == -1
+    assert hour_to_index("2025-01-30 11") == (datetime.datetime(2025, 1, 30, 11) - datetime.datetime(1970, 1, 1)) \
+        // datetime.timedelta(hours=1)
+    assert day_to_index("1970-01-02") == 1
+
+
+def test_hierarchical_sum_dicts_with_outlying_years():
+    hours = defaultdict(int)
+    days = defaultdict(float)
+    for created_at in OUTLIER_TIMES + OUTLIER_TIMES[1:2]:
+        processing_data(record(created_at), hours, {})
+    for hour_key, value in hours.items():
+        days[index_to_day(hour_to_index(hour_key) // 24)] += value
+
+    topology = NodeTopology(MPI.COMM_WORLD)
+    try:
+        merged_hours, = hierarchical_sum_dicts(topology, [hours], hour_to_index, index_to_hour)
+        merged_days, = hierarchical_sum_dicts(topology, [days], day_to_index, index_to_day)
+    finally:
+        topology.free()
+
+    if MPI.COMM_WORLD.Get_rank() == 0:
+        assert dict(merged_hours) == {key: float(value) for key, value in hours.items()}
+        assert merged_days == days
+        assert len(merged_hours) == 3
+
+
+def test_merge_user_sentiment():
+    merged = merge_user_sentiment([{"1": ("a", 1.0, 2)}, {"1": ("a2", 0.5, 1), "2": ("b", -1.0, 1)}])
+    assert merged == {"1": ("a2", 1.5, 3), "2": ("b", -1.0, 1)}
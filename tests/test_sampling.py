@@ -0,0 +1,73 @@
+import json
+import random
+
+from sampling import MIN_SAMPLE_BLOCKS, _estimate, plan_sample_blocks, sample_estimates
+
+
+def write_posts(path, n_posts, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        for i in range(n_posts):
+            f.write(json.dumps({"doc": {
+                "createdAt": f"2025-01-30T{i % 4:02d}:00:00.000Z",
+                "sentiment": rng.uniform(-1, 1),
+                "account": {"id": str(i % 7), "username": f"user{i % 7}"},
+            }}) + "\n")
+
+
+def test_plan_covers_strata_with_at_least_two_blocks():
+    blocks = plan_sample_blocks(10_000, 0.0001, block_size=1000)
+    assert len(blocks) == MIN_SAMPLE_BLOCKS
+    # One block per half of the file
+    assert blocks[0][1] <= 5000 <= blocks[1][0]
+
+    blocks = plan_sample_blocks(100_000, 0.3, block_size=1000)
+    assert len(blocks) == 30
+    assert blocks == sorted(blocks)
+    assert all(end - start == 1000 and 0 <= start and end <= 100_000 for start, end in blocks)
+    assert all(a[1] <= b[0] for a, b in zip(blocks, blocks[1:]))
+
+
+def test_plan_depends_on_seed_only():
+    assert plan_sample_blocks(1 << 30, 0.01, seed=3) == plan_sample_blocks(1 << 30, 0.01, seed=3)
+    assert plan_sample_blocks(1 << 30, 0.01, seed=3) != plan_sample_blocks(1 << 30, 0.01, seed=4)
+    assert plan_sample_blocks(0, 0.5) == []
+
+
+def test_estimate_interval():
+    # A single block has no variance estimate
+    assert _estimate(5.0, 25.0, 1, 10) == (50.0, None, None)
+
+    estimate, low, high = _estimate(3.0 + 5.0, 9.0 + 25.0, 2, 10)
+    assert estimate == 40.0
+    assert low < estimate < high
+
+    # Identical blocks give a zero-width interval
+    assert _estimate(8.0, 32.0, 2, 10) == (40.0, 40.0, 40.0)
+
+
+def test_sample_estimates_small_file(tmp_path):
+    path = tmp_path / "posts.ndjson"
+    write_posts(path, 40)
+
+    estimates = sample_estimates(str(path), 0.01)
+    # Even a tiny file is sampled with two blocks, so every interval is known
+    assert estimates["blocks"] == MIN_SAMPLE_BLOCKS
+    assert estimates["sampled_bytes"] == estimates["file_size"]
+    records, low, high = estimates["estimated_records"]
+    assert records == 40
+    assert low <= records <= high
+    assert len(estimates["happiest_hours"]) == 4
+    assert [est for _, est, *_ in estimates["happiest_hours"]] == sorted(
+        (est for _, est, *_ in estimates["happiest_hours"]), reverse=True)
+    assert estimates["saddest_users"][0][1] == "user" + estimates["saddest_users"][0][0]
+
+
+def test_sample_estimates_seed_changes_blocks(tmp_path):
+    path = tmp_path / "posts.ndjson"
+    write_posts(path, 2000)
+    first = sample_estimates(str(path), 0.2, block_size=4096, seed=1)
+    again = sample_estimates(str(path), 0.2, block_size=4096, seed=1)
+    other = sample_estimates(str(path), 0.2, block_size=4096, seed=2)
+    assert first == again
+    assert first["estimated_records"] != other["estimated_records"]
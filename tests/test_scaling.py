@@ -0,0 +1,85 @@
+import stat
+import sys
+
+import pytest
+
+from scaling import amdahl_fit, karp_flatt, make_input, measure, parse_timings, run_once, strong_scaling, weak_scaling
+
+MAIN_OUTPUT = """Processor #0 completed data processing in 0.00 seconds
+Processor #1 completed data processing in 0.00 seconds
+Program runs in 0.00 seconds
+"""
+
+
+@pytest.fixture
+def fake_mpiexec(tmp_path, monkeypatch):
+    """A launcher that ignores its arguments and prints $FAKE_OUTPUT like main.py would."""
+    path = tmp_path / "mpiexec"
+    path.write_text(f"#!{sys.executable}\nimport os, sys\nsys.stdout.write(os.environ['FAKE_OUTPUT'])\n")
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("FAKE_OUTPUT", MAIN_OUTPUT)
+    return str(path)
+
+
+def test_parse_timings():
+    phases, total = parse_timings(MAIN_OUTPUT.replace("0.00 seconds\nProgram", "1.25 seconds\nProgram"))
+    assert phases == {"data processing": {0: 0.0, 1: 1.25}}
+    assert total == 0.0
+    assert parse_timings("nothing here") == ({}, None)
+
+
+def test_run_too_fast_to_report_still_has_a_time(fake_mpiexec, tmp_path):
+    result = run_once(2, "input.ndjson", str(tmp_path), mpiexec=fake_mpiexec, mpiexec_args="")
+    assert result["total"] == 0.0
+    assert result["wall"] > 0
+
+    rows, _ = strong_scaling([
+        measure(1, "input.ndjson", str(tmp_path), 1, mpiexec=fake_mpiexec, mpiexec_args=""),
+        measure(2, "input.ndjson", str(tmp_path), 1, mpiexec=fake_mpiexec, mpiexec_args=""),
+    ])
+    assert all(row["speedup"] > 0 for row in rows)
+
+
+def test_run_without_runtime_line_fails_clearly(fake_mpiexec, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_OUTPUT", "Traceback: something else\n")
+    with pytest.raises(RuntimeError, match="Program runs in"):
+        run_once(1, "input.ndjson", str(tmp_path), mpiexec=fake_mpiexec, mpiexec_args="")
+
+
+def test_karp_flatt_and_amdahl_fit():
+    assert karp_flatt(2.0, 1) is None
+    # Perfect speedup has no serial fraction, no speedup is fully serial
+    assert karp_flatt(4.0, 4) == pytest.approx(0.0)
+    assert karp_flatt(1.0, 4) == pytest.approx(1.0)
+
+    ranks = [1, 2, 4, 8]
+    times = [10.0 * (0.2 + 0.8 / p) for p in ranks]
+    serial, t1 = amdahl_fit(ranks, times)
+    assert serial == pytest.approx(0.2)
+    assert t1 == pytest.approx(10.0)
+    assert amdahl_fit([4, 4], [1.0, 1.1]) == (None, None)
+
+
+def test_strong_and_weak_scaling_rows():
+    results = [{"ranks": p, "time": 8.0 / p if p < 4 else 4.0, "processing": 1.0, "imbalance": 1.0}
+               for p in (1, 2, 4)]
+    rows, _ = strong_scaling(results)
+    assert [row["speedup"] for row in rows] == [1.0, 2.0, 2.0]
+    assert [row["efficiency"] for row in rows] == [1.0, 1.0, 0.5]
+
+    rows = weak_scaling([{"ranks": 1, "time": 2.0}, {"ranks": 4, "time": 2.5}])
+    assert rows[1]["efficiency"] == pytest.approx(0.8)
+    assert rows[1]["speedup"] == pytest.approx(3.2)
+
+
+def test_make_input_repeats_source_lines(tmp_path):
+    source = tmp_path / "source.ndjson"
+    source.write_text('{"a": 1}\n\n{"a": 2}')
+    out = make_input(str(source), 5, str(tmp_path / "five.ndjson"))
+    with open(out) as f:
+        assert f.read().splitlines() == ['{"a": 1}', '{"a": 2}', '{"a": 1}', '{"a": 2}', '{"a": 1}']
+
+    empty = tmp_path / "empty.ndjson"
+    empty.write_text("\n")
+    with pytest.raises(ValueError):
+        make_input(str(empty), 1, str(tmp_path / "never.ndjson"))
@@ -0,0 +1,123 @@
+import asyncio
+import datetime
+import json
+import os
+
+import pytest
+
+from server import MAX_RESULTS, QueryCache, QueryServer
+from timeline import TimelineBuffer, write_timelines
+
+
+def write_store(store_dir, posts):
+    buffer = TimelineBuffer()
+    for user_id, created_at, sentiment in posts:
+        buffer.add(user_id, datetime.datetime.fromisoformat(created_at), sentiment)
+    write_timelines(buffer, str(store_dir))
+
+
+POSTS = [
+    ("1", "2025-01-30T11:05:00+00:00", 1.0),
+    ("1", "2025-01-30T14:00:00+00:00", -1.5),
+    ("2", "2025-01-30T11:20:00+00:00", 0.25),
+    ("3", "2025-01-31T09:00:00+00:00", 2.0),
+]
+
+
+@pytest.fixture
+def server(tmp_path):
+    write_store(tmp_path, POSTS)
+    return QueryServer(str(tmp_path))
+
+
+def test_top_users_and_hours(server):
+    assert server.query("/top-users", {"n": "2"}) == (200, [
+        {"id": "3", "sentiment": 2.0, "posts": 1}, {"id": "2", "sentiment": 0.25, "posts": 1},
+    ])
+    status, body = server.query("/top-users", {"order": "saddest", "from": "2025-01-30T12:00Z"})
+    assert status == 200
+    assert [row["id"] for row in body] == ["1", "3"]
+    assert server.query("/top-hours", {"n": "1"}) == (200, [{"hour": "2025-01-31 09", "sentiment": 2.0, "posts": 1}])
+
+
+def test_user_timeline(server):
+    assert server.query("/user/1", {}) == (200, [
+        {"hour": "2025-01-30 11", "sentiment": 1.0, "posts": 1},
+        {"hour": "2025-01-30 14", "sentiment": -1.5, "posts": 1},
+    ])
+    assert server.query("/user/9", {}) == (200, [])
+    assert server.query("/user/abc", {})[0] == 400
+
+
+@pytest.mark.parametrize("params", [{"n": "-1"}, {"n": "five"}, {"from": "yesterday"}])
+def test_bad_parameters(server, params):
+    status, body = server.query("/top-users", params)
+    assert status == 400
+    assert "error" in body
+
+
+def test_large_n_is_capped(server, monkeypatch):
+    calls = []
+    top_users = server.timelines.top_users
+    monkeypatch.setattr(server.timelines, "top_users", lambda n, *args: calls.append(n) or top_users(n, *args))
+    assert len(server.query("/top-users", {"n": "1000000000"})[1]) == 3
+    # Capped requests share one cache entry
+    server.query("/top-users", {"n": str(MAX_RESULTS + 1)})
+    assert calls == [MAX_RESULTS]
+
+
+def test_unknown_endpoint_and_stats(server):
+    server.query("/top-users", {})
+    server.query("/top-users", {"n": "5"})
+    status, stats = server.query("/stats", {})
+    assert status == 200
+    assert stats["users"] == 3 and stats["entries"] == 4
+    assert (stats["cache_hits"], stats["cache_misses"]) == (1, 1)
+    assert server.query("/nothing", {})[0] == 404
+
+
+def test_reload_swaps_in_a_new_run(server, tmp_path):
+    assert not server.reload()
+    server.query("/top-users", {})
+    write_store(tmp_path, POSTS + [("4", "2025-02-01T00:00:00+00:00", 5.0)])
+    # Make sure the new metadata file has a different stamp
+    stat = os.stat(tmp_path / "timelines.json")
+    os.utime(tmp_path / "timelines.json", ns=(stat.st_atime_ns, server.version + 1))
+    assert server.reload()
+    assert server.query("/top-users", {"n": "1"})[1][0]["id"] == "4"
+    assert len(server.cache.entries) == 1
+
+
+def test_missing_store_fails_at_startup(tmp_path):
+    with pytest.raises(FileNotFoundError, match="No timeline store"):
+        QueryServer(str(tmp_path / "not-written-yet"))
+
+
+def test_query_cache_evicts_least_recently_used():
+    cache = QueryCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert list(cache.entries) == ["a", "c"]
+
+
+def test_http_round_trip(server):
+    async def request(raw):
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(raw)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        head, body = response.split(b"\r\n\r\n", 1)
+        return head.split(b"\r\n")[0].decode(), json.loads(body)
+
+    assert asyncio.run(request(b"GET /top-users?n=1 HTTP/1.1\r\nHost: x\r\n\r\n")) == (
+        "HTTP/1.1 200 OK", [{"id": "3", "sentiment": 2.0, "posts": 1}],
+    )
+    assert asyncio.run(request(b"GET /top-hours?n=-3 HTTP/1.1\r\n\r\n"))[0] == "HTTP/1.1 400 Bad Request"
+    assert asyncio.run(request(b"POST /stats HTTP/1.1\r\n\r\n"))[0] == "HTTP/1.1 405 Method Not Allowed"
@@ -0,0 +1,94 @@
+import json
+import os
+import pickle
+
+import pytest
+
+from shards import ShardCache, expand_inputs
+
+
+def write_lines(path, lines, trailing_newline=True):
+    data = "\n".join(lines) + ("\n" if trailing_newline else "")
+    with open(path, "wb") as f:
+        f.write(data.encode("utf-8"))
+    return data.encode("utf-8")
+
+
+def post(created_at="2025-01-30T11:55:33.000Z", user_id="1", **fields):
+    doc = {"createdAt": created_at, "sentiment": 0.5, "account": {"id": user_id, "username": f"u{user_id}"}}
+    doc.update(fields)
+    return json.dumps({"doc": doc})
+
+
+def test_expand_inputs_skips_plain_json_in_directories(tmp_path):
+    for name in ("a.ndjson", "b.jsonl", "manifest.json", "a.ndjson.zonemap.json", ".hidden.ndjson"):
+        (tmp_path / name).write_text("{}\n")
+    names = lambda paths: [os.path.basename(path) for path in paths]
+    assert names(expand_inputs(str(tmp_path))) == ["a.ndjson", "b.jsonl"]
+    assert names(expand_inputs(str(tmp_path / "*"))) == ["a.ndjson", "b.jsonl"]
+    assert names(expand_inputs(str(tmp_path / "*.json"))) == ["manifest.json"]
+    assert expand_inputs(str(tmp_path / "manifest.json")) == [str(tmp_path / "manifest.json")]
+    with pytest.raises(FileNotFoundError):
+        expand_inputs(str(tmp_path / "*.csv"))
+
+
+def scan_and_store(cache, shards):
+    to_scan, pieces = cache.split(shards)
+    for path in to_scan:
+        size = os.path.getsize(path)
+        cache.store(path, 0, size, {"2025-01-30 11": size}, {path: (path, 1.0)})
+    cache.commit()
+    return to_scan, pieces
+
+
+def test_shard_cache_hits_and_misses(tmp_path):
+    shards = []
+    for name in ("a", "b"):
+        path = tmp_path / f"{name}.ndjson"
+        write_lines(path, [post(user_id=name)])
+        shards.append(str(path))
+    cache_dir = str(tmp_path / "cache")
+    settings = {"lexicon": None}
+
+    to_scan, pieces = scan_and_store(ShardCache(cache_dir, settings), shards)
+    assert to_scan == shards
+    assert pieces == []
+
+    # Unchanged shards are loaded, not scanned
+    cache = ShardCache(cache_dir, settings)
+    to_scan, pieces = scan_and_store(cache, shards)
+    assert to_scan == []
+    assert len(pieces) == 2
+    loaded = list(cache.load(pieces))
+    assert [users for _, users in loaded] == [{path: (path, 1.0)} for path in shards]
+
+    # A changed shard misses, the other still hits
+    with open(shards[1], "a") as f:
+        f.write(post(user_id="c") + "\n")
+    to_scan, pieces = scan_and_store(ShardCache(cache_dir, settings), shards)
+    assert to_scan == [shards[1]]
+    assert len(pieces) == 1
+
+    # Other settings ignore the manifest
+    to_scan, _ = ShardCache(cache_dir, {"lexicon": "afinn"}).split(shards)
+    assert to_scan == shards
+
+
+def test_shard_cache_drops_unreferenced_pieces(tmp_path):
+    path = tmp_path / "a.ndjson"
+    write_lines(path, [post()])
+    cache_dir = tmp_path / "cache"
+    scan_and_store(ShardCache(str(cache_dir), {}), [str(path)])
+    write_lines(path, [post(), post(user_id="2")])
+    scan_and_store(ShardCache(str(cache_dir), {}), [str(path)])
+    assert len(list(cache_dir.glob("*.pkl"))) == 1
+
+
+def test_shard_cache_parts_split_pieces(tmp_path):
+    cache = ShardCache(str(tmp_path), {})
+    pieces = [f"piece-{i}.pkl" for i in range(5)]
+    for piece in pieces:
+        with open(tmp_path / piece, "wb") as f:
+            pickle.dump(({}, {piece: (piece, 0.0)}), f)
+    seen = [user for part in range(2) for _, users in cache.load(pieces, 2, part) for user in users]
+    assert sorted(seen) == pieces
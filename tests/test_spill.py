@@ -0,0 +1,69 @@
+import os
+
+from spill import UserSpiller, merge_runs, partition_of, streaming_top_n, write_run
+
+
+def test_merge_runs_combines_users(tmp_path):
+    write_run(tmp_path / "a.bin", [("1", "a", 1.0), ("3", "c", 3.0)])
+    write_run(tmp_path / "b.bin", [("1", "a2", 0.5), ("2", "b", -2.0)])
+    merged = list(merge_runs([tmp_path / "a.bin", tmp_path / "b.bin"]))
+    assert merged == [("1", "a2", 1.5), ("2", "b", -2.0), ("3", "c", 3.0)]
+
+
+def test_spiller_top_n_matches_in_memory_totals(tmp_path):
+    spiller = UserSpiller(budget_mb=0, spill_dir=str(tmp_path))
+    totals = {}
+    for batch in range(4):
+        users = {}
+        for i in range(batch, 20 + batch):
+            user_id = str(i)
+            users[user_id] = (f"user{i}", (i - 10) * 0.25)
+            totals[user_id] = totals.get(user_id, 0.0) + (i - 10) * 0.25
+        assert spiller.maybe_spill(users)
+        assert users == {}
+
+    happiest, saddest = spiller.top_n_users({"99": ("late", 1.0)}, 3)
+    totals["99"] = 1.0
+    scores = sorted(totals.values())
+    # Ties may come out in any order, so compare the scores and each user's total
+    assert [score for _, (_, score) in happiest] == scores[::-1][:3]
+    assert [score for _, (_, score) in saddest] == scores[:3]
+    assert all(totals[user_id] == score for user_id, (_, score) in happiest + saddest)
+    assert spiller.spilled
+
+
+def test_spiller_ignores_stale_runs_and_cleans_up(tmp_path):
+    # Run files left behind by crashed jobs, at the top level and in an old job directory
+    write_run(tmp_path / "run-r0-p0-0.bin", [("1", "stale", 100.0)])
+    os.makedirs(tmp_path / "job-local-old")
+    write_run(tmp_path / "job-local-old" / "run-r0-p0-0.bin", [("1", "stale", 100.0)])
+
+    spiller = UserSpiller(budget_mb=0, spill_dir=str(tmp_path))
+    spiller.spill({"1": ("u1", 1.0), "2": ("u2", -1.0)})
+    happiest, saddest = spiller.top_n_users({"1": ("u1", 0.5)}, 1)
+    assert happiest == [("1", ("u1", 1.5))]
+    assert saddest == [("2", ("u2", -1.0))]
+
+    assert not os.path.exists(spiller.spill_dir)
+    assert sorted(os.listdir(tmp_path)) == ["job-local-old", "run-r0-p0-0.bin"]
+
+
+def test_spillers_use_separate_job_directories(tmp_path):
+    first = UserSpiller(budget_mb=1, spill_dir=str(tmp_path))
+    second = UserSpiller(budget_mb=1, spill_dir=str(tmp_path))
+    assert first.spill_dir != second.spill_dir
+    assert os.path.dirname(first.spill_dir) == str(tmp_path)
+
+
+def test_partition_of_is_stable():
+    assert [partition_of(str(i), 4) for i in range(50)] == [partition_of(str(i), 4) for i in range(50)]
+    assert {partition_of(str(i), 4) for i in range(200)} == {0, 1, 2, 3}
+    assert partition_of("12345", 1) == 0
+
+
+def test_streaming_top_n():
+    entries = [(str(i), f"u{i}", float((i * 7) % 11 - 5)) for i in range(11)]
+    happiest, saddest = streaming_top_n(iter(entries), 3)
+    assert [score for _, (_, score) in happiest] == [5.0, 4.0, 3.0]
+    assert [score for _, (_, score) in saddest] == [-5.0, -4.0, -3.0]
+    assert streaming_top_n(iter([]), 3) == ([], [])
@@ -0,0 +1,78 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from timeline import TimelineBuffer, Timelines, epoch_hour, write_timelines
+
+
+def at(text):
+    return datetime.datetime.fromisoformat(text)
+
+
+POSTS = [
+    ("1", "2025-01-30T11:05:00+00:00", 1.0),
+    ("1", "2025-01-30T11:50:00+00:00", 0.5),
+    ("1", "2025-01-30T14:00:00+00:00", -1.0),
+    ("2", "2025-01-30T11:20:00+00:00", -0.25),
+    ("2", "2025-01-31T09:00:00+10:00", 2.0),
+    # A bad clock far outside the rest of the data
+    ("3", "0001-01-01T00:30:00+00:00", -3.0),
+    ("not a number", "2025-01-30T11:00:00+00:00", 9.0),
+]
+
+
+@pytest.fixture
+def timelines(tmp_path):
+    buffer = TimelineBuffer(compact_every=2)
+    for user_id, created_at, sentiment in POSTS:
+        buffer.add(user_id, at(created_at), sentiment)
+    meta = write_timelines(buffer, str(tmp_path))
+    assert meta["n_users"] == 3
+    assert meta["n_entries"] == 5
+    return Timelines(str(tmp_path))
+
+
+def test_epoch_hour_converts_to_utc():
+    assert epoch_hour(datetime.datetime(1970, 1, 1, 5, 59)) == 5
+    assert epoch_hour(at("1970-01-01T10:00:00+10:00")) == 0
+    assert epoch_hour(at("1969-12-31T23:00:00+00:00")) == -1
+
+
+def test_user_timeline(timelines):
+    assert len(timelines) == 3
+    assert timelines.user_timeline("1") == [("2025-01-30 11", 1.5, 2), ("2025-01-30 14", -1.0, 1)]
+    assert timelines.user_timeline(2) == [("2025-01-30 11", -0.25, 1), ("2025-01-30 23", 2.0, 1)]
+    assert timelines.user_timeline("4") == []
+
+
+def test_top_hours(timelines):
+    assert timelines.top_hours(2) == [("2025-01-30 23", 2.0, 1), ("2025-01-30 11", 1.25, 3)]
+    assert timelines.top_hours(1, largest=False)[0][1:] == (-3.0, 1)
+    # The period bounds are inclusive below and exclusive above
+    assert timelines.top_hours(5, at("2025-01-30T11:00:00+00:00"), at("2025-01-30T14:00:00+00:00")) == [
+        ("2025-01-30 11", 1.25, 3),
+    ]
+    assert timelines.top_hours(5, at("2026-01-01T00:00:00+00:00")) == []
+
+
+def test_top_hours_bins_distinct_hours_only(timelines, monkeypatch):
+    lengths = []
+    bincount = np.bincount
+
+    def recording_bincount(values, *args, **kwargs):
+        counted = bincount(values, *args, **kwargs)
+        lengths.append(len(counted))
+        return counted
+
+    monkeypatch.setattr(np, "bincount", recording_bincount)
+    timelines.top_hours()
+    # Four distinct hours, not the two millennia between them
+    assert lengths == [4, 4]
+
+
+def test_top_users(timelines):
+    assert timelines.top_users(2) == [("2", 1.75, 2), ("1", 0.5, 3)]
+    assert timelines.top_users(1, largest=False) == [("3", -3.0, 1)]
+    assert timelines.top_users(5, at("2025-01-30T12:00:00+00:00")) == [("2", 2.0, 1), ("1", -1.0, 1)]
+    assert timelines.top_users(5, at("2026-01-01T00:00:00+00:00")) == []
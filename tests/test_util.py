@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+from util import read_records, partition_units
+
+
+def write_lines(path, lines, trailing_newline=True):
+    data = "\n".join(lines) + ("\n" if trailing_newline else "")
+    with open(path, "wb") as f:
+        f.write(data.encode("utf-8"))
+    return data.encode("utf-8")
+
+
+def expected_records(data):
+    """(offset, bytes) of every non-blank line, computed the slow way."""
+    records = []
+    offset = 0
+    for line in data.split(b"\n"):
+        if line.strip():
+            records.append((offset, line))
+        offset += len(line) + 1
+    return records
+
+
+@pytest.fixture
+def ndjson(tmp_path):
+    rng = random.Random(1)
+    lines = []
+    for i in range(300):
+        # Blank and whitespace-only lines are skipped; long lines force the buffer to grow
+        if i % 37 == 0:
+            lines.append("")
+        elif i % 41 == 0:
+            lines.append("   ")
+        else:
+            lines.append(f'{{"i": {i}, "pad": "{"x" * rng.randrange(0, 200)}"}}')
+    path = tmp_path / "records.ndjson"
+    data = write_lines(path, lines, trailing_newline=False)
+    return str(path), data
+
+
+@pytest.mark.parametrize("buffer_size", [16, 64, 4096])
+def test_read_records_tiles_random_cuts(ndjson, buffer_size):
+    path, data = ndjson
+    expected = expected_records(data)
+    rng = random.Random(buffer_size)
+    for _ in range(20):
+        cuts = sorted(rng.sample(range(1, len(data)), rng.randrange(1, 12)))
+        bounds = [0] + cuts + [len(data)]
+        records = [
+            (offset, bytes(record))
+            for start, end in zip(bounds, bounds[1:])
+            for offset, record in read_records(path, start, end, buffer_size)
+        ]
+        assert records == expected
+
+
+def test_read_records_cut_at_line_start(tmp_path):
+    path = tmp_path / "lines.ndjson"
+    data = write_lines(path, ["aa", "bb", "cc"])
+    first = [bytes(r) for _, r in read_records(str(path), 0, 3)]
+    second = [bytes(r) for _, r in read_records(str(path), 3, len(data))]
+    assert first == [b"aa"]
+    assert second == [b"bb", b"cc"]
+
+
+@pytest.mark.parametrize("n_parts", [1, 2, 3, 5, 8])
+def test_partition_units_reads_every_record_once(tmp_path, n_parts):
+    rng = random.Random(n_parts)
+    units = []
+    expected = []
+    for shard in range(4):
+        path = str(tmp_path / f"shard-{shard}.ndjson")
+        data = write_lines(path, [f'{{"shard": {shard}, "n": {n}}}' * rng.randrange(1, 4) for n in range(50)])
+        units.append((path, 0, len(data)))
+        expected.extend((path, offset, record) for offset, record in expected_records(data))
+    # A filtered plan lists several ranges of the same shard
+    path, _, end = units[1]
+    units[1:2] = [(path, 0, end // 3), (path, end // 3, end)]
+
+    records = []
+    shares = []
+    for part in range(n_parts):
+        share = partition_units(units, n_parts, part)
+        shares.append(sum(end - start for _, start, end in share))
+        for path, start, end in share:
+            records.extend((path, offset, bytes(record)) for offset, record in read_records(path, start, end))
+
+    assert sorted(records) == sorted(expected)
+    assert max(shares) - min(shares) <= 1
+
+
+def test_partition_units_more_parts_than_bytes():
+    units = [("a", 0, 2), ("b", 10, 11)]
+    shares = [partition_units(units, 5, part) for part in range(5)]
+    assert sum(end - start for share in shares for _, start, end in share) == 3
+    assert [] in shares
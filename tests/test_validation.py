@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from MastodonData import MastodonData
+from validation import RecordValidator, ValidationAbort
+
+
+def post(created_at="2025-01-30T11:55:33.000Z", user_id="1", **fields):
+    doc = {"createdAt": created_at, "sentiment": 0.5, "account": {"id": user_id, "username": f"u{user_id}"}}
+    doc.update(fields)
+    return json.dumps({"doc": doc})
+
+
+def test_validation_aborts_above_rate():
+    validator = RecordValidator(abort_after=10, abort_rate=0.5)
+    good = MastodonData(post())
+    for _ in range(4):
+        validator.check(good)
+    for _ in range(5):
+        validator.bad_json()
+    with pytest.raises(ValidationAbort):
+        validator.bad_json()
+    assert validator.counts["bad_json"] == 6
+
+
+def test_validation_keeps_going_at_rate():
+    validator = RecordValidator(abort_after=10, abort_rate=0.5)
+    good = MastodonData(post())
+    for _ in range(5):
+        validator.check(good)
+    for _ in range(5):
+        validator.bad_json()
+    # Judged once: later failures never abort
+    for _ in range(100):
+        validator.bad_json()
+    assert validator.failed_records == 105
+
+
+def test_validation_classifies_incomplete_records():
+    validator = RecordValidator(abort_after=0, sample_size=2)
+    validator.source = "input.ndjson"
+    validator.check(MastodonData(post(created_at="")), offset=10)
+    validator.check(MastodonData(post(user_id="", sentiment="nan")), offset=20)
+    validator.bad_json(offset=30)
+    assert validator.counts == {"bad_json": 1, "missing_timestamp": 1, "missing_user": 1, "bad_sentiment": 1}
+    assert validator.failed_records == 3
+    assert len(validator.samples) == 2
+
+
+def test_validation_abort_disabled():
+    validator = RecordValidator(abort_after=0)
+    for _ in range(1000):
+        validator.bad_json()
+    assert validator.failed_records == 1000
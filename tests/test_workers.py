@@ -0,0 +1,92 @@
+import json
+import os
+
+import pytest
+
+import workers
+from lexicon import Lexicon
+from metrics import ProgressMonitor
+from validation import RecordValidator, ValidationAbort
+from workers import PartialAggregates, process_threaded, resolve_threads
+
+
+def post(i):
+    doc = {"createdAt": f"2025-01-{1 + i % 28:02d}T{i % 24:02d}:15:00.000Z", "content": "<p>good</p>",
+           "account": {"id": str(i % 40), "username": f"u{i % 40}"}}
+    if i % 5:
+        doc["sentiment"] = (i % 7 - 3) / 4
+    return json.dumps({"doc": doc})
+
+
+@pytest.fixture
+def merging():
+    """process_threaded merges user maps with reduction, which imports mpi4py."""
+    pytest.importorskip("mpi4py.MPI")
+
+
+@pytest.fixture
+def shards(tmp_path):
+    units = []
+    for shard in range(3):
+        path = tmp_path / f"shard-{shard}.ndjson"
+        lines = [post(shard * 1000 + i) for i in range(400)]
+        lines[17] = "{not json"
+        path.write_text("\n".join(lines) + "\n")
+        units.append((str(path), 0, os.path.getsize(path)))
+    return units
+
+
+def single_threaded(units, lexicon):
+    partial = PartialAggregates(lexicon=lexicon)
+    partial.run(units)
+    return partial.hour_sentiment, partial.user_sentiment
+
+
+@pytest.mark.parametrize("requested, gil_free, expected", [
+    (None, False, 1), (8, False, 1), (3, True, 3), (0, True, 2), (None, True, 2),
+])
+def test_resolve_threads(monkeypatch, requested, gil_free, expected):
+    monkeypatch.setattr(workers, "gil_disabled", lambda: gil_free)
+    monkeypatch.setattr(workers, "available_cores", lambda: 2)
+    assert resolve_threads(requested) == expected
+
+
+@pytest.mark.parametrize("n_threads", [1, 2, 5])
+def test_threads_match_single_threaded_processing(merging, shards, n_threads):
+    lexicon = Lexicon([("good", 2.0)])
+    monitor = ProgressMonitor(None, work_total=sum(end for _, _, end in shards), interval=3600)
+    merged, account_stats = process_threaded(shards, n_threads, lexicon=lexicon, timelines=True, monitor=monitor)
+
+    hours, users = single_threaded(shards, lexicon)
+    assert dict(merged.hour_sentiment) == pytest.approx(dict(hours))
+    assert merged.user_sentiment.keys() == users.keys()
+    for user_id, (username, score) in users.items():
+        assert merged.user_sentiment[user_id][0] == username
+        assert merged.user_sentiment[user_id][1] == pytest.approx(score)
+
+    assert (merged.lines, merged.processed, merged.parse_errors) == (1200, 1200, 3)
+    assert merged.scorer.scored == 240
+    assert (monitor.lines, monitor.bytes, monitor.parse_errors) == (1200, monitor.work_total, 3)
+    assert account_stats["lookups"] == 1197
+    assert merged.timelines.entries()[3].sum() == 1197
+
+
+def test_validation_counts_are_summed(merging, shards):
+    validation = RecordValidator(abort_after=0)
+    process_threaded(shards, 3, validation=validation)
+    assert validation.counts["bad_json"] == 3
+    assert (validation.records, validation.failed_records) == (1200, 3)
+
+
+def test_validation_abort_reaches_the_caller(merging, tmp_path):
+    path = tmp_path / "bad.ndjson"
+    path.write_text("{not json\n" * 200)
+    with pytest.raises(ValidationAbort):
+        process_threaded([(str(path), 0, os.path.getsize(path))], 2,
+                         validation=RecordValidator(abort_after=10, abort_rate=0.5))
+
+
+def test_worker_errors_are_raised_in_the_caller(merging, tmp_path):
+    missing = str(tmp_path / "missing.ndjson")
+    with pytest.raises(FileNotFoundError):
+        process_threaded([(missing, 0, 100)], 2)
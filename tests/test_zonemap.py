@@ -0,0 +1,112 @@
+import json
+import os
+
+import pytest
+
+from MastodonData import MastodonData
+from zonemap import (
+    RecordFilter, build_zone_map, ensure_zone_map, load_zone_map, normalize_timestamp, record_timestamp,
+    select_ranges, zone_map_path,
+)
+
+BLOCK = 512
+
+
+def line(created_at, language="en"):
+    return json.dumps({"doc": {
+        "createdAt": created_at, "language": language, "sentiment": 0.1,
+        "account": {"id": "1", "username": "u1", "createdAt": "2020-01-01T00:00:00.000Z"},
+    }})
+
+
+def test_normalize_and_record_timestamps():
+    assert normalize_timestamp("2025-01-30") == "2025-01-30T00:00:00"
+    assert normalize_timestamp("2025-02-01T00:00+10:00") == "2025-01-31T14:00:00"
+    assert record_timestamp("2025-01-30T11:55:33.000Z") == "2025-01-30T11:55:33"
+    assert record_timestamp("2025-01-30T11:55:33+00:00") == "2025-01-30T11:55:33"
+    assert record_timestamp("2025-01-30T11:55:33.123-05:00") == "2025-01-30T16:55:33"
+    assert record_timestamp("not a time") is None
+
+
+def test_raw_and_exact_match_convert_offsets():
+    record_filter = RecordFilter("2025-01-30T00:00Z", "2025-01-31T00:00Z")
+    # 08:30 on the 31st at +10:00 is 22:30 UTC on the 30th: inside the window
+    inside = line("2025-01-31T08:30:00.000+10:00")
+    # 22:00 on the 30th at -03:00 is 01:00 UTC on the 31st: outside it
+    outside = line("2025-01-30T22:00:00.000-03:00")
+    assert record_filter.raw_match(inside.encode())
+    assert record_filter.matches(MastodonData(inside))
+    assert not record_filter.raw_match(outside.encode())
+    assert not record_filter.matches(MastodonData(outside))
+
+
+def test_raw_match_language_and_unparseable_times():
+    record_filter = RecordFilter(language="de")
+    assert record_filter.raw_match(line("2025-01-30T00:00:00Z", "de").encode())
+    assert not record_filter.raw_match(line("2025-01-30T00:00:00Z", "en").encode())
+
+    record_filter = RecordFilter("2025-01-30")
+    raw = line("yesterday").encode()
+    # The raw check only rejects what certainly fails; the exact check rejects the rest
+    assert record_filter.raw_match(raw)
+    assert not record_filter.matches(MastodonData(raw))
+
+
+def write_blocks(path, blocks):
+    """Write one block per list of lines, padding each block to BLOCK bytes."""
+    with open(path, "w") as f:
+        for lines in blocks:
+            text = "".join(entry + "\n" for entry in lines)
+            assert len(text) < BLOCK
+            f.write(text + " " * (BLOCK - 1 - len(text)) + "\n")
+
+
+def test_zone_map_prunes_blocks(tmp_path):
+    path = str(tmp_path / "posts.ndjson")
+    write_blocks(path, [
+        [line("2025-01-01T10:00:00.000Z")],
+        [line("2025-01-02T09:00:00.000+10:00", "de")],
+        [line("2025-01-03T10:00:00.000Z")],
+    ])
+    zone_map = build_zone_map(path, block_size=BLOCK)
+    assert [block["min"] for block in zone_map["blocks"]] == [
+        "2025-01-01T10:00:00", "2025-01-01T23:00:00", "2025-01-03T10:00:00",
+    ]
+    assert zone_map["blocks"][1]["languages"] == ["de"]
+
+    # The +10:00 post is at 23:00 UTC on the 1st, so its block is the only one kept
+    record_filter = RecordFilter("2025-01-01T12:00Z", "2025-01-02T00:00Z")
+    assert select_ranges(zone_map, record_filter) == ([(BLOCK, 2 * BLOCK)], 1)
+    assert select_ranges(zone_map, RecordFilter("2025-01-01T00:00Z")) == ([(0, 3 * BLOCK)], 3)
+    assert select_ranges(zone_map, RecordFilter(language="fr")) == ([], 0)
+
+
+def test_zone_map_sidecar_is_reused_until_the_file_changes(tmp_path):
+    path = str(tmp_path / "posts.ndjson")
+    write_blocks(path, [[line("2025-01-01T10:00:00Z")]])
+    built = ensure_zone_map(path, block_size=BLOCK)
+    assert load_zone_map(path, block_size=BLOCK) == built
+    assert load_zone_map(path, block_size=2 * BLOCK) is None
+
+    with open(path, "a") as f:
+        f.write(line("2025-01-05T10:00:00Z") + "\n")
+    assert load_zone_map(path, block_size=BLOCK) is None
+    assert ensure_zone_map(path, block_size=BLOCK)["blocks"][-1]["max"] == "2025-01-05T10:00:00"
+
+
+def test_zone_map_kept_in_memory_when_sidecar_cannot_be_written(tmp_path, capsys):
+    path = str(tmp_path / "posts.ndjson")
+    write_blocks(path, [[line("2025-01-01T10:00:00Z")]])
+    # A directory in the sidecar's place makes the write fail even as root
+    os.mkdir(zone_map_path(path))
+    zone_map = build_zone_map(path, block_size=BLOCK)
+    assert zone_map["blocks"][0]["min"] == "2025-01-01T10:00:00"
+    assert "kept in memory" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("bad", ["", "{not json"])
+def test_zone_map_skips_unparseable_lines(tmp_path, bad):
+    path = str(tmp_path / "posts.ndjson")
+    write_blocks(path, [[bad or line(""), line("2025-01-01T10:00:00Z")]])
+    block = build_zone_map(path, block_size=BLOCK)["blocks"][0]
+    assert block["min"] == block["max"] == "2025-01-01T10:00:00"